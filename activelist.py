@@ -90,7 +90,7 @@ class ActiveClassUI(WidgetUI, CommunicationHandler):
         self.read()
 
     def read(self):
-        self.get_value_async("sys","lsactive",self.updateCb)
+        self.get_value_async("sys","lsactive",self.updateCb,cached=True)
 
     def updateCb(self,string):
         self.parent.show()
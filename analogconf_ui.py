@@ -28,7 +28,6 @@ class AnalogProcessingOptions(QWidget,CommunicationHandler):
         self.autoscale = autoscale
         self.manual_tune = manual_tune
         self.values = values
-        self.timer = QTimer(self)
         self.pgb_list = []
 
         if self.manual_tune:
@@ -62,21 +61,10 @@ class AnalogProcessingOptions(QWidget,CommunicationHandler):
         self.readValues()
         self.register_callback(self.classname,"values",self.valueCb,self.instance,str)
         self.register_callback(self.classname,"rawval",self.rawValueCb,self.instance,str)
-        self.timer.timeout.connect(self.tim)
-        
-
-    def showEvent(self,event):
-        self.timer.start(300)
-
-
-    def hideEvent(self,event):
-        self.timer.stop()
-
-    def tim(self): # Timer timeout
         if self.values:
-            self.send_command(self.classname,"values",self.instance)
+            self.poll_commands(self.classname,["values"],300,self.instance)
         if self.manual_tune:
-            self.send_command(self.classname,"rawval",self.instance)
+            self.poll_commands(self.classname,["rawval"],300,self.instance)
 
         if self.manual_tune and self.autorangeBox.isChecked():
             for i in range(self.channels):
@@ -354,7 +342,7 @@ class CANAnalogConf(OptionsDialogGroupBox,CommunicationHandler):
         vbox.addWidget(self.infoLabel)
 
         self.cansettingsbutton = QPushButton("CAN settings")
-        self.canOptions = portconf_ui.CanOptionsDialog(0,"CAN",self.main)
+        self.canOptions = portconf_ui.CanOptionsDialog(0,"CAN",self.main,self)
         self.cansettingsbutton.clicked.connect(self.canOptions.exec)
         vbox.addWidget(self.cansettingsbutton)
         
@@ -424,7 +412,7 @@ class ADS111XAnalogConf(OptionsDialogGroupBox,CommunicationHandler):
         layout.addRow("Samplerate:",self.samplerateCombobox)
 
         self.portsettingsbutton = QPushButton("I2C settings")
-        self.i2cOptions = portconf_ui.I2COptionsDialog(0,"I2C",self.main)
+        self.i2cOptions = portconf_ui.I2COptionsDialog(0,"I2C",self.main,self)
         self.portsettingsbutton.clicked.connect(self.i2cOptions.exec)
         layout.addRow(self.diffCb,self.portsettingsbutton)
 
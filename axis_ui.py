@@ -42,10 +42,10 @@ class AxisUI(WidgetUI,CommunicationHandler):
         self.spinBox_range.valueChanged.connect(self.send_range_value) # don't update while typing
         self.horizontalSlider_degrees.valueChanged.connect(self.update_range_slider)
 
-        self.horizontalSlider_esgain.valueChanged.connect(lambda val : self.send_value("axis","esgain",(val),instance=self.axis))
+        self.horizontalSlider_esgain.valueChanged.connect(lambda val : self.send_value_throttled("axis","esgain",(val),instance=self.axis))
         self.horizontalSlider_fxratio.valueChanged.connect(self.fxratio_changed)
-        self.horizontalSlider_idle.valueChanged.connect(lambda val : self.send_value("axis","idlespring",(val),instance=self.axis))
-        self.horizontalSlider_damper.valueChanged.connect(lambda val : self.send_value("axis","axisdamper",val,instance=self.axis))
+        self.horizontalSlider_idle.valueChanged.connect(lambda val : self.send_value_throttled("axis","idlespring",(val),instance=self.axis))
+        self.horizontalSlider_damper.valueChanged.connect(lambda val : self.send_value_throttled("axis","axisdamper",val,instance=self.axis))
         self.pushButton_center.clicked.connect(lambda : self.send_command("axis","zeroenc",instance=self.axis))
         
         #self.checkBox_invert.stateChanged.connect(lambda val : self.send_value("axis","invert",(0 if val == 0 else 1),instance=self.axis))
@@ -73,7 +73,8 @@ class AxisUI(WidgetUI,CommunicationHandler):
 
         self.register_callback("axis","reduction",lambda val : self.updateReduction(val),self.axis,lambda x : tuple(map(int,x.split(":"))))
 
-        self.register_callback("axis","cmdinfo",self.reductionAvailable,self.axis,int,adr = 17)
+        # Older firmware does not know cmdinfo. Hide the reduction instead of asking again
+        self.register_callback("axis","cmdinfo",self.reductionAvailable,self.axis,int,adr = 17,error=lambda _ : self.reductionAvailable(0))
 
         self.pushButton_encoderTuning.clicked.connect(self.encoder_tuning_dlg.display)
     
@@ -150,7 +151,7 @@ class AxisUI(WidgetUI,CommunicationHandler):
 
     # Effect/Endstop ratio scaler
     def fxratio_changed(self,val):
-        self.send_value("axis","fxratio",val,instance=self.axis)
+        self.send_value_throttled("axis","fxratio",val,instance=self.axis)
         self.updateFxratioText(val)
 
     def updateFxratio(self,val):
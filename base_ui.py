@@ -6,9 +6,15 @@ inner EventLogger.
 Module : base_ui
 Authors : yannick, vincet
 """
+import hashlib
+import importlib.util
+import io
 import logging
+import os
+import sys
 import PyQt6.QtCore
 import PyQt6.QtWidgets
+import PyQt6.uic
 import helper
 import serial_comms
 
@@ -35,6 +41,96 @@ class EventLogger(PyQt6.QtCore.QObject):
         self.__log_event.disconnect(logger)
 
 
+class FormCache:
+    """Compile each .ui file once into a python form class instead of parsing the xml per widget.
+
+    The generated code is stored per file hash in the forms directory and imported, so later starts
+    also reuse its bytecode. When running frozen the bundle is read only and forms are compiled in
+    memory. Forms that can not be compiled are loaded with uic.loadUi as before.
+    """
+
+    DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "forms")
+
+    def __init__(self, directory: str = DIRECTORY):
+        """Keep compiled forms in directory. None compiles in memory only."""
+        if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+            directory = None
+        self.directory = directory
+        self.forms = {}  # .ui path : form class or None to use uic.loadUi
+        self.log = logging.getLogger("base_ui.forms")
+
+    def setup(self, path: str, widget: PyQt6.QtWidgets.QWidget):
+        """Build the form of the .ui file at path on widget like uic.loadUi."""
+        try:
+            form = self.forms[path]
+        except KeyError:
+            form = self.forms[path] = self.compile(path)
+        if form is None:
+            PyQt6.uic.loadUi(path, widget)
+            return
+        ui = form()
+        ui.setupUi(widget)
+        # loadUi sets the children on the widget itself
+        widget.__dict__.update(ui.__dict__)
+
+    def compile(self, path: str):
+        """Return the form class of the .ui file, generating its code if it is not cached."""
+        try:
+            with open(path, "rb") as file:
+                digest = hashlib.sha1(file.read() + PyQt6.QtCore.PYQT_VERSION_STR.encode()).hexdigest()[:16]
+            name = "ui_" + os.path.splitext(os.path.basename(path))[0] + "_" + digest
+            cached = os.path.join(self.directory, name + ".py") if self.directory else None
+            if cached and os.path.exists(cached):
+                module = self._import(name, cached)
+            else:
+                code = io.StringIO()
+                PyQt6.uic.compileUi(path, code)
+                if cached and self._store(name, cached, code.getvalue()):
+                    module = self._import(name, cached)
+                else:
+                    module = type(sys)(name)
+                    exec(compile(code.getvalue(), path, "exec"), module.__dict__)  # pylint: disable=exec-used
+            return next(value for key, value in vars(module).items() if key.startswith("Ui_"))
+        except Exception as exc:  # pylint: disable=broad-except
+            self.log.warning("Can not compile %s, loading it at runtime: %s", path, exc)
+            return None
+
+    def _store(self, name: str, cached: str, code: str):
+        """Write the generated code and drop the ones of older versions of the same form.
+
+        Returns False and compiles in memory from now on if the directory is not writable.
+        """
+        prefix = name[:-16]
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for old in os.listdir(self.directory):
+                if old.startswith(prefix) and old.endswith(".py") and len(old) == len(name) + 3:
+                    os.remove(os.path.join(self.directory, old))
+            with open(cached + ".tmp", "w", encoding="utf-8") as file:
+                file.write(code)
+            os.replace(cached + ".tmp", cached)
+            return True
+        except OSError as exc:
+            self.log.info("Can not cache forms in %s: %s", self.directory, exc)
+            self.directory = None
+            return False
+
+    @staticmethod
+    def _import(name: str, cached: str):
+        spec = importlib.util.spec_from_file_location(name, cached)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+FORMS = FormCache()
+
+
+def load_ui(ui_form: str, widget: PyQt6.QtWidgets.QWidget):
+    """Build the .ui file ui_form from the res folder on widget."""
+    FORMS.setup(helper.res_path(ui_form), widget)
+
+
 class WidgetUI(PyQt6.QtWidgets.QWidget):
     """Load the .ui file and set item to the current class. Provide a quick access to logger."""
 
@@ -46,7 +142,7 @@ class WidgetUI(PyQt6.QtWidgets.QWidget):
         PyQt6.QtWidgets.QWidget.__init__(self, parent)
         self.tech_log = logging.getLogger(ui_form)
         if ui_form:
-            PyQt6.uic.loadUi(helper.res_path(ui_form), self)
+            load_ui(ui_form, self)
 
     def init_ui(self):
         """Prototype of init_ui to manage this status in subclass."""
@@ -58,12 +154,17 @@ class WidgetUI(PyQt6.QtWidgets.QWidget):
 
 
 class CommunicationHandler:
-    """Store the serial communication to share it to subclass and offer register operation."""
+    """Store the serial communication to share it to subclass and offer register operation.
+
+    comms defaults to the connection set on the class. Pass one to bind a handler to another board.
+    """
 
     comms: serial_comms.SerialComms = None
 
-    def __init__(self):
-        """Do nothing on the constructor."""
+    def __init__(self, comms: serial_comms.SerialComms = None):
+        """Bind the handler to a connection if given, else use the default one."""
+        if comms is not None:
+            self.comms = comms
 
     def __del__(self):
         """Unregister all callback on class destruction."""
@@ -71,9 +172,11 @@ class CommunicationHandler:
 
     # deletes all callbacks to this class
     def remove_callbacks(self, handler = None):
-        """Remove all callback in SerialComms object (static)."""
+        """Remove all callback of the handler in its SerialComms object."""
         if handler is None : handler = self
-        serial_comms.SerialComms.removeCallbacks(handler)
+        if self.comms is not None:
+            self.comms.removeCallbacks(handler)
+            self.comms.poller.remove_handler(handler)
 
     def register_callback(
         self,
@@ -85,11 +188,15 @@ class CommunicationHandler:
         adr=None,
         delete=False,
         typechar="?",
+        error=None,
     ):
-        """Register a callback that can be deleted automatically later."""
+        """Register a callback that can be deleted automatically later.
+
+        error is called with a CommandNotFoundError if the board does not support the command.
+        """
         # Callbacks normally must prevent sending a value change command in this callback
         # to prevent the same value from being sent back again
-        serial_comms.SerialComms.registerCallback(
+        self.comms.registerCallback(
             self,
             cls=cls,
             cmd=cmd,
@@ -99,8 +206,13 @@ class CommunicationHandler:
             adr=adr,
             delete=delete,
             typechar=typechar,
+            error=error,
         )
 
+    def is_supported(self, cls, cmd, typechar="?"):
+        """True or False once the board answered the command in this session, None if unknown."""
+        return self.comms.capabilities.isSupported(cls, cmd, typechar)
+
     def get_value_async(
         self,
         cls,
@@ -111,8 +223,15 @@ class CommunicationHandler:
         adr=None,
         typechar="?",
         delete=True,
+        priority=serial_comms.PRIORITY_INTERACTIVE,
+        cached=False,
+        timeout=None,
+        on_timeout=None,
     ):
-        """Ask a value to the board from in async way."""
+        """Ask a value to the board from in async way. If cached a recently known value is used instead.
+
+        One-shot callbacks expire after timeout ms and on_timeout is called instead.
+        """
         self.comms.getValueAsync(
             self,
             cls=cls,
@@ -123,31 +242,107 @@ class CommunicationHandler:
             adr=adr,
             typechar=typechar,
             delete=delete,
+            priority=priority,
+            max_age=self.comms.state_cache.MAX_AGE if cached else None,
+            timeout=timeout,
+            on_timeout=on_timeout,
         )
 
-    def serial_write_raw(self, cmd):
+    def request_value(
+        self,
+        cls,
+        cmd,
+        instance: int = 0,
+        conversion=None,
+        adr=None,
+        typechar="?",
+        timeout=None,
+        priority=serial_comms.PRIORITY_INTERACTIVE,
+    ):
+        """Ask a value to the board and return a future for the reply. Removing the callbacks cancels it."""
+        return self.comms.request(
+            cls,
+            cmd,
+            instance=instance,
+            typechar=typechar,
+            adr=adr,
+            conversion=conversion,
+            timeout=timeout,
+            handler=self,
+            priority=priority,
+        )
+
+    def poll_commands(self, cls, cmds, period, instance=0, typechar="?", adr=None, visible_only=True, max_period=None):
+        """Poll commands every period ms through the shared scheduler. Replies go to the registered callbacks.
+
+        With visible_only the polling pauses while this widget is hidden or disabled.
+        A busy link may stretch the period up to max_period.
+        Returns the subscriptions to pause or resume them.
+        """
+        widget = self if visible_only and isinstance(self, PyQt6.QtWidgets.QWidget) else None
+        return [
+            self.comms.poller.subscribe(
+                self, cls, cmd, period, instance=instance, typechar=typechar, adr=adr, widget=widget, max_period=max_period
+            )
+            for cmd in cmds
+        ]
+
+    def poll_value(
+        self,
+        cls,
+        cmd,
+        callback,
+        period,
+        instance: int = 0,
+        conversion=None,
+        adr=None,
+        typechar="?",
+        visible_only=True,
+        silent=False,
+        max_period=None,
+    ):
+        """Poll a value every period ms and pass each reply to callback. Silent replies are not logged."""
+        widget = self if visible_only and isinstance(self, PyQt6.QtWidgets.QWidget) else None
+        return self.comms.poller.subscribe(
+            self,
+            cls,
+            cmd,
+            period,
+            instance=instance,
+            callback=callback,
+            conversion=conversion,
+            typechar=typechar,
+            adr=adr,
+            widget=widget,
+            silent=silent,
+            max_period=max_period,
+        )
+
+    def serial_write_raw(self, cmd, priority=serial_comms.PRIORITY_INTERACTIVE):
         """Write a command in direct mode througt serial."""
-        self.comms.serialWriteRaw(cmd)
+        self.comms.serialWriteRaw(cmd, priority)
 
-    def send_value(self, cls, cmd, val, adr=None, instance=0):
+    def send_value(self, cls, cmd, val, adr=None, instance=0, priority=serial_comms.PRIORITY_INTERACTIVE):
         """Send a value for a specific paramter to the board."""
         self.comms.sendValue(
-            self, cls=cls, cmd=cmd, val=val, adr=adr, instance=instance
+            self, cls=cls, cmd=cmd, val=val, adr=adr, instance=instance, priority=priority
         )
 
-    def send_command(self, cls, cmd, instance=0, typechar="?",adr=None):
+    @helper.throttle(50, key=lambda cls, cmd, val, instance=0: (cls, cmd, instance))
+    def send_value_throttled(self, cls, cmd, val, instance=0):
+        """Send a value at most every 50ms per command. Used by sliders, the last value of a drag is always sent."""
+        self.send_value(cls, cmd, val, instance=instance)
+
+    def send_command(self, cls, cmd, instance=0, typechar="?",adr=None, priority=serial_comms.PRIORITY_INTERACTIVE):
         """Send one command to the board."""
-        self.comms.sendCommand(cls, cmd, instance=instance, typechar=typechar,adr=adr)
-
-    def send_commands(self, cls, cmds, instance=0, typechar="?",adr=None):
-        """Send colection of command to the board."""
-        cmdstring = ""
-        for cmd in cmds:
-            if adr != None:
-                cmdstring += f"{cls}.{instance}.{cmd}{typechar}{adr};"
-            else:
-                cmdstring += f"{cls}.{instance}.{cmd}{typechar};"
-        self.comms.serialWriteRaw(cmdstring)
+        self.comms.sendCommand(cls, cmd, instance=instance, typechar=typechar,adr=adr,priority=priority)
+
+    def send_commands(self, cls, cmds, instance=0, typechar="?",adr=None, priority=serial_comms.PRIORITY_INTERACTIVE, cached=False):
+        """Send colection of command to the board. If cached, reads of recently known values are answered locally."""
+        self.comms.sendCommands(
+            cls, cmds, instance=instance, typechar=typechar, adr=adr, priority=priority,
+            max_age=self.comms.state_cache.MAX_AGE if cached else None
+        )
 
     def comms_reset(self):
         """Send the reset reply."""
@@ -162,7 +357,6 @@ class CommunicationHandler:
         )
         if match:
             self.comms.processMatchedReply(match)
-        self.comms.processMatchedReply(match)
 
     def get_raw_reply(self):
         """Expose the raw reply pySignal to connect on it."""
@@ -4,13 +4,16 @@ block_cipher = None
 
 folder = ".."
 
+# Tab modules are imported by name in main.TAB_FACTORIES and are not found by the analysis
+tab_modules = ["axis_ui","ffb_ui","midi_ui","odrive_ui","pwmdriver_ui","rmd_ui","simplemotion_ui","tmc4671_ui","tmcdebug_ui","vesc_ui"]
+
 # Add files that are falsely bundled with the application here to delete them again
 delete = ["opengl32sw.dll","d3dcompiler_47.dll","libGLESv2.dll","Qt6Quick.dll","Qt6Qml.dll","Qt6QmlModels.dll",'api-ms-win-core-console-l1-1-0.dll', 'api-ms-win-core-datetime-l1-1-0.dll', 'api-ms-win-core-debug-l1-1-0.dll', 'api-ms-win-core-errorhandling-l1-1-0.dll', 'api-ms-win-core-file-l1-1-0.dll', 'api-ms-win-core-file-l1-2-0.dll', 'api-ms-win-core-file-l2-1-0.dll', 'api-ms-win-core-handle-l1-1-0.dll', 'api-ms-win-core-heap-l1-1-0.dll', 'api-ms-win-core-interlocked-l1-1-0.dll', 'api-ms-win-core-libraryloader-l1-1-0.dll', 'api-ms-win-core-localization-l1-2-0.dll', 'api-ms-win-core-memory-l1-1-0.dll', 'api-ms-win-core-namedpipe-l1-1-0.dll', 'api-ms-win-core-processenvironment-l1-1-0.dll', 'api-ms-win-core-processthreads-l1-1-0.dll', 'api-ms-win-core-processthreads-l1-1-1.dll', 'api-ms-win-core-profile-l1-1-0.dll', 'api-ms-win-core-rtlsupport-l1-1-0.dll', 'api-ms-win-core-string-l1-1-0.dll', 'api-ms-win-core-synch-l1-1-0.dll', 'api-ms-win-core-synch-l1-2-0.dll', 'api-ms-win-core-sysinfo-l1-1-0.dll', 'api-ms-win-core-timezone-l1-1-0.dll', 'api-ms-win-core-util-l1-1-0.dll', 'api-ms-win-crt-conio-l1-1-0.dll', 'api-ms-win-crt-convert-l1-1-0.dll', 'api-ms-win-crt-environment-l1-1-0.dll', 'api-ms-win-crt-filesystem-l1-1-0.dll', 'api-ms-win-crt-heap-l1-1-0.dll', 'api-ms-win-crt-locale-l1-1-0.dll', 'api-ms-win-crt-math-l1-1-0.dll', 'api-ms-win-crt-multibyte-l1-1-0.dll', 'api-ms-win-crt-process-l1-1-0.dll', 'api-ms-win-crt-runtime-l1-1-0.dll', 'api-ms-win-crt-stdio-l1-1-0.dll', 'api-ms-win-crt-string-l1-1-0.dll', 'api-ms-win-crt-time-l1-1-0.dll', 'api-ms-win-crt-utility-l1-1-0.dll', 'libEGL.dll']
 
 a = Analysis([os.path.join(folder,'main.py')],
              binaries=[],
              datas=[(os.path.join(folder,'res'), 'res'),(os.path.join(folder,"libusb-1.0.dll"),"."),(os.path.join(folder,"libusb-1.0_32b.dll"),".")],
-             hiddenimports=[],
+             hiddenimports=tab_modules,
              hookspath=[],
              runtime_hooks=[],
              excludes=[],
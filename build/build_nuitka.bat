@@ -1,2 +1,2 @@
 cd ..
-python -m nuitka --show-progress --standalone --windows-dependency-tool=pefile --plugin-enable=qt-plugins --plugin-enable=numpy --follow-imports --windows-icon-from-ico=build\app.ico main.py
\ No newline at end of file
+python -m nuitka --show-progress --standalone --windows-dependency-tool=pefile --plugin-enable=qt-plugins --plugin-enable=numpy --follow-imports --include-module=axis_ui --include-module=ffb_ui --include-module=midi_ui --include-module=odrive_ui --include-module=pwmdriver_ui --include-module=rmd_ui --include-module=simplemotion_ui --include-module=tmc4671_ui --include-module=tmcdebug_ui --include-module=vesc_ui --windows-icon-from-ico=build\app.ico main.py
\ No newline at end of file
@@ -374,7 +374,7 @@ class CANButtonsConf(OptionsDialogGroupBox,CommunicationHandler):
         self.infoLabel = QLabel("")
         vbox.addWidget(self.infoLabel)
         self.cansettingsbutton = QPushButton("CAN settings")
-        self.canOptions = portconf_ui.CanOptionsDialog(0,"CAN",self.main)
+        self.canOptions = portconf_ui.CanOptionsDialog(0,"CAN",self.main,self)
         self.cansettingsbutton.clicked.connect(self.canOptions.exec)
         vbox.addWidget(self.cansettingsbutton)
         
@@ -0,0 +1,126 @@
+"""Communication statistics module.
+
+Shows the round trip times per command, the traffic counters and the queue depths of the
+serial link. Round trip histograms are only collected while the dialog is open.
+
+Module : commstats
+"""
+import json
+
+import PyQt6.QtWidgets
+from PyQt6.QtCore import QAbstractTableModel,Qt,QTimer
+from base_ui import WidgetUI,CommunicationHandler
+
+
+class LatencyModel(QAbstractTableModel):
+    """Round trip summary in ms of every command."""
+
+    COLUMNS = ["count","min","mean","p50","p90","p99","max"]
+
+    def __init__(self):
+        super(LatencyModel, self).__init__()
+        self.items = []
+        self.header = ["Command","Count","Min","Mean","p50","p90","p99","Max"]
+
+    def data(self, index, role):
+        if role == Qt.ItemDataRole.DisplayRole:
+            name,summary = self.items[index.row()]
+            if index.column() == 0:
+                return name
+            value = summary[self.COLUMNS[index.column() - 1]]
+            return "" if value is None else str(value)
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() > 0:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def headerData(self,section,orientation,role):
+        if role == Qt.ItemDataRole.DisplayRole:
+            if orientation == Qt.Orientation.Horizontal:
+                return self.header[section]
+
+    def rowCount(self, index):
+        return len(self.items)
+
+    def columnCount(self, index):
+        return len(self.header)
+
+    def setItems(self,latency : dict):
+        self.beginResetModel()
+        self.items = list(latency.items())
+        self.endResetModel()
+
+class CommsStatsDialog(PyQt6.QtWidgets.QDialog):
+    def __init__(self, parent = None):
+        PyQt6.QtWidgets.QDialog.__init__(self, parent)
+        self.comms_stats_ui = CommsStatsUI(self)
+        self.layout = PyQt6.QtWidgets.QVBoxLayout()
+        self.layout.setContentsMargins(0,0,0,0)
+        self.layout.addWidget(self.comms_stats_ui)
+        self.setLayout(self.layout)
+        self.setWindowTitle("Communication statistics")
+
+class CommsStatsUI(WidgetUI, CommunicationHandler):
+    UPDATE_INTERVAL = 500 # ms
+
+    def __init__(self, parent = None):
+        WidgetUI.__init__(self, parent, 'commstats.ui')
+        CommunicationHandler.__init__(self)
+        self.pushButton_reset.clicked.connect(self.reset)
+        self.pushButton_export.clicked.connect(self.export)
+        self.latency = LatencyModel()
+        self.tableView.setModel(self.latency)
+        header = self.tableView.horizontalHeader()
+        header.setSectionResizeMode(0,PyQt6.QtWidgets.QHeaderView.ResizeMode.Stretch) # Stretch first section
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_stats)
+        self.last = None # (uptime, frames) of the previous update for the reply rate
+
+    def showEvent(self, a0):
+        self.comms.setStatsEnabled(True)
+        self.last = None
+        self.update_stats()
+        self.timer.start(self.UPDATE_INTERVAL)
+
+    def hideEvent(self, a0):
+        self.timer.stop()
+        self.comms.setStatsEnabled(False)
+
+    def reset(self):
+        self.comms.resetStatistics()
+        self.last = None
+        self.update_stats()
+
+    def update_stats(self):
+        stats = self.comms.statistics()
+        counters = stats["counters"]
+        rate = 0
+        if self.last is not None and stats["uptime"] > self.last[0]:
+            rate = (counters["frames"] - self.last[1]) / (stats["uptime"] - self.last[0])
+        self.last = (stats["uptime"],counters["frames"])
+
+        self.label_traffic.setText(
+            f"Received: {counters['bytes_in']} bytes, {counters['frames']} replies ({rate:.0f}/s)\n"
+            f"Sent: {counters['bytes_out']} bytes, {stats['send']['sent']} commands\n"
+            f"Unmatched replies: {counters['unmatched']} ({counters['unparsed']} unparsable), "
+            f"timed out: {stats['send']['timed_out']}\n"
+            f"Discarded: {counters['discarded']} bytes ({counters['resyncs']} resyncs), "
+            f"streamed replies: {counters['streamed']}"
+        )
+        queues = stats["queues"]
+        self.label_queues.setText(
+            f"Waiting to send: {queues['unsent'] + queues['queued']}, in flight: {queues['in_flight']}\n"
+            f"Pending writes: {queues['pending_writes']}, callbacks: {queues['callbacks']}"
+        )
+        self.latency.setItems(stats["latency"])
+
+    def export(self):
+        fname,_ = PyQt6.QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export statistics", "comms_stats.json", "Json files (*.json)"
+        )
+        if not fname:
+            return
+        try:
+            with open(fname,"w",encoding="utf_8") as file:
+                json.dump(self.comms.statistics(buckets=True),file,indent=1)
+        except OSError as e:
+            self.log("Can not export statistics: " + str(e))
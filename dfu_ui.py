@@ -9,6 +9,7 @@ import PyQt6.QtGui
 import PyQt6.QtCore
 import PyQt6.QtWidgets
 import base_ui
+import serial_comms
 import pydfu
 
 
@@ -92,7 +93,7 @@ class DFUModeUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
 
     def dfu(self):
         """Send the dfu command to the board, log message, and close serial."""
-        self.send_command("sys", "dfu")
+        self.send_command("sys", "dfu", priority=serial_comms.PRIORITY_CRITICAL)
         self.log("\nEntering DFU...\n")
         self.main.reset_port()
 
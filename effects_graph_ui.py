@@ -109,32 +109,24 @@ class EffectsGraphUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
             q_line.attachAxis(self.chart_yaxis_forces)
             q_line.attachAxis(self.chart_xaxis)
 
-        # Setup the timer to get data
-        self.timer = PyQt6.QtCore.QTimer(self)
-        self.timer.timeout.connect(self.update_timer)  # pylint: disable=no-value-for-parameter
+        # Poll the data while the graph is shown
+        self.poll_value("fx", "effectsForces", self.display_data, 100)
 
     def setEnabled(self, a0: bool) -> None:
-        if not a0 and self.isVisible() and self.timer.isActive : 
+        if not a0 and self.isVisible():
             self.hide()
         return super().setEnabled(a0)
 
     def showEvent(self, event):  # pylint: disable=invalid-name, unused-argument
         """Display the UI and start calling board  for data."""
         self.init_ui()
-        self.timer.start(100)
 
     # Tab is hidden
     def hideEvent(self, event):  # pylint: disable=invalid-name, unused-argument
-        """Stop the timer on close event."""
-        if self.timer.isActive : 
-            self.timer.stop()
+        """Hide the dialog on close event."""
         self.parent.hide()
         return super().hideEvent(event)
 
-    def update_timer(self):
-        """Call the board to get instant data."""
-        self.get_value_async("fx", "effectsForces", self.display_data)
-
     def display_data(self, data):
         """Decode the data received."""
         #data = data.replace('\n',',')
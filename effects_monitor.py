@@ -13,8 +13,8 @@ class EffectStatsUI(WidgetUI, CommunicationHandler):
 
             self.pushButton_ResetData.clicked.connect(self.resetData)
 
-            self.timer = QTimer(self)
-            self.timer.timeout.connect(self.refreshUi)
+            self.poll_value("fx","effectsDetails",self.decodeData_cb,1000)
+            self.poll_value("fx","effects",self.setActiveState_cb,1000,conversion=int)
             icon_ok = QtGui.QIcon(
             self.style().standardIcon(QtWidgets.QStyle.StandardPixmap.SP_DialogYesButton)
             )
@@ -27,26 +27,17 @@ class EffectStatsUI(WidgetUI, CommunicationHandler):
 
     def setEnabled(self, a0: bool) -> None:
         self.pushButton_ResetData.setEnabled(a0)
-        if not a0 and self.isVisible() and self.timer.isActive : 
+        if not a0 and self.isVisible():
             self.parent.hide()
         return super().setEnabled(a0)
 
-    def showEvent(self, a0: QtGui.QShowEvent) -> None:
-        self.timer.start(1000)
-        return super().showEvent(a0)
-
     def hideEvent(self, a0) -> None:
-        if self.timer.isActive : self.timer.stop()
         self.parent.hide()
         return super().hideEvent(a0)
     
     def resetData(self):
         self.send_value("fx","effectsDetails",0)
 
-    def refreshUi(self):
-        self.get_value_async("fx","effectsDetails",self.decodeData_cb)
-        self.get_value_async("fx","effects",self.setActiveState_cb,conversion=int)
-    
     def setLabelPixmapState(self,label,state):
         label.setPixmap(self.icon_ok if state else self.icon_ko)
 
@@ -178,7 +178,7 @@ class AdvancedFFBTuneUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
         self.send_commands("fx",["spring","damper","friction","inertia"],0,typechar="!")
         self.send_commands("fx",["frictionPctSpeedToRampup",
                                 "spring","damper","friction","inertia",
-                                "filterProfile_id","damper_f","damper_q","friction_f","friction_q","inertia_f","inertia_q"],0)
+                                "filterProfile_id","damper_f","damper_q","friction_f","friction_q","inertia_f","inertia_q"],0,cached=True)
 
         self.get_value_async("main","id",self.get_main_id,0,int)
     
@@ -236,7 +236,7 @@ class AdvancedFFBTuneUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
 
         #send value to the board
         if command :
-            self.send_value("fx", command, val)
+            self.send_value_throttled("fx", command, val)
 
         #update graph if the slider is used by a graph
         if slider == self.horizontalSlider_spring_gain :
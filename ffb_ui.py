@@ -5,10 +5,12 @@ from PyQt6.QtWidgets import QMessageBox,QVBoxLayout,QCheckBox,QButtonGroup,QGrid
 from PyQt6 import uic
 from helper import res_path,classlistToIds,splitListReply,throttle
 from PyQt6.QtCore import QTimer,QEvent, pyqtSignal
+import functools
 import main
 import buttonconf_ui
 import analogconf_ui
 from base_ui import WidgetUI,CommunicationHandler
+from optionsdialog import OptionsDialogPool
 from serial_comms import SerialComms
 import effects_tuning_ui
 from helper import map_infostring
@@ -35,6 +37,8 @@ class FfbUI(WidgetUI,CommunicationHandler):
         self.buttonconfbuttons = []
         self.axisbtns = QButtonGroup()
         self.axisconfbuttons = []
+        self.option_dialogs = OptionsDialogPool() # Created when opened, shared by button and analog sources
+        self.destroyed.connect(self.option_dialogs.clear)
         self.active = 0
         self.rate = 0
         self.cfrate = 0
@@ -50,7 +54,7 @@ class FfbUI(WidgetUI,CommunicationHandler):
         self.friction_internal_factor = 1
         self.friction_pct_speed_rampup = 25
 
-        self.timer = QTimer(self)
+        self.rate_polls = []
         self.buttonbtns.setExclusive(False)
         self.axisbtns.setExclusive(False)
 
@@ -80,8 +84,6 @@ class FfbUI(WidgetUI,CommunicationHandler):
 
         self.pushButton_advanced_tuning.clicked.connect(self.effect_tuning_dlg.display)
 
-        self.timer.timeout.connect(self.updateTimer)
-
         #self.registerCallback("main","axes",self.setAxisCheckBoxes,0,int)
         self.register_callback("main","hidsendspd",self.hidreportrate_cb,0,typechar='!')
         self.register_callback("main","hidsendspd",self.comboBox_reportrate.setCurrentIndex,0,int,typechar='?')
@@ -113,7 +115,8 @@ class FfbUI(WidgetUI,CommunicationHandler):
         if(self.init_ui()):
             tabId = self.main.add_tab(self,title)
             self.main.select_tab(tabId)
-            self.timer.start(500) # timer always updates
+            # always updates unless paused by stopTimer
+            self.rate_polls = self.poll_commands("main",["hidrate","ffbactive","cfrate"],500,0,visible_only=False)
 
         self.buttonbtns.buttonClicked.connect(self.buttonsChanged)
         self.axisbtns.buttonClicked.connect(self.axesChanged)
@@ -148,11 +151,13 @@ class FfbUI(WidgetUI,CommunicationHandler):
     #     self.timer.stop()
 
     def startTimer(self):
-        self.timer.start(500)
+        for poll in self.rate_polls:
+            poll.resume()
 
     # Tab is hidden
     def stopTimer(self):
-        self.timer.stop()
+        for poll in self.rate_polls:
+            poll.pause()
         self.ffb_rate_event.emit((0,0,0))
 
     def ffbActiveCB(self,active):
@@ -165,12 +170,6 @@ class FfbUI(WidgetUI,CommunicationHandler):
     def ffbCfRateCB(self,rate):
         self.cfrate = rate
  
-    def updateTimer(self):
-        try:
-            self.send_commands("main",["hidrate","ffbactive","cfrate"],0)
-        except:
-            self.main.log("Update error")
-    
     # Helper function to sync spinboxes and sliders
     # Should be called by the sliders update event while the spinbox should update the slider directly
     def sliderChangedUpdateSpinbox(self,val,spinbox,factor,command=None):
@@ -180,7 +179,7 @@ class FfbUI(WidgetUI,CommunicationHandler):
             spinbox.setValue(newVal)
             spinbox.blockSignals(False)
         if(command):
-            self.send_value("fx",command,val)
+            self.send_value_throttled("fx",command,val)
 
     def display_speed_cutoff_damper(self, gain):
         """Update the max rpm speed cutoff"""
@@ -251,39 +250,49 @@ class FfbUI(WidgetUI,CommunicationHandler):
             self.main.log("Error getting buttons")
             return
         types = int(types)
-        layout = QGridLayout()
-        layout.setVerticalSpacing(0)
-        layout.setContentsMargins(12,5,12,5)
-        #clear
-        for b in self.buttonconfbuttons:
-            self.remove_callbacks(b[1])
-            b[0].setParent(None)
-            del b
-        self.buttonconfbuttons.clear() # Clear buttons
-        for b in self.buttonbtns.buttons():
-            self.buttonbtns.removeButton(b)
-            del b
-        #add buttons
-        row = 0
-        for c in self.btnClasses:
-            btn=QCheckBox(str(c[1]),self.groupBox_buttons)
-            self.buttonbtns.addButton(btn,c[0])
-            layout.addWidget(btn,row,0)
+        if self.groupBox_buttons.layout() is None:
+            layout = QGridLayout()
+            layout.setVerticalSpacing(0)
+            layout.setContentsMargins(12,5,12,5)
+            self.groupBox_buttons.setLayout(layout)
+        if [self.buttonbtns.id(b) for b in self.buttonbtns.buttons()] != [c[0] for c in self.btnClasses]:
+            self.createSourceRows(self.btnClasses,self.buttonbtns,self.buttonconfbuttons,self.groupBox_buttons,self.open_button_options)
+        # Only the states change with the mask
+        for c,confbutton in zip(self.btnClasses,self.buttonconfbuttons):
             enabled = types & (1<<c[0]) != 0
+            btn = self.buttonbtns.button(c[0])
             btn.setChecked(enabled)
-
             creatable = c[2]
             btn.setEnabled(creatable or enabled)
+            confbutton.setEnabled(enabled)
+
+    def createSourceRows(self,classes,group : QButtonGroup,confbuttons : list,box,open_options):
+        """Replaces the checkbox and option button rows of a source list"""
+        layout = box.layout()
+        #clear
+        for b in confbuttons + group.buttons():
+            group.removeButton(b)
+            layout.removeWidget(b)
+            b.deleteLater()
+        confbuttons.clear()
+        #add buttons
+        for row,c in enumerate(classes):
+            btn=QCheckBox(str(c[1]),box)
+            group.addButton(btn,c[0])
+            layout.addWidget(btn,row,0)
 
             confbutton = QToolButton(self)
             confbutton.setText(">")
             layout.addWidget(confbutton,row,1)
-            self.buttonconfbuttons.append((confbutton,buttonconf_ui.ButtonOptionsDialog(str(c[1]),c[0],self.main)))
-            confbutton.clicked.connect(self.buttonconfbuttons[row][1].exec)
-            confbutton.setEnabled(enabled)
-            self.buttonbtns.button(c[0]).stateChanged.connect(confbutton.setEnabled)
-            row+=1
-        self.groupBox_buttons.setLayout(layout)
+            confbuttons.append(confbutton)
+            confbutton.clicked.connect(functools.partial(open_options,c[0],str(c[1])))
+            btn.stateChanged.connect(confbutton.setEnabled)
+
+    def open_button_options(self,class_id,name):
+        dialog = self.option_dialogs.get(
+            ("btn",class_id),functools.partial(buttonconf_ui.ButtonOptionsDialog,name,class_id,self.main)
+        )
+        dialog.exec()
 
     def updateAnalogClassesCB(self,reply):
         self.axisIds,self.axisClasses = classlistToIds(reply)
@@ -300,39 +309,23 @@ class FfbUI(WidgetUI,CommunicationHandler):
             return
 
         types = int(types)
-        layout = QGridLayout()
-        #clear
-        for b in self.axisconfbuttons:
-            self.remove_callbacks(b[1])
-            b[0].setParent(None)
-            del b
-        self.axisconfbuttons.clear()
-        for b in self.axisbtns.buttons():
-            self.axisbtns.removeButton(b)
-            del b
-        #add buttons
-        row = 0
-        for c in self.axisClasses:
-            creatable = c[2]
-            btn=QCheckBox(str(c[1]),self.groupBox_analogaxes)
-            self.axisbtns.addButton(btn,c[0])
-            layout.addWidget(btn,row,0)
+        if self.groupBox_analogaxes.layout() is None:
+            self.groupBox_analogaxes.setLayout(QGridLayout())
+        if [self.axisbtns.id(b) for b in self.axisbtns.buttons()] != [c[0] for c in self.axisClasses]:
+            self.createSourceRows(self.axisClasses,self.axisbtns,self.axisconfbuttons,self.groupBox_analogaxes,self.open_analog_options)
+        for c,confbutton in zip(self.axisClasses,self.axisconfbuttons):
             enabled = types & (1<<c[0]) != 0
+            btn = self.axisbtns.button(c[0])
             btn.setChecked(enabled)
-
-            confbutton = QToolButton(self)
-            confbutton.setText(">")
-            layout.addWidget(confbutton,row,1)
-            self.axisconfbuttons.append((confbutton,analogconf_ui.AnalogOptionsDialog(str(c[1]),c[0],self.main)))
-            confbutton.clicked.connect(self.axisconfbuttons[row][1].exec)
-            confbutton.setEnabled(enabled)
-            self.axisbtns.button(c[0]).stateChanged.connect(confbutton.setEnabled)
-            row+=1
-    
-            #confbutton.setEnabled(creatable or enabled)
+            creatable = c[2]
             btn.setEnabled(creatable or enabled)
+            confbutton.setEnabled(enabled)
 
-        self.groupBox_analogaxes.setLayout(layout)
+    def open_analog_options(self,class_id,name):
+        dialog = self.option_dialogs.get(
+            ("ain",class_id),functools.partial(analogconf_ui.AnalogOptionsDialog,name,class_id,self.main)
+        )
+        dialog.exec()
         
     @throttle(50)
     def cffilter_changed(self,v,send=True):
@@ -389,7 +382,7 @@ class FfbUI(WidgetUI,CommunicationHandler):
     
     def updateSliders(self):
         self.send_commands("fx",["spring","damper","friction","inertia"],0,typechar="!")
-        self.send_commands("fx",["filterCfQ","filterCfFreq","spring","damper","friction","inertia"],0)
+        self.send_commands("fx",["filterCfQ","filterCfFreq","spring","damper","friction","inertia"],0,cached=True)
 
 
 
@@ -0,0 +1,958 @@
+"""Benchmarks and checks of the comms stack and the UI.
+
+Most commands drive the virtual board of ffbsim over a pseudo terminal, so no hardware is needed.
+Each prints its measurements and exits with status 1 if a check failed.
+
+    python ffbbench.py framer --frames 20000 --dumps 10 --chunk 64 512
+    python ffbbench.py dispatch --sizes 10 100 1000 10000
+    python ffbbench.py stall --busy 300 --period 500 --duration 5
+    python ffbbench.py critical --latency 20 --duration 4
+    python ffbbench.py fuzz --garbage 0 0.01 0.1 0.3
+    python ffbbench.py startup --runs 7 --connect
+    python ffbbench.py forms --repeat 15
+    python ffbbench.py options --classes 16 --changes 60
+    python ffbbench.py soak --duration 86400 --report 600
+    python ffbbench.py throttle --sliders 100 --moves 200
+
+Linux and macOS only.
+
+Module : ffbbench
+"""
+import argparse
+import contextlib
+import gc
+import glob
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import weakref
+
+import PyQt6.QtCore
+import PyQt6.QtWidgets
+import PyQt6.uic
+import base_ui
+import ffbsim
+import helper
+import serial_comms
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+# Written by the configurator and SerialComms, restored after a run
+USER_FILES = ("profiles.json", serial_comms.MetadataCache.FILENAME)
+
+
+@contextlib.contextmanager
+def kept_files(names):
+    """Restore the files as they were before the with block, removing the ones that did not exist."""
+    saved = {}
+    for name in names:
+        if os.path.exists(name):
+            with open(name, "rb") as file:
+                saved[name] = file.read()
+    try:
+        yield
+    finally:
+        for name in names:
+            if name in saved:
+                with open(name, "wb") as file:
+                    file.write(saved[name])
+            elif os.path.exists(name):
+                os.remove(name)
+
+
+def run_events(ms: int, until=None):
+    """Run the event loop for ms or until until() is true. Returns false on timeout."""
+    loop = PyQt6.QtCore.QEventLoop()
+    PyQt6.QtCore.QTimer.singleShot(ms, loop.quit)
+    if until is not None:
+        if until():
+            return True
+        check = PyQt6.QtCore.QTimer()
+        check.timeout.connect(lambda: until() and loop.quit())
+        check.start(1)
+    loop.exec()
+    return until() if until is not None else True
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))] if values else 0
+
+
+def split(data: bytes, rnd: random.Random, max_chunk: int):
+    """Cut data into chunks of random size like the port delivers them."""
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rnd.randrange(1, max_chunk + 1)
+        chunks.append(data[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def flashdump(rnd: random.Random, entries: int):
+    return "[sys.0.flashdump?|" + "\n".join(F"{rnd.randrange(65536)}:{addr}" for addr in range(entries)) + "]\n"
+
+
+class StringParser:
+    """The parser used before ReplyFramer, kept as reference.
+
+    Decodes every chunk into a growing string and searches the whole string again for each reply.
+    """
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.replytext = ""
+
+    def feed(self, data: bytes):
+        replies = []
+        try:
+            self.replytext += data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+        while self.replytext:
+            end = self.replytext.find("]")
+            start = self.replytext.find("[")
+            if not (start >= 0 and end > 1 and start < end):
+                break
+            match = self.regex.search(self.replytext, start, end + 1)
+            if match:
+                replies.append(serial_comms.parse_reply(match))
+                self.replytext = self.replytext[match.end():]
+            else:
+                self.replytext = self.replytext[end + 1:]
+        return replies
+
+
+def string_parser():
+    return StringParser(serial_comms.SerialComms.cmdRegex).feed
+
+
+def reply_framer():
+    framer = serial_comms.ReplyFramer(serial_comms.SerialComms.cmdRegex)
+    return lambda chunk: [record for record, _ in framer.feed(chunk) if record is not None]
+
+
+def cmd_framer(args):
+    """Parse small replies and flash dumps with the old string parser and with ReplyFramer,
+    then read flash dumps from the simulated board."""
+    rnd = random.Random(args.seed)
+    workloads = {
+        "small replies": [F"[axis.{i % 2}.curpos?|{rnd.randrange(-99999, 99999)}]\n" for i in range(args.frames)],
+        "flash dumps": [flashdump(rnd, args.dump_entries) for _ in range(args.dumps)],
+    }
+    status = EXIT_OK
+    for workload, frames in workloads.items():
+        data = "".join(frames).encode()
+        for max_chunk in args.chunk:
+            chunks = split(data, rnd, max_chunk)
+            print(F"{workload}: {len(data) / 1e6:.1f} MB, {len(frames)} replies in chunks of 1-{max_chunk} bytes")
+            for name, create in (("string parser", string_parser), ("ReplyFramer", reply_framer)):
+                best = float("inf")
+                for _ in range(args.repeat):
+                    feed = create()
+                    replies = 0
+                    start = time.perf_counter()
+                    for chunk in chunks:
+                        replies += len(feed(chunk))
+                    best = min(best, time.perf_counter() - start)
+                print(F"  {name:14s} {1000 * best:8.1f} ms  {len(data) / best / 1e6:6.2f} MB/s  {replies} replies")
+                if replies != len(frames):
+                    status = EXIT_FAILED
+
+    # Flash dumps through the pty, the worker thread and the dispatch
+    with ffbsim.Simulator(chunk=args.sim_chunk, seed=args.seed) as sim:
+        sim.board.flash.update({0x1000 + addr: rnd.randrange(65536) for addr in range(args.dump_entries)})
+        comms = serial_comms.SerialComms()
+        try:
+            comms.open(sim.port)
+            received = 0
+            start = time.perf_counter()
+            for _ in range(args.dumps):
+                future = comms.request("sys", "flashdump", timeout=10000)
+                run_events(10000, future.done)
+                if not future.done() or future.exception():
+                    print("ffbsim: flash dump not received")
+                    status = EXIT_FAILED
+                    break
+                received += 1
+            elapsed = time.perf_counter() - start
+            print(F"ffbsim: {received} flash dumps in {1000 * elapsed:.1f} ms, {sim.counters['bytes_out'] / elapsed / 1e6:.2f} MB/s")
+        finally:
+            comms.shutdown()
+    return status
+
+
+class ClassListRegistry:
+    """The callback store used before CallbackRegistry, kept as reference.
+
+    Keeps one list per class and checks every entry of the class for each reply.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, cls, cmd, callback, instance=0, conversion=None, adr=None, typechar="?"):
+        self.entries.setdefault(cls, []).append(
+            {"cmd": cmd, "callback": callback, "instance": instance, "convert": conversion, "address": adr, "typechar": typechar}
+        )
+
+    def dispatch(self, record):
+        for entry in self.entries.get(record.cls, ()):
+            if entry["cmd"] != record.cmd:
+                continue
+            if record.instance != entry["instance"] and entry["instance"] != 0xff:
+                continue
+            if record.typechar != entry["typechar"] and entry["typechar"] is not None:
+                continue
+            if record.adr is not None and record.adr != entry["address"]:
+                continue
+            entry["callback"](entry["convert"](record.reply) if entry["convert"] else record.reply)
+
+
+def cmd_dispatch(args):
+    """Time the dispatch of one reply while more and more callbacks of other commands are registered."""
+    record = serial_comms.ReplyRecord("tmc", 0, "c5", "?", None, None, "1")
+    status = EXIT_OK
+    print(F"{'callbacks':>9s} {'class list':>12s} {'CallbackRegistry':>17s}")
+    for size in args.sizes:
+        calls = []
+        matching = 0
+        old = ClassListRegistry()
+        new = serial_comms.CallbackRegistry()
+        for i in range(size):
+            cmd, instance = F"c{i % args.commands}", i // args.commands % 4
+            matching += cmd == record.cmd and instance == record.instance
+            old.add("tmc", cmd, calls.append, instance, int)
+            new.add(object(), "tmc", cmd, calls.append, instance, int)  # One handler per widget
+        timings = []
+        for dispatch in (old.dispatch, lambda record: new.deliver(new.dispatch(record)[0])):
+            calls.clear()
+            start = time.perf_counter()
+            for _ in range(args.replies):
+                dispatch(record)
+            timings.append((time.perf_counter() - start) / args.replies * 1e6)
+            if len(calls) != args.replies * matching:
+                status = EXIT_FAILED
+        print(F"{size:9d} {timings[0]:9.2f} us {timings[1]:14.2f} us")
+    return status
+
+
+def cmd_stall(args):
+    """Block the GUI thread periodically while the simulated board is polled.
+
+    The comms thread keeps reading while the GUI is busy, so no reply may be lost and the round
+    trips it measures must stay shorter than the blocked time.
+    """
+    with ffbsim.Simulator(latency=args.latency, seed=args.seed) as sim:
+        # Flash dumps larger than the pty buffer stall the board if nobody reads
+        sim.board.flash.update({0x1000 + addr: addr for addr in range(args.dump_entries)})
+        comms = serial_comms.SerialComms()
+        try:
+            comms.open(sim.port)
+            comms.setStatsEnabled(True)
+            sent = []
+            delays = []
+            blocked = []
+
+            def poll():
+                sent_at = time.perf_counter()
+                sent.append(sent_at)
+                cmd = "flashdump" if len(sent) % args.dump_every == 0 else "vint"
+                comms.getValueAsync(None, "sys", cmd, lambda _, sent_at=sent_at: delays.append(time.perf_counter() - sent_at))
+
+            def busy():
+                start = time.perf_counter()
+                while time.perf_counter() - start < args.busy / 1000:
+                    pass
+                blocked.append(time.perf_counter() - start)
+
+            poll_timer = PyQt6.QtCore.QTimer()
+            poll_timer.timeout.connect(poll)
+            poll_timer.start(args.interval)
+            busy_timer = PyQt6.QtCore.QTimer()
+            busy_timer.timeout.connect(busy)
+            busy_timer.start(args.period)
+            run_events(int(args.duration * 1000))
+            poll_timer.stop()
+            busy_timer.stop()
+            run_events(5000, lambda: len(delays) == len(sent))
+            stats = comms.statistics()
+        finally:
+            comms.shutdown()
+
+    rtt = {name: latency["p99"] for name, latency in stats["latency"].items()}
+    print(F"GUI blocked {len(blocked)}x for {1000 * max(blocked, default=0):.0f} ms, {len(sent)} requests, {len(delays)} answered, "
+          F"{stats['send']['timed_out']} timed out")
+    print(F"GUI delivery delay p50 {1000 * percentile(delays, 50):.1f} ms, p99 {1000 * percentile(delays, 99):.1f} ms, "
+          F"max {1000 * max(delays, default=0):.1f} ms")
+    print("comms thread round trip p99 " + ", ".join(F"{name} {ms:.1f} ms" for name, ms in rtt.items()))
+    if len(delays) != len(sent) or stats["send"]["timed_out"]:
+        return EXIT_FAILED
+    if any(ms >= args.busy for ms in rtt.values()):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def log_commands(sim: ffbsim.Simulator):
+    """Record every command the simulated board receives with its arrival time."""
+    received = []
+    command = sim.board.command
+    def logged(text):
+        received.append((time.perf_counter(), text))
+        return command(text)
+    sim.board.command = logged
+    return received
+
+
+def critical_latency(args, priority):
+    """ms from sending an fx.spring write until the board reads it, while the send window is saturated
+    by polled streams and bursts of background reads of the sys class."""
+    with ffbsim.Simulator(latency=args.latency, seed=args.seed) as sim:
+        received = log_commands(sim)
+        comms = serial_comms.SerialComms()
+        try:
+            comms.open(sim.port)
+            addresses = sorted(sim.board.flash)
+            for adr in addresses[:args.streams]:
+                comms.poller.subscribe(comms, "sys", "flashraw", args.stream_period, adr=adr, max_period=args.stream_period)
+            def burst():
+                for i in range(args.burst):
+                    comms.getValueAsync(None, "sys", "flashraw", lambda _: None, adr=addresses[i % len(addresses)],
+                                        priority=serial_comms.PRIORITY_BACKGROUND)
+            sent = {}
+            def write():
+                value = len(sent) + 1
+                sent[F"fx.0.spring={value}"] = time.perf_counter()
+                comms.sendValue(None, "fx", "spring", value, priority=priority)
+            timers = []
+            for callback, interval in ((burst, 200), (write, 97)):
+                timer = PyQt6.QtCore.QTimer()
+                timer.timeout.connect(callback)
+                timer.start(interval)
+                timers.append(timer)
+            run_events(int(args.duration * 1000))
+            for timer in timers:
+                timer.stop()
+            comms.poller.remove_handler(comms)
+            run_events(5000, comms.isIdle)
+        finally:
+            comms.shutdown()
+    return [1000 * (at - sent[text]) for at, text in received if text in sent], len(sent)
+
+
+def ordering(args):
+    """Checks that critical commands stay behind earlier writes and commands of their class instance."""
+    with ffbsim.Simulator(latency=args.latency, seed=args.seed) as sim:
+        received = log_commands(sim)
+        comms = serial_comms.SerialComms()
+        results = {}
+        try:
+            comms.open(sim.port)
+            def commands(last, *prefixes):
+                """Commands with one of the prefixes received until last"""
+                run_events(1000, lambda: any(text == last for _, text in received))
+                texts = [text for _, text in received if text.startswith(prefixes)]
+                received.clear()
+                return texts
+            # A start still waiting for the send throttle, then a stop
+            comms.sendCommand("axis", "power", 0)
+            comms.sendValue(None, "rmd", "start", 0)
+            comms.sendValue(None, "rmd", "stop", 0, priority=serial_comms.PRIORITY_CRITICAL)
+            results["stop after start"] = commands("rmd.0.stop=0", "rmd") == ["rmd.0.start=0", "rmd.0.stop=0"]
+            # All credits taken by reads, then a save and a reboot
+            for _ in range(40):
+                comms.sendCommand("axis", "power", 0)
+            comms.sendValue(None, "fx", "spring", 10)
+            comms.sendCommand("sys", "save", typechar="")
+            comms.sendCommand("sys", "reboot", typechar="", priority=serial_comms.PRIORITY_CRITICAL)
+            results["reboot after write and save"] = commands("sys.0.reboot", "fx", "sys") == ["fx.0.spring=10", "sys.0.save", "sys.0.reboot"]
+            # A critical write replaces the same unsent write
+            comms.sendCommand("axis", "power", 0)
+            comms.sendValue(None, "fx", "damper", 5)
+            comms.sendValue(None, "fx", "damper", 7, priority=serial_comms.PRIORITY_CRITICAL)
+            results["critical write replaces unsent write"] = commands("fx.0.damper=7", "fx.0.damper") == ["fx.0.damper=7"]
+        finally:
+            comms.shutdown()
+    return results
+
+
+def cmd_critical(args):
+    """Latency of a write per priority under load and the order of critical commands."""
+    status = EXIT_OK
+    for name, priority in (("critical", serial_comms.PRIORITY_CRITICAL), ("interactive", serial_comms.PRIORITY_INTERACTIVE),
+                           ("background", serial_comms.PRIORITY_BACKGROUND)):
+        latencies, sent = critical_latency(args, priority)
+        print(F"{name:12s} p50 {percentile(latencies, 50):6.1f} ms  p99 {percentile(latencies, 99):6.1f} ms  "
+              F"max {max(latencies, default=0):6.1f} ms  {len(latencies)}/{sent} received")
+        if priority == serial_comms.PRIORITY_CRITICAL and (len(latencies) != sent or percentile(latencies, 99) > args.max_critical):
+            status = EXIT_FAILED
+    for check, passed in ordering(args).items():
+        print(F"{check}: {'ok' if passed else 'FAILED'}")
+        if not passed:
+            status = EXIT_FAILED
+    return status
+
+
+# Noise of ffbsim and long debug output with stray "[" or broken utf-8
+GARBAGE = ffbsim.Simulator.GARBAGE + (
+    lambda rnd: b"Debug: " + bytes(rnd.choice(b"abc[ \n") for _ in range(rnd.randrange(5000, 20000))),
+    lambda rnd: "[\u00fcn\u00efcode garbage".encode()[:rnd.randrange(2, 20)],
+)
+
+
+def fuzz_stream(rnd, frames, garbage, dump_every, dump_entries):
+    """Replies with noise in front of some of them. Returns the stream, the expected frame texts and the number of noise runs."""
+    data = []
+    expected = []
+    noise = 0
+    for i in range(frames):
+        if rnd.random() < garbage:
+            data.append(rnd.choice(GARBAGE)(rnd))
+            noise += 1
+        if dump_every and i % dump_every == 0:
+            frame = flashdump(rnd, dump_entries)
+        else:
+            frame = F"[axis.0.pos?{i}|{rnd.randrange(-99999, 99999)}]\n"
+        data.append(frame.encode())
+        expected.append(frame[1:-2])
+    return b"".join(data), expected, noise
+
+
+def cmd_fuzz(args):
+    """Feed replies mixed with noise to ReplyFramer in random chunks, then read values from ffbsim
+    sending noise. Every reply must be recovered, nothing else parsed, the buffer stay bounded and
+    every noise run be counted as one resync at most."""
+    rnd = random.Random(args.seed)
+    status = EXIT_OK
+    for garbage in args.garbage:
+        data, expected, noise = fuzz_stream(rnd, args.frames, garbage, args.dump_every, args.dump_entries)
+        framer = serial_comms.ReplyFramer(serial_comms.SerialComms.cmdRegex)
+        frames = []
+        peak = 0
+        start = time.perf_counter()
+        for chunk in split(data, rnd, args.chunk):
+            frames += [text for record, text in framer.feed(chunk) if record is not None]
+            peak = max(peak, len(framer.buffer))
+        elapsed = time.perf_counter() - start
+        missing = len(set(expected) - set(frames))
+        spurious = len(set(frames) - set(expected))
+        print(F"garbage {garbage}: {len(data) / 1e6:.1f} MB at {len(data) / elapsed / 1e6:.1f} MB/s, "
+              F"{len(expected) - missing}/{len(expected)} replies, {spurious} spurious, peak buffer {peak} B, "
+              F"discarded {framer.discarded} B, {framer.resyncs} resyncs after {noise} noise runs, {framer.streamed} streamed")
+        if missing or spurious or peak > args.max_buffer or framer.resyncs > noise:
+            status = EXIT_FAILED
+
+    # Values and a flash dump read through the port while ffbsim sends noise in small chunks
+    with ffbsim.Simulator(garbage=max(args.garbage), chunk=64, seed=args.seed) as sim:
+        sim.board.flash.update({0x1000 + addr: rnd.randrange(65536) for addr in range(args.dump_entries)})
+        flash = dict(sim.board.flash)
+        comms = serial_comms.SerialComms()
+        try:
+            comms.open(sim.port)
+            reads = {adr: comms.request("sys", "flashraw", adr=adr, conversion=int, timeout=5000) for adr in list(flash)[:args.sim_reads]}
+            dump = comms.request("sys", "flashdump", timeout=10000)
+            futures = [*reads.values(), dump]
+            run_events(20000, lambda: all(future.done() for future in futures))
+            wrong = sum(1 for adr, future in reads.items() if not future.done() or future.exception() or future.result() != flash[adr])
+            dumped = dump.done() and not dump.exception() and dump.result() == "\n".join(F"{value}:{adr}" for adr, value in sorted(flash.items()))
+        finally:
+            comms.shutdown()
+    print(F"ffbsim garbage {max(args.garbage)}: {len(reads) - wrong}/{len(reads)} values and the flash dump "
+          F"{'correct' if dumped else 'WRONG'}, {sim.counters['garbage']} B of noise")
+    if wrong or not dumped:
+        status = EXIT_FAILED
+    return status
+
+
+# Modules that must not be loaded before the window is shown
+LAZY_MODULES = ("requests", "usb", "PyQt6.QtCharts", "updater", "pydfu", "dfu_ui", "tmc4671_ui", "effects_graph_ui", "vesc_ui")
+
+# Runs main.py in a fresh process and prints its timings as json
+STARTUP_PROBE = """
+import time
+start = time.perf_counter()
+import json, runpy, sys
+import PyQt6.QtCore, PyQt6.QtWidgets
+marks = {"qt": time.perf_counter() - start}
+CONNECT, LAZY_MODULES = %r, %r
+app_init = PyQt6.QtWidgets.QApplication.__init__
+def init(self, *args):
+    marks["imports"] = time.perf_counter() - start - marks["qt"]
+    app_init(self, *args)
+PyQt6.QtWidgets.QApplication.__init__ = init
+class Shown(Exception):
+    pass
+window_show = PyQt6.QtWidgets.QMainWindow.show
+windows = []
+def show(self):
+    window_show(self)
+    PyQt6.QtWidgets.QApplication.processEvents()
+    marks["window"] = time.perf_counter() - start
+    marks["loaded"] = [name for name in LAZY_MODULES if name in sys.modules]
+    windows.append(self)
+    if not CONNECT:
+        raise Shown()
+    import requests
+    requests.get = lambda *args, **kwargs: None  # No update check
+PyQt6.QtWidgets.QMainWindow.show = show
+def exec_(self):
+    import ffbsim
+    window = windows[0]
+    loop = PyQt6.QtCore.QEventLoop()
+    with ffbsim.Simulator(axes=2, latency=1) as sim:
+        connected = time.perf_counter()
+        def initialized(ok):
+            if ok:
+                marks["tabs"] = time.perf_counter() - connected
+                loop.quit()
+        window.tabsinitialized.connect(initialized)
+        window.comms.open(sim.port)
+        window.serialchooser.update()
+        PyQt6.QtCore.QTimer.singleShot(5000, loop.quit)
+        loop.exec()
+        window.comms.shutdown()
+    return 0
+PyQt6.QtWidgets.QApplication.exec = exec_
+sys.argv = ["main.py"]
+try:
+    runpy.run_path("main.py", run_name="__main__")
+except (Shown, SystemExit):
+    pass
+windows[0].comms.shutdown()
+print(json.dumps(marks))
+"""
+
+
+def cmd_startup(args):
+    """Start main.py in fresh processes and time the imports and the shown window.
+    With connect the time from opening ffbsim until the tabs are added is measured too."""
+    runs = []
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    for _ in range(args.runs):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE % (args.connect, LAZY_MODULES)],
+            env=env, capture_output=True, text=True, timeout=60, check=False,
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+        if not lines:
+            print(result.stderr, file=sys.stderr)
+            return EXIT_FAILED
+        runs.append(json.loads(lines[-1]))
+
+    def median_ms(name):
+        return 1000 * statistics.median(run[name] for run in runs)
+    print(F"median of {len(runs)} runs: PyQt6 {median_ms('qt'):.0f} ms, imports after PyQt6 {median_ms('imports'):.0f} ms, "
+          F"window shown {median_ms('window'):.0f} ms after the start")
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    print("loaded when the window is shown: " + (", ".join(loaded) or "none of " + ", ".join(LAZY_MODULES)))
+    status = EXIT_FAILED if loaded else EXIT_OK
+    if args.connect:
+        tabs = [run["tabs"] for run in runs if "tabs" in run]
+        print(F"tabs added {1000 * statistics.median(tabs):.0f} ms after connecting to ffbsim" if tabs else "tabs not added")
+        if len(tabs) != len(runs):
+            status = EXIT_FAILED
+    return status
+
+
+def form_widget(path: str):
+    """Empty widget of the top level class of a .ui file"""
+    with open(path, encoding="utf_8") as file:
+        cls = re.search(r'<widget class="(\w+)"', file.read()).group(1)
+    return {"QMainWindow": PyQt6.QtWidgets.QMainWindow, "QDialog": PyQt6.QtWidgets.QDialog}.get(cls, PyQt6.QtWidgets.QWidget)()
+
+
+def form_tree(widget):
+    """Named children, attributes and title of a built form"""
+    children = sorted((type(child).__name__, child.objectName()) for child in widget.findChildren(PyQt6.QtCore.QObject) if child.objectName())
+    return children, sorted(vars(widget)), widget.windowTitle()
+
+
+def cmd_forms(args):
+    """Build every form with uic.loadUi and with the compiled form cache. Both must produce the same widgets."""
+    import PyQt6.QtCharts  # pylint: disable=import-outside-toplevel, unused-import # Used by the forms of the graph dialogs
+    forms = sorted(glob.glob(helper.res_path("*.ui")))
+    app = PyQt6.QtWidgets.QApplication.instance()
+    status = EXIT_OK
+
+    # First build with an empty cache directory compiles and writes every form
+    with tempfile.TemporaryDirectory() as directory:
+        cache = base_ui.FormCache(directory)
+        start = time.perf_counter()
+        for path in forms:
+            cache.setup(path, form_widget(path))
+        cold = time.perf_counter() - start
+
+    rows = []
+    for path in forms:
+        loaded, cached = form_widget(path), form_widget(path)
+        PyQt6.uic.loadUi(path, loaded)
+        base_ui.FORMS.setup(path, cached)
+        if form_tree(loaded) != form_tree(cached):
+            print(F"{os.path.basename(path)}: the cached form differs from loadUi")
+            status = EXIT_FAILED
+        timings = []
+        for build in (lambda widget: PyQt6.uic.loadUi(path, widget), lambda widget: base_ui.FORMS.setup(path, widget)):
+            samples = []
+            for _ in range(args.repeat):
+                widget = form_widget(path)
+                start = time.perf_counter()
+                build(widget)
+                samples.append(time.perf_counter() - start)
+                widget.deleteLater()
+            app.processEvents()
+            timings.append(1000 * statistics.median(samples))
+        rows.append((os.path.basename(path), *timings))
+
+    print(F"{'form':24s} {'loadUi':>9s} {'cached':>9s}")
+    for name, loaded, cached in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(F"{name:24s} {loaded:6.2f} ms {cached:6.2f} ms")
+    print(F"all {len(forms)} forms: loadUi {sum(row[1] for row in rows):.1f} ms, cached {sum(row[2] for row in rows):.1f} ms, "
+          F"first build with an empty cache {1000 * cold:.1f} ms")
+    return status
+
+
+class MainWindow(PyQt6.QtWidgets.QTabWidget):
+    """Holds a tab in place of main.MainUi"""
+
+    def add_tab(self, widget, name):
+        return self.addTab(widget, name)
+
+    def select_tab(self, idx):
+        self.setCurrentIndex(idx)
+
+    def del_tab(self, widget):
+        self.removeTab(self.indexOf(widget))
+        base_ui.CommunicationHandler.remove_callbacks(widget)
+        widget.deleteLater()
+
+    def log(self, message):
+        pass
+
+
+def cmd_options(args):
+    """Change the button and analog source masks of the FFB tab and open the options dialog of every source.
+
+    The tab is connected to ffbsim. Rows must only be rebuilt when the classes change and after the tab
+    is deleted no options dialog may be left nor any callback of one or of its sub dialogs.
+    """
+    # pylint: disable=import-outside-toplevel
+    import serial_ui  # pylint: disable=unused-import # Imported before main like main.py does, main imports it back
+    import ffb_ui
+    import optionsdialog
+    app = PyQt6.QtWidgets.QApplication.instance()
+    status = EXIT_OK
+    with ffbsim.Simulator(latency=1, seed=args.seed) as sim:
+        window = MainWindow()
+        comms = base_ui.CommunicationHandler.comms = serial_comms.SerialComms(window)
+        try:
+            comms.open(sim.port)
+            callbacks = len(comms.callbackDict)
+            tab = ffb_ui.FfbUI(main=window)
+            run_events(2000, comms.isIdle)
+            classes = "\n".join(F"{i}:1:Source {i}" for i in range(args.classes))
+            tab.updateButtonClassesCB(classes)
+            tab.updateAnalogClassesCB(classes)
+            full = (1 << args.classes) - 1
+            start = time.perf_counter()
+            tab.updateButtonSources(0)
+            tab.updateAnalogSources(full)
+            first = 1000 * (time.perf_counter() - start)
+            gc.collect()
+            app.processEvents()
+            widgets = len(app.allWidgets())
+
+            tracemalloc.start()
+            timings = []
+            for change in range(args.changes):
+                mask = 0x5a5a * (change + 1) & full
+                start = time.perf_counter()
+                tab.updateButtonSources(mask)
+                tab.updateAnalogSources(mask ^ full)
+                timings.append(1000 * (time.perf_counter() - start))
+                app.processEvents()
+            gc.collect()
+            app.processEvents()
+            heap, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            widgets = len(app.allWidgets()) - widgets
+            print(F"mask change of {args.classes} button and {args.classes} analog sources: median {statistics.median(timings):.2f} ms, "
+                  F"first {first:.2f} ms with the rows; after {args.changes} changes {widgets:+d} widgets, {heap / 1024:+.0f} KiB heap")
+            if widgets:
+                status = EXIT_FAILED
+
+            def open_sub_dialogs(dialog):
+                """Return at once instead of waiting for the user, opening the CAN or I2C settings on the way."""
+                for sub in dialog.findChildren(optionsdialog.OptionsDialog):
+                    sub.exec()
+                return 0
+            dialog_exec = PyQt6.QtWidgets.QDialog.exec
+            PyQt6.QtWidgets.QDialog.exec = open_sub_dialogs
+            try:
+                start = time.perf_counter()
+                for button in tab.buttonconfbuttons + tab.axisconfbuttons:
+                    button.click()
+                elapsed = time.perf_counter() - start
+            finally:
+                PyQt6.QtWidgets.QDialog.exec = dialog_exec
+            print(F"opened {len(tab.buttonconfbuttons) + len(tab.axisconfbuttons)} options dialogs in {1000 * elapsed:.1f} ms, "
+                  F"{len(tab.option_dialogs)} kept")
+            run_events(2000, comms.isIdle)
+
+            window.del_tab(tab)
+            del tab
+            PyQt6.QtCore.QCoreApplication.sendPostedEvents(None, PyQt6.QtCore.QEvent.Type.DeferredDelete.value)
+            gc.collect()
+            dialogs = sum(isinstance(widget, optionsdialog.OptionsDialog) for widget in app.allWidgets())
+            print(F"after the tab is deleted: {dialogs} options dialogs alive, {len(comms.callbackDict) - callbacks:+d} callbacks")
+            if dialogs or len(comms.callbackDict) != callbacks:
+                status = EXIT_FAILED
+        finally:
+            comms.shutdown()
+            window.deleteLater()
+    return status
+
+
+SOAK_COMMANDS = ("vint", "vext", "heapfree", "errors", "nosuchcmd")  # The board answers the last with NOT_FOUND
+
+
+def cmd_soak(args):
+    """Poll streams and send one-shot reads to a lossy simulated board for a long time.
+
+    Lost replies and port resets leave one-shot callbacks behind until they expire, so the
+    callback registry must stay below what the read rate and timeout allow and be empty after close.
+    The heap may not grow after the first report.
+    """
+    with ffbsim.Simulator(latency=args.latency, jitter=args.latency, loss=args.loss, garbage=args.garbage, seed=args.seed) as sim:
+        comms = serial_comms.SerialComms()
+        handler = object()
+        counts = {"sent": 0, "answered": 0, "timed_out": 0, "resets": 0}
+        largest = {"entries": 0, "deadlines": 0}
+        # Answered reads stay in the deadline heap until their deadline is swept, twice that for late sweeps
+        bound = 2 * args.rate * (args.timeout + comms.sweeper.interval()) / 1000 + args.streams
+        rnd = random.Random(args.seed)
+        try:
+            comms.open(sim.port)
+            addresses = sorted(sim.board.flash)
+            for stream in range(args.streams):
+                comms.poller.subscribe(handler, "sys", "flashraw", args.stream_period, adr=addresses[stream % len(addresses)],
+                                       callback=lambda _: None)
+
+            def answered():
+                counts["answered"] += 1
+
+            def timed_out(_):
+                counts["timed_out"] += 1
+
+            start = time.monotonic()
+            def send():
+                due = int(args.rate * (time.monotonic() - start))
+                for _ in range(due - counts["sent"]):
+                    counts["sent"] += 1
+                    # A callback per read like the UI, identical callbacks share one entry
+                    comms.getValueAsync(handler, "sys", rnd.choice(SOAK_COMMANDS), lambda _: answered(), timeout=args.timeout,
+                                        on_timeout=timed_out, priority=serial_comms.PRIORITY_BACKGROUND)
+                stats = comms.callbackDict.stats()
+                for name, value in largest.items():
+                    largest[name] = max(value, stats[name])
+
+            def reset():
+                counts["resets"] += 1
+                comms.reset()
+
+            timers = []
+            for interval, slot in ((10, send), (int(args.reset * 1000), reset)):
+                if interval > 0:
+                    timer = PyQt6.QtCore.QTimer()
+                    timer.timeout.connect(slot)
+                    timer.start(interval)
+                    timers.append(timer)
+
+            run_events(1000)  # Warm up, the first replies fill caches
+            gc.collect()
+            tracemalloc.start()
+            heap, _ = tracemalloc.get_traced_memory()
+            print(" time   sent    answered  timed out  queued  entries  one-shot  deadlines  expired   heap")
+            report = 0
+            growth = []
+            while report * args.report < args.duration:
+                report += 1
+                run_events(int(1000 * min(args.report, args.duration - (report - 1) * args.report)))
+                gc.collect()
+                stats = comms.callbackDict.stats()
+                queued = comms.statistics()["send"]["queued"]
+                growth.append(tracemalloc.get_traced_memory()[0] - heap)
+                print(F"{time.monotonic() - start:5.0f}s {counts['sent']:7d} {counts['answered']:9d} {counts['timed_out']:9d} {queued:7d} "
+                      F"{stats['entries']:8d} {stats['one_shot']:9d} {stats['deadlines']:10d} {stats['expired']:8d} "
+                      F"{growth[-1] / 1024:+7.0f} KiB")
+            tracemalloc.stop()
+            for timer in timers:
+                timer.stop()
+
+            comms.poller.remove_handler(handler)
+            comms.close()
+            remaining = comms.callbackDict.stats()
+        finally:
+            comms.shutdown()
+
+    print(F"{sim.counters['dropped']} replies dropped, {sim.counters['garbage'] / 1024:.0f} KiB noise, {counts['resets']} port resets; "
+          F"largest registry {largest['entries']} entries, {largest['deadlines']} deadlines, bound {bound:.0f}")
+    print(F"after close: {remaining['entries']} entries, {remaining['deadlines']} deadlines; "
+          F"heap grew {(growth[-1] - growth[0]) / 1024:+.0f} KiB after the first report")
+    if max(largest.values()) > bound or remaining["entries"] or remaining["deadlines"]:
+        return EXIT_FAILED
+    if (growth[-1] - growth[0]) / 1024 > args.max_heap:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+class Slider(PyQt6.QtCore.QObject):
+    """Writes its value at most every 50 ms like the sliders of the tabs"""
+
+    def __init__(self):
+        super().__init__()
+        self.written = []
+
+    @helper.throttle(50)
+    def write(self, value):
+        self.written.append(value)
+
+
+def cmd_throttle(args):
+    """Move throttled sliders, then delete them, half of them with a write still pending.
+
+    The last value of every slider must be written and no slider may outlive its last reference.
+    """
+    sliders = [Slider() for _ in range(args.sliders)]
+    start = time.perf_counter()
+    for value in range(args.moves):
+        for slider in sliders:
+            slider.write(value)
+    elapsed = time.perf_counter() - start
+    run_events(1000, lambda: all(slider.written[-1] == args.moves - 1 for slider in sliders))
+    counters = helper.throttle_counters()[Slider.write.__qualname__]
+    print(F"{args.moves} moves of {args.sliders} sliders in {1000 * elapsed:.1f} ms, {counters['delivered']} writes, "
+          F"{counters['suppressed']} suppressed")
+    status = EXIT_OK
+    if any(slider.written[-1] != args.moves - 1 for slider in sliders):
+        status = EXIT_FAILED
+
+    for slider in sliders[::2]:
+        slider.write(-1)  # Pending as the interval has not passed
+    refs = [weakref.ref(slider) for slider in sliders]
+    del sliders, slider
+    gc.collect()
+    alive = sum(ref() is not None for ref in refs)
+    print(F"after deleting them: {alive} sliders alive, {len(Slider.write.limiters)} rate limiters")
+    if alive or len(Slider.write.limiters):
+        status = EXIT_FAILED
+    return status
+
+
+def parser():
+    arg_parser = argparse.ArgumentParser(prog="ffbbench", description="Open FFBoard comms and UI benchmarks")
+    arg_parser.add_argument("--seed", type=int, default=1, help="random seed")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    framer = commands.add_parser("framer", help="reply parsing throughput, old string parser against ReplyFramer")
+    framer.add_argument("--frames", type=int, default=20000, help="small replies")
+    framer.add_argument("--dumps", type=int, default=10, help="flash dump replies")
+    framer.add_argument("--dump-entries", type=int, default=20000)
+    framer.add_argument("--chunk", type=int, nargs="+", default=[64, 512], help="largest chunk in bytes")
+    framer.add_argument("--repeat", type=int, default=3, help="best of n runs")
+    framer.add_argument("--sim-chunk", type=int, default=0, help="ffbsim splits replies into writes of this many bytes")
+
+    dispatch = commands.add_parser("dispatch", help="reply dispatch time against the number of registered callbacks")
+    dispatch.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    dispatch.add_argument("--commands", type=int, default=300, help="distinct commands the callbacks are spread over")
+    dispatch.add_argument("--replies", type=int, default=20000, help="replies dispatched per size")
+
+    stall = commands.add_parser("stall", help="replies and round trips while the GUI thread is blocked")
+    stall.add_argument("--busy", type=int, default=300, help="ms the GUI thread is blocked")
+    stall.add_argument("--period", type=int, default=500, help="ms between blocks")
+    stall.add_argument("--interval", type=int, default=10, help="ms between requests")
+    stall.add_argument("--duration", type=float, default=5, help="seconds")
+    stall.add_argument("--latency", type=float, default=1, help="ms until ffbsim replies")
+    stall.add_argument("--dump-every", type=int, default=10, help="every n-th request reads the flash dump")
+    stall.add_argument("--dump-entries", type=int, default=2000)
+
+    critical = commands.add_parser("critical", help="latency of critical commands under load and their order")
+    critical.add_argument("--latency", type=float, default=20, help="ms until ffbsim replies")
+    critical.add_argument("--duration", type=float, default=4, help="seconds per priority")
+    critical.add_argument("--streams", type=int, default=40, help="polled streams")
+    critical.add_argument("--stream-period", type=int, default=25, help="ms between polls of a stream")
+    critical.add_argument("--burst", type=int, default=200, help="background reads sent every 200 ms")
+    critical.add_argument("--max-critical", type=float, default=50, help="highest allowed p99 ms of critical writes")
+
+    fuzz = commands.add_parser("fuzz", help="reply framing with noise between the replies")
+    fuzz.add_argument("--garbage", type=float, nargs="+", default=[0, 0.01, 0.1, 0.3], help="probability of noise in front of a reply")
+    fuzz.add_argument("--frames", type=int, default=20000)
+    fuzz.add_argument("--dump-every", type=int, default=500, help="every n-th reply is a flash dump")
+    fuzz.add_argument("--dump-entries", type=int, default=4000)
+    fuzz.add_argument("--chunk", type=int, default=512, help="largest chunk in bytes")
+    fuzz.add_argument("--max-buffer", type=int, default=4 * serial_comms.ReplyFramer.MAX_FRAME, help="highest allowed buffer size")
+    fuzz.add_argument("--sim-reads", type=int, default=500, help="values read from ffbsim")
+
+    startup = commands.add_parser("startup", help="start up time of the configurator in fresh processes")
+    startup.add_argument("--runs", type=int, default=7)
+    startup.add_argument("--connect", action="store_true", help="also time the tabs after connecting to ffbsim")
+
+    forms = commands.add_parser("forms", help="build time of the .ui forms, uic.loadUi against the compiled form cache")
+    forms.add_argument("--repeat", type=int, default=15, help="median of n builds")
+    forms.add_argument("--top", type=int, default=10, help="slowest forms listed")
+
+    options = commands.add_parser("options", help="source rows and options dialogs of the FFB tab")
+    options.add_argument("--classes", type=int, default=16, help="button and analog source classes")
+    options.add_argument("--changes", type=int, default=60, help="mask changes")
+
+    soak = commands.add_parser("soak", help="callback registry size and heap over a long run with lost replies")
+    soak.add_argument("--duration", type=float, default=60, help="seconds, 86400 for a day")
+    soak.add_argument("--report", type=float, default=10, help="seconds between reports")
+    soak.add_argument("--rate", type=int, default=100, help="one-shot reads per second")
+    soak.add_argument("--timeout", type=int, default=500, help="ms until a one-shot read expires")
+    soak.add_argument("--streams", type=int, default=8, help="polled streams")
+    soak.add_argument("--stream-period", type=int, default=50, help="ms between polls of a stream")
+    soak.add_argument("--reset", type=float, default=30, help="seconds between port resets, 0 for none")
+    soak.add_argument("--latency", type=float, default=2, help="ms until ffbsim replies")
+    soak.add_argument("--loss", type=float, default=0.02, help="probability that ffbsim drops a reply")
+    soak.add_argument("--garbage", type=float, default=0.01, help="probability of noise in front of a reply")
+    soak.add_argument("--max-heap", type=float, default=256, help="highest allowed KiB of heap growth after the first report")
+
+    throttle = commands.add_parser("throttle", help="throttled writes and release of their owners")
+    throttle.add_argument("--sliders", type=int, default=100)
+    throttle.add_argument("--moves", type=int, default=200, help="values written to every slider")
+    return arg_parser
+
+
+# Commands that create widgets
+WIDGET_COMMANDS = ("forms", "options")
+
+COMMANDS = {
+    "framer": cmd_framer, "dispatch": cmd_dispatch, "stall": cmd_stall, "critical": cmd_critical, "fuzz": cmd_fuzz,
+    "startup": cmd_startup, "forms": cmd_forms, "options": cmd_options, "soak": cmd_soak,
+    "throttle": cmd_throttle,
+}
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # main.py loads res/ relative to the working directory
+    if args.command in WIDGET_COMMANDS:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = PyQt6.QtWidgets.QApplication.instance() or PyQt6.QtWidgets.QApplication([])  # pylint: disable=unused-variable
+    else:
+        app = PyQt6.QtCore.QCoreApplication.instance() or PyQt6.QtCore.QCoreApplication([])  # pylint: disable=unused-variable
+    with kept_files(USER_FILES):
+        return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
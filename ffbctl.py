@@ -0,0 +1,337 @@
+"""Command line configurator.
+
+Reads and writes settings and applies profiles without the GUI, for scripted
+bulk configuration. Profiles use the profiles.json format of the profile manager.
+
+    python ffbctl.py ports
+    python ffbctl.py get axis.0.degrees fx.spring
+    python ffbctl.py set axis.0.degrees=900 fx.0.spring=64
+    python ffbctl.py dump -o profiles.json
+    python ffbctl.py apply profiles.json --profile Wheel --port /dev/ttyACM0
+    python ffbctl.py --record session.ffbtrace dump
+    python ffbctl.py replay session.ffbtrace
+
+All reads and writes are pipelined. Writes are verified by reading them back and
+the exit status is 3 on a mismatch and 1 on any other failure.
+
+Module : ffbctl
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+import PyQt6.QtCore
+import PyQt6.QtSerialPort
+import helper
+import profile_ui
+import serial_comms
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_MISMATCH = 3
+
+TARGET_REGEX = re.compile(r"^(\w+)\.(?:(\d+)\.)?(\w+)(?:\?(\d+))?$")
+
+
+class CtlError(Exception):
+    """A command line request can not be carried out"""
+
+
+def parse_target(target: str):
+    """Split "cls.instance.cmd?adr" into a parameter dict. Instance and address are optional."""
+    match = TARGET_REGEX.match(target)
+    if match is None:
+        raise CtlError(F"Invalid parameter '{target}', expected cls.instance.cmd")
+    cls, instance, cmd, adr = match.groups()
+    return {
+        "cls": cls,
+        "instance": int(instance) if instance else 0,
+        "cmd": cmd,
+        "adr": int(adr) if adr else None,
+    }
+
+
+def target_name(parameter: dict):
+    name = F"{parameter['cls']}.{parameter['instance']}.{parameter['cmd']}"
+    if parameter.get("adr") is not None:
+        name += F"?{parameter['adr']}"
+    return name
+
+
+def describe(error: Exception):
+    if isinstance(error, serial_comms.CommandNotFoundError):
+        return "not supported by the board"
+    return str(error)
+
+
+def wait(futures):
+    """Run the event loop until all futures are done."""
+    futures = list(futures)
+    loop = PyQt6.QtCore.QEventLoop()
+    serial_comms.when_all(futures, lambda _: loop.quit())
+    if not all(future.done() for future in futures):
+        loop.exec()
+    return futures
+
+
+def find_port(name: str = None):
+    """Return the port given by name or the only connected board."""
+    if name:
+        return name
+    ports = [
+        port for port in PyQt6.QtSerialPort.QSerialPortInfo.availablePorts()
+        if (port.vendorIdentifier(), port.productIdentifier()) in helper.OFFICIAL_VID_PID
+    ]
+    if len(ports) != 1:
+        raise CtlError(F"{len(ports)} boards found, select one with --port")
+    return ports[0].portName()
+
+
+class Board:
+    """Pipelined reads and writes on one connection."""
+
+    def __init__(self, comms: serial_comms.SerialComms, timeout: int):
+        self.comms = comms
+        self.timeout = timeout
+
+    def read(self, parameters):
+        """Read the parameters at once. Returns the done futures in order."""
+        return wait([
+            self.comms.request(p["cls"], p["cmd"], p["instance"], adr=p.get("adr"), timeout=self.timeout)
+            for p in parameters
+        ])
+
+    def write(self, parameters, verify=True):
+        """Write the "value" of the parameters at once and read them back.
+
+        Returns a list of (parameter, error) for failed writes and of (parameter, value read)
+        for writes that did not stick.
+        """
+        writes = [
+            self.comms.request(p["cls"], p["cmd"], p["instance"], adr=p.get("adr"), val=p["value"], timeout=self.timeout)
+            for p in parameters
+        ]
+        # Reads of the same priority are sent after the writes
+        reads = [
+            self.comms.request(p["cls"], p["cmd"], p["instance"], adr=p.get("adr"), timeout=self.timeout)
+            for p in parameters
+        ] if verify else []
+        wait(writes + reads)
+
+        errors = [(p, f.exception()) for p, f in zip(parameters, writes) if f.exception()]
+        mismatches = []
+        for parameter, future in zip(parameters, reads):
+            if future.exception():
+                errors.append((parameter, future.exception()))
+            elif str(future.result()) != str(parameter["value"]):
+                mismatches.append((parameter, future.result()))
+        return errors, mismatches
+
+    def running_classes(self, profile_setup):
+        (future,) = self.read([{"cls": "sys", "instance": 0, "cmd": "lsactive"}])
+        return profile_ui.running_classes(future.result(), profile_setup)
+
+
+def load_profile_setup():
+    setup_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), helper.res_path("profile.cfg"))
+    with open(setup_path, "r", encoding="utf_8") as file:
+        return json.load(file)
+
+
+def load_profile(filename: str, name: str = None):
+    """Return the parameter list of a profile in a profiles.json or a bare parameter list file."""
+    with open(filename, "r", encoding="utf_8") as file:
+        content = json.load(file)
+    if isinstance(content, list):
+        return content
+    profiles = [
+        profile for profile in content["profiles"]
+        if profile["data"] and profile["name"] != profile_ui.ProfileUI.NONE_PROFILE_NAME
+    ]
+    if name is not None:
+        profiles = [profile for profile in profiles if profile["name"] == name]
+    if len(profiles) != 1:
+        names = ", ".join(profile["name"] for profile in profiles)
+        raise CtlError(F"Select one profile of {filename} with --profile ({names})")
+    return profiles[0]["data"]
+
+
+def report(errors, mismatches):
+    for parameter, error in errors:
+        print(F"{target_name(parameter)}: {describe(error)}", file=sys.stderr)
+    for parameter, value in mismatches:
+        print(F"{target_name(parameter)}: wrote {parameter['value']}, read {value}", file=sys.stderr)
+    if mismatches:
+        return EXIT_MISMATCH
+    return EXIT_ERROR if errors else EXIT_OK
+
+
+def cmd_ports(args):  # pylint: disable=unused-argument
+    for port in PyQt6.QtSerialPort.QSerialPortInfo.availablePorts():
+        ids = (port.vendorIdentifier(), port.productIdentifier())
+        mark = "*" if ids in helper.OFFICIAL_VID_PID else " "
+        print(F"{mark} {port.portName()}\t{ids[0]:04x}:{ids[1]:04x}\t{port.description()}")
+    return EXIT_OK
+
+
+def cmd_get(board: Board, args):
+    parameters = [parse_target(target) for target in args.parameters]
+    status = EXIT_OK
+    for parameter, future in zip(parameters, board.read(parameters)):
+        if future.exception():
+            print(F"{target_name(parameter)}: {describe(future.exception())}", file=sys.stderr)
+            status = EXIT_ERROR
+        else:
+            print(future.result())
+    return status
+
+
+def cmd_set(board: Board, args):
+    parameters = []
+    for assignment in args.assignments:
+        target, sep, value = assignment.partition("=")
+        if not sep:
+            raise CtlError(F"Invalid assignment '{assignment}', expected cls.instance.cmd=value")
+        parameters.append(dict(parse_target(target), value=value))
+    return report(*board.write(parameters, verify=not args.no_verify))
+
+
+def cmd_dump(board: Board, args):
+    profile_setup = load_profile_setup()
+    requested = profile_ui.profile_requests(profile_setup, board.running_classes(profile_setup))
+    data = []
+    status = EXIT_OK
+    for entry, future in zip(requested, board.read(requested)):
+        if future.exception():
+            print(F"{target_name(entry)}: {describe(future.exception())}", file=sys.stderr)
+            if not isinstance(future.exception(), serial_comms.CommandNotFoundError):
+                status = EXIT_ERROR
+            continue
+        data.append(dict(entry, value=future.result()))
+
+    profiles = {
+        "release": profile_ui.PROFILES_RELEASE,
+        "global": {},
+        "profiles": [{"name": args.name, "data": data}],
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf_8") as file:
+            json.dump(profiles, file)
+    else:
+        json.dump(profiles, sys.stdout, indent=1)
+        print()
+    return status
+
+
+def cmd_apply(board: Board, args):
+    profile = load_profile(args.profile_file, args.profile)
+    parameters = profile_ui.running_parameters(profile, board.running_classes(load_profile_setup()))
+    if not parameters:
+        raise CtlError("No parameter of the profile belongs to a running class")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        status = report(*board.write(parameters, verify=not args.no_verify))
+        if status != EXIT_OK:
+            return status
+    elapsed = time.perf_counter() - start
+    print(
+        F"Applied {len(parameters)} values {args.repeat}x in {elapsed:.3f}s"
+        F" ({args.repeat / elapsed:.1f} profiles/s)",
+        file=sys.stderr,
+    )
+
+    if args.save:
+        (future,) = board.read([{"cls": "sys", "instance": 0, "cmd": "save"}])
+        if future.exception():
+            print(F"sys.save: {describe(future.exception())}", file=sys.stderr)
+            return EXIT_ERROR
+    return EXIT_OK
+
+
+def cmd_replay(args):
+    """Replay a recording through a worker without a port and print the counters."""
+    worker = serial_comms.SerialWorker(
+        serial_comms.CallbackRegistry(),
+        serial_comms.SerialComms.cmdRegex,
+        serial_comms.BoardStateCache(),
+        serial_comms.MetadataCache(),
+        serial_comms.Capabilities(),
+    )
+    for _ in range(args.repeat):
+        worker.reset()
+        counters = serial_comms.replay_traffic(args.trace, worker, args.speed)
+        counters["MB/s"] = round(counters["bytes"] / counters["seconds"] / 1e6, 3) if counters["seconds"] else None
+        print(json.dumps(counters))
+    return EXIT_OK
+
+
+def parser():
+    arg_parser = argparse.ArgumentParser(prog="ffbctl", description="Open FFBoard command line configurator")
+    arg_parser.add_argument("--port", help="serial port of the board. Default: the only connected board")
+    arg_parser.add_argument("--baud", type=int, default=115200)
+    arg_parser.add_argument("--timeout", type=int, default=serial_comms.SerialComms.REQUEST_TIMEOUT, help="ms to wait for each reply")
+    arg_parser.add_argument("--record", metavar="FILE", help="record the serial traffic")
+    arg_parser.add_argument("-v", "--verbose", action="store_true")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("ports", help="list serial ports, boards are marked with *")
+
+    get = commands.add_parser("get", help="print values")
+    get.add_argument("parameters", nargs="+", metavar="cls.instance.cmd")
+
+    set_ = commands.add_parser("set", help="write values")
+    set_.add_argument("assignments", nargs="+", metavar="cls.instance.cmd=value")
+    set_.add_argument("--no-verify", action="store_true", help="do not read the values back")
+
+    dump = commands.add_parser("dump", help="read the profile settings of the running classes")
+    dump.add_argument("-o", "--output", help="profiles file to write. Default: stdout")
+    dump.add_argument("--name", default="Dump", help="profile name")
+
+    apply = commands.add_parser("apply", help="write a profile to the board")
+    apply.add_argument("profile_file", help="profiles.json or a parameter list")
+    apply.add_argument("--profile", help="name of the profile in the file")
+    apply.add_argument("--no-verify", action="store_true", help="do not read the values back")
+    apply.add_argument("--save", action="store_true", help="save to flash afterwards")
+    apply.add_argument("--repeat", type=int, default=1, help="apply several times, to measure throughput")
+
+    replay = commands.add_parser("replay", help="parse a traffic recording without a board, to measure throughput")
+    replay.add_argument("trace", help="file recorded with --record")
+    replay.add_argument("--speed", type=float, default=0, help="1 keeps the recorded timing. Default: as fast as possible")
+    replay.add_argument("--repeat", type=int, default=1)
+    return arg_parser
+
+
+COMMANDS = {"get": cmd_get, "set": cmd_set, "dump": cmd_dump, "apply": cmd_apply}
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    app = PyQt6.QtCore.QCoreApplication.instance() or PyQt6.QtCore.QCoreApplication([])  # pylint: disable=unused-variable
+    if args.command == "ports":
+        return cmd_ports(args)
+    if args.command == "replay":
+        return cmd_replay(args)
+
+    comms = serial_comms.SerialComms()
+    try:
+        port = find_port(args.port)
+        if not comms.open(port, args.baud):
+            raise CtlError(F"Can't open {port}")
+        if args.record and not comms.startRecording(args.record):
+            raise CtlError(F"Can't record to {args.record}")
+        return COMMANDS[args.command](Board(comms, args.timeout), args)
+    except (CtlError, OSError, serial_comms.CommandError) as error:
+        print(F"ffbctl: {error}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        comms.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,527 @@
+"""Virtual Open FFBoard for tests and benchmarks.
+
+Answers the [cls.instance.cmd?|reply] protocol on a pseudo terminal that QSerialPort opens like
+the CDC port of a real board. A subset of the sys, main, fx, axis and tmc classes is simulated
+with flash, save and reboot, and telemetry such as acttrq and effectsForces changes over time.
+Latency, jitter, reply loss and chunking of the replies can be configured.
+
+    python ffbsim.py --axes 2 --latency 2 --jitter 1 --loss 0.01 --chunk 64
+    python ffbsim.py --cmd-latency sys.flashdump=50 --seed 1
+
+In a test the simulator runs in a thread:
+
+    with ffbsim.Simulator(latency=1) as sim:
+        comms.open(sim.port)
+
+Linux and macOS only.
+
+Module : ffbsim
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import re
+import select
+import sys
+import threading
+import time
+import tty
+
+SWVER = "1.13.0"
+HWTYPE = "F407VG (simulated)"
+
+NOT_FOUND = "NOT_FOUND"
+ERR_INVALID = "Err. invalid"
+
+REQUEST_REGEX = re.compile(r"(\w+)\.(?:(\d+)\.)?(\w+)([?!=]?)(-?\d+)?(?:\?(-?\d+))?$")
+
+
+class SimClass:
+    """A simulated command handler of the board.
+
+    VALUES are the settable parameters and their defaults, READONLY constant read-only values and
+    INFO the replies to "!". Methods named cmd_<name>(typechar, val, adr) implement everything else.
+    """
+
+    CLS = ""
+    NAME = ""
+    CLSID = 0
+    VALUES = {}
+    READONLY = {}
+    INFO = {}
+
+    def __init__(self, board, instance=0):
+        self.board = board
+        self.instance = instance
+        self.values = dict(self.VALUES)
+
+    def lsactive(self):
+        return F"{self.NAME}:{self.CLS}:{self.instance}:{self.CLSID}"
+
+    def command(self, cmd, typechar, val, adr):
+        handler = getattr(self, "cmd_" + cmd, None)
+        if handler is not None:
+            return handler(typechar, val, adr)
+        if typechar == "!":
+            return self.INFO.get(cmd, NOT_FOUND)
+        if cmd in self.values:
+            if typechar == "=":
+                if val is None:
+                    return ERR_INVALID
+                self.values[cmd] = val
+                return "OK"
+            return str(self.values[cmd])
+        if cmd in self.READONLY:
+            return str(self.READONLY[cmd]) if typechar == "?" else ERR_INVALID
+        return NOT_FOUND
+
+    def now(self):
+        return time.monotonic() - self.board.started
+
+
+class System(SimClass):
+    CLS = "sys"
+    NAME = "System"
+    CLSID = 0
+    VALUES = {"debug": 0}
+    READONLY = {"swver": SWVER, "hwtype": HWTYPE, "errors": "None", "uid": 0x3132333435}
+
+    def cmd_lsactive(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "\n".join(c.lsactive() for c in self.board.classes.values())
+
+    def cmd_lsmain(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "0:1:None\n1:1:FFB Wheel (1 Axis)\n2:1:FFB Joystick (2 Axis)\n11:1:TMC Debug Bridge\n13:1:MIDI"
+
+    def cmd_main(self, typechar, val, adr):  # pylint: disable=unused-argument
+        if typechar == "=":
+            self.board.main_id = val  # Applied after reboot like the firmware
+            return "OK"
+        return str(self.board.main_id)
+
+    def cmd_heapfree(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(48000 + int(200 * math.sin(self.now())))
+
+    def cmd_vint(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(24000 + int(150 * math.sin(self.now() * 3)))
+
+    def cmd_vext(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(24100 + int(100 * math.sin(self.now() * 2)))
+
+    def cmd_errorsclr(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "OK"
+
+    def cmd_save(self, typechar, val, adr):  # pylint: disable=unused-argument
+        self.board.save()
+        return "OK"
+
+    def cmd_reboot(self, typechar, val, adr):  # pylint: disable=unused-argument
+        self.board.reboot()
+
+    def cmd_dfu(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return None  # The board leaves the CDC port
+
+    def cmd_format(self, typechar, val, adr):  # pylint: disable=unused-argument
+        if typechar != "=":
+            return ERR_INVALID
+        self.board.flash.clear()
+        return "OK"
+
+    def cmd_flashdump(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "\n".join(F"{value}:{addr}" for addr, value in sorted(self.board.flash.items()))
+
+    def cmd_flashraw(self, typechar, val, adr):
+        if typechar == "=":
+            if val is None or adr is None:
+                return ERR_INVALID
+            self.board.flash[adr] = val
+            return "OK"
+        if adr is None or adr not in self.board.flash:
+            return ERR_INVALID
+        return str(self.board.flash[adr])
+
+
+class FfbWheel(SimClass):
+    CLS = "main"
+    NAME = "FFB Wheel"
+    CLSID = 1
+    VALUES = {"hidsendspd": 0, "btntypes": 3, "aintypes": 1, "axes": 1}
+    READONLY = {"cfrate": 1000}
+    INFO = {"hidsendspd": "1000Hz:0,500Hz:1,333Hz:2,250Hz:3,200Hz:4,166Hz:5"}
+
+    def lsactive(self):
+        return F"{self.NAME}:{self.CLS}:{self.instance}:{self.board.main_id}"
+
+    def cmd_id(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(self.board.main_id)
+
+    def cmd_lsbtn(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "0:1:D-Pins\n1:1:SPI Buttons 1\n2:1:Shifter\n3:1:PCF 1\n4:1:CAN Buttons"
+
+    def cmd_lsain(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "0:1:AIN-Pins\n1:1:CAN Analog\n2:1:ADS111X"
+
+    def cmd_ffbactive(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(int(self.board.ffb_active))
+
+    def cmd_hidrate(self, typechar, val, adr):  # pylint: disable=unused-argument
+        if not self.board.ffb_active:
+            return "0"
+        return str(1000 // (1 + int(self.values["hidsendspd"])))
+
+
+class Effects(SimClass):
+    CLS = "fx"
+    NAME = "Effects"
+    CLSID = 0xA02
+    VALUES = {
+        "filterCfFreq": 500, "filterCfQ": 70, "filterProfile_id": 0,
+        "spring": 64, "damper": 64, "friction": 64, "inertia": 64,
+        "frictionPctSpeedToRampup": 25,
+        "damper_f": 30, "damper_q": 40, "friction_f": 50, "friction_q": 20,
+        "inertia_f": 20, "inertia_q": 20,
+    }
+    INFO = {
+        "spring": "scale:0.0625",
+        "damper": "scale:0.0625,factor:1.5",
+        "friction": "scale:0.0625,factor:1.5",
+        "inertia": "scale:0.0625,factor:1.5",
+    }
+    EFFECTS = 12
+
+    def forces(self):
+        now = self.now()
+        return [int(2000 * math.sin(now * (i + 1) / 3)) if self.board.ffb_active else 0 for i in range(self.EFFECTS)]
+
+    def cmd_effects(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(sum(1 for force in self.forces() if force))
+
+    def cmd_effectsForces(self, typechar, val, adr):  # pylint: disable=invalid-name, unused-argument
+        return "\n".join(F"{force}:{1 if force else 0}" for force in self.forces())
+
+    def cmd_effectsDetails(self, typechar, val, adr):  # pylint: disable=invalid-name, unused-argument
+        if typechar == "=":
+            return "OK"
+        return ",".join(json.dumps({"max": abs(force), "nb": 1 if force else 0}) for force in self.forces())
+
+
+class Axis(SimClass):
+    CLS = "axis"
+    NAME = "Axis"
+    CLSID = 0xA01
+    VALUES = {
+        "power": 2000, "degrees": 900, "fxratio": 204, "esgain": 80, "idlespring": 30,
+        "axisdamper": 0, "invert": 0, "drvtype": 1, "enctype": 0, "filterProfile_id": 0,
+    }
+    INFO = {
+        "drvtype": "0:1:None\n1:1:TMC4671 (CS 1)\n2:1:TMC4671 (CS 2)\n3:1:PWM\n5:1:ODrive (M0)\n7:1:VESC 1",
+        "enctype": "0:1:None\n1:1:Local ABN\n2:1:SPI TLE5012B\n3:1:MT6825 SPI3",
+    }
+
+    def __init__(self, board, instance=0):
+        SimClass.__init__(self, board, instance)
+        self.reduction = (1, 1)
+        self.zero = 0
+
+    def position(self, now):
+        return int(0x7fff * math.sin(now / 2 + self.instance)) - self.zero
+
+    def cmd_curpos(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(self.position(self.now()))
+
+    def cmd_curspd(self, typechar, val, adr):  # pylint: disable=unused-argument
+        now = self.now()
+        return str(int((self.position(now) - self.position(now - 0.01)) / 0.01))
+
+    def cmd_curaccel(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(int(-0x7fff / 4 * math.sin(self.now() / 2 + self.instance)))
+
+    def cmd_zeroenc(self, typechar, val, adr):  # pylint: disable=unused-argument
+        self.zero = self.position(self.now()) + self.zero
+        return "OK"
+
+    def cmd_cmdinfo(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "1"
+
+    def cmd_reduction(self, typechar, val, adr):
+        if typechar == "=":
+            if not val or not adr:
+                return ERR_INVALID
+            self.reduction = (val, adr)
+            return "OK"
+        return F"{self.reduction[0]}:{self.reduction[1]}"
+
+
+class TMC4671(SimClass):
+    CLS = "tmc"
+    NAME = "TMC4671"
+    CLSID = 0x81
+    VALUES = {
+        "mtype": 3, "poles": 50, "encsrc": 1, "cpr": 4096, "tmcHwType": 1,
+        "torqueP": 500, "torqueI": 1000, "fluxP": 500, "fluxI": 1000, "fluxoffset": 0,
+        "seqpi": 1, "pidPrec": 0, "abnindex": 0, "abnpol": 0, "combineEncoder": 0,
+        "invertForce": 0, "trqbq_mode": 1, "trqbq_f": 500,
+    }
+    READONLY = {"tmctype": "TMC4671 v1.3", "iScale": 0.00261, "calibrated": 1, "state": 3}
+    INFO = {
+        "mtype": "None=0,DC=1,2Ph Stepper=2,3Ph BLDC=3",
+        "encsrc": "None=0,ABN=1,SinCos=2,SPI/Ext=3,Hall=4",
+        "trqbq_mode": "none=0,Lowpass=1,Notch=2,Peak=3",
+        "tmcHwType": "0:Undefined\n1:v1.2.2 LEM 20A\n2:v1.2 AD8417\n3:v1.0 AD8417",
+    }
+
+    def lsactive(self):
+        return F"{self.NAME} (CS {self.instance + 1}):{self.CLS}:{self.instance}:{self.CLSID + self.instance}"
+
+    def cmd_temp(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return str(3500 + int(300 * math.sin(self.now() / 20)))
+
+    def cmd_acttrq(self, typechar, val, adr):  # pylint: disable=unused-argument
+        now = self.now()
+        return F"{int(3000 * math.sin(now * 4))}:{int(200 * math.sin(now * 7))}"
+
+    def cmd_calibrate(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "OK"
+
+    def cmd_encalign(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "OK"
+
+    def cmd_pidautotune(self, typechar, val, adr):  # pylint: disable=unused-argument
+        return "OK"
+
+
+class Board:
+    """State of the simulated board: its classes, flash and telemetry."""
+
+    def __init__(self, axes=1):
+        self.axes = axes
+        self.main_id = FfbWheel.CLSID if axes == 1 else 2
+        self.flash = {}
+        self.started = time.monotonic()
+        self.ffb_active = True
+        self.boot()
+        self.save()
+
+    def boot(self):
+        """Create the classes of the main class and load the saved values."""
+        self.classes = {("sys", 0): System(self)}
+        if self.main_id in (1, 2):
+            self.classes[("main", 0)] = FfbWheel(self)
+            self.classes[("main", 0)].values["axes"] = self.axes
+            self.classes[("fx", 0)] = Effects(self)
+            for axis in range(self.axes):
+                self.classes[("axis", axis)] = Axis(self, axis)
+                self.classes[("tmc", axis)] = TMC4671(self, axis)
+        for (addr, obj, cmd) in self.addresses():
+            if addr in self.flash:
+                obj.values[cmd] = self.flash[addr]
+
+    def addresses(self):
+        """Assign a flash address to every settable value."""
+        addr = 0x100
+        for key in sorted(self.classes):
+            obj = self.classes[key]
+            for cmd in sorted(obj.values):
+                yield addr, obj, cmd
+                addr += 1
+
+    def save(self):
+        for addr, obj, cmd in self.addresses():
+            self.flash[addr] = obj.values[cmd]
+
+    def reboot(self):
+        self.started = time.monotonic()
+        self.boot()
+
+    def command(self, text: str):
+        """Execute one command and return the reply frame or None."""
+        match = REQUEST_REGEX.match(text)
+        if match is None:
+            return None
+        cls, instance, cmd, typechar, val, adr = match.groups()
+        if typechar == "?" and adr is None:
+            val, adr = None, val  # The number after "?" is an address
+        obj = self.classes.get((cls, int(instance) if instance else 0))
+        if obj is None:
+            reply = NOT_FOUND
+        else:
+            reply = obj.command(
+                cmd, typechar or "?", int(val) if val is not None else None, int(adr) if adr is not None else None
+            )
+        if reply is None:
+            return None
+        return F"[{text}|{reply}]"
+
+
+class Simulator:
+    """Serves a Board on a pseudo terminal.
+
+    latency and jitter are ms added to every reply, cmd_latency overrides the latency for
+    "cls.cmd" keys. loss is the probability that a reply is dropped. chunk splits replies into
+    writes of at most chunk bytes, chunk_gap ms apart. garbage is the probability that debug text,
+    random bytes or a frame without end marker is sent in front of a reply.
+    """
+
+    GARBAGE = (
+        lambda rnd: b"Debug: " + bytes(rnd.choice(b"abc [:0123") for _ in range(rnd.randrange(8, 200))) + b"\n",
+        lambda rnd: rnd.randbytes(rnd.randrange(1, 64)),
+        lambda rnd: b"[sys.0.main?|" + str(rnd.randrange(1000)).encode(),
+        lambda rnd: b"[" + b"#" * rnd.randrange(4096, 10000),
+    )
+
+    def __init__(self, axes=1, latency=0.0, jitter=0.0, loss=0.0, chunk=0, chunk_gap=1.0, cmd_latency=None, seed=None, garbage=0.0):
+        self.board = Board(axes)
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.chunk = chunk
+        self.chunk_gap = chunk_gap
+        self.cmd_latency = cmd_latency or {}
+        self.garbage = garbage
+        self.random = random.Random(seed)
+        self.counters = {"commands": 0, "replies": 0, "dropped": 0, "bytes_in": 0, "bytes_out": 0, "garbage": 0}
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self._pending = []  # (due, seq, bytes) to write
+        self._output = bytearray()  # Due bytes the pty did not accept yet
+        self._seq = 0
+        self._last_due = 0
+        self._buffer = b""
+        self._thread = None
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name="ffbsim", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        """Serve until stop() is called."""
+        self._running = True
+        while self._running:
+            timeout = 0.05
+            if self._pending:
+                timeout = min(timeout, max(0, self._pending[0][0] - time.monotonic()))
+            if self._output:
+                timeout = min(timeout, 0.001)
+            readable, _, _ = select.select([self.master], [], [], timeout)
+            if readable:
+                self.receive()
+            self.transmit()
+
+    def receive(self):
+        try:
+            data = os.read(self.master, 65536)
+        except (BlockingIOError, OSError):
+            return
+        self.counters["bytes_in"] += len(data)
+        self._buffer += data
+        *commands, self._buffer = re.split(rb"[;\n]", self._buffer)
+        for command in commands:
+            text = command.decode("utf-8", "replace").strip()
+            if not text:
+                continue
+            self.counters["commands"] += 1
+            reply = self.board.command(text)
+            if reply is None:
+                continue
+            if self.loss and self.random.random() < self.loss:
+                self.counters["dropped"] += 1
+                continue
+            data = (reply + "\n").encode("utf-8")
+            if self.garbage and self.random.random() < self.garbage:
+                noise = self.random.choice(self.GARBAGE)(self.random)
+                self.counters["garbage"] += len(noise)
+                data = noise + data
+            self.schedule(text, data)
+
+    def schedule(self, text, data):
+        match = REQUEST_REGEX.match(text)
+        key = F"{match.group(1)}.{match.group(3)}"
+        delay = self.cmd_latency.get(key, self.latency)
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        # Replies leave in request order like on the board
+        due = max(time.monotonic() + delay / 1000, self._last_due)
+        self._last_due = due
+        self.counters["replies"] += 1
+        chunks = [data[i:i + self.chunk] for i in range(0, len(data), self.chunk)] if self.chunk else [data]
+        for i, chunk in enumerate(chunks):
+            self._seq += 1
+            chunk_due = due + i * self.chunk_gap / 1000
+            heapq.heappush(self._pending, (chunk_due, self._seq, chunk))
+            self._last_due = max(self._last_due, chunk_due)
+
+    def transmit(self):
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            _, _, data = heapq.heappop(self._pending)
+            self._output += data
+        if not self._output:
+            return
+        try:
+            written = os.write(self.master, self._output)
+        except BlockingIOError:
+            return
+        # A full pty buffer takes part of the data, the rest follows in order
+        del self._output[:written]
+        self.counters["bytes_out"] += written
+
+
+def parser():
+    arg_parser = argparse.ArgumentParser(prog="ffbsim", description="Virtual Open FFBoard on a pseudo terminal")
+    arg_parser.add_argument("--axes", type=int, default=1, choices=(1, 2))
+    arg_parser.add_argument("--latency", type=float, default=0, help="ms until a reply is sent")
+    arg_parser.add_argument("--jitter", type=float, default=0, help="random ms added to the latency")
+    arg_parser.add_argument("--loss", type=float, default=0, help="probability that a reply is lost")
+    arg_parser.add_argument("--chunk", type=int, default=0, help="split replies into writes of this many bytes")
+    arg_parser.add_argument("--chunk-gap", type=float, default=1, help="ms between chunks")
+    arg_parser.add_argument("--cmd-latency", action="append", default=[], metavar="cls.cmd=ms", help="latency of one command")
+    arg_parser.add_argument("--garbage", type=float, default=0, help="probability of noise in front of a reply")
+    arg_parser.add_argument("--seed", type=int, help="random seed for reproducible runs")
+    return arg_parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    cmd_latency = {}
+    for entry in args.cmd_latency:
+        key, _, latency = entry.partition("=")
+        cmd_latency[key] = float(latency)
+    sim = Simulator(
+        axes=args.axes, latency=args.latency, jitter=args.jitter, loss=args.loss,
+        chunk=args.chunk, chunk_gap=args.chunk_gap, cmd_latency=cmd_latency, seed=args.seed,
+        garbage=args.garbage,
+    )
+    print(sim.port, flush=True)
+    try:
+        sim.run()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(sim.counters), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
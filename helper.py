@@ -2,10 +2,12 @@ from os import path
 from functools import wraps
 import sys
 import time
+import weakref
 
 from PyQt6.QtCore import QObject,QTimer
 
 RESPATH = "res"
+OFFICIAL_VID_PID = [(0x1209, 0xFFB0)] # USB ids of Open FFBoard firmware
 
 def res_path(file):
     if getattr(sys, 'frozen',False) and hasattr(sys, '_MEIPASS'):
@@ -67,43 +69,119 @@ def qtBlockAndCall(object : QObject,function,value):
     function(value)
     object.blockSignals(False)
 
-def throttle(ms):
-
-    time_of_last_call = time.time()
-    timer = QTimer()
-    timer.setSingleShot(True)
+class RateLimiter:
+    """Limits calls to at most one per interval ms for every key.
+
+    In leading mode the first call of a burst runs immediately. In trailing mode the last call of a
+    burst is always delivered once the interval has passed, earlier pending calls are replaced.
+    Counts calls, delivered calls and suppressed calls that never ran.
+    """
+
+    def __init__(self, ms, leading=True, trailing=True, parent : QObject = None):
+        self.interval = ms
+        self.leading = leading
+        self.trailing = trailing
+        self.parent = weakref.ref(parent) if parent is not None else lambda : None # Owner of the timers. Weak as it may own the limiter
+        self.states = {}
+        self.counters = {"calls":0,"delivered":0,"suppressed":0}
+
+    def __call__(self, key, fn, *args, **kwargs):
+        self.counters["calls"] += 1
+        state = self.states.get(key)
+        if state is None:
+            state = {"last":None,"pending":None,"timer":None}
+            self.states[key] = state
+        elapsed = None if state["last"] is None else (time.monotonic() - state["last"]) * 1000
+
+        if state["pending"] is None and self.leading and (elapsed is None or elapsed >= self.interval):
+            self._deliver(state, (fn, args, kwargs))
+            return
+        if state["pending"] is not None or not self.trailing:
+            self.counters["suppressed"] += 1
+        if not self.trailing:
+            return
+
+        state["pending"] = (fn, args, kwargs)
+        if state["timer"] is None:
+            state["timer"] = QTimer(self.parent())
+            state["timer"].setSingleShot(True)
+            state["timer"].timeout.connect(lambda : self._fire(state))
+        if not state["timer"].isActive():
+            remaining = self.interval if elapsed is None else self.interval - elapsed
+            state["timer"].start(max(0, int(remaining)))
+
+    def _fire(self, state):
+        pending = state["pending"]
+        state["pending"] = None
+        if pending:
+            self._deliver(state, pending)
+
+    def _deliver(self, state, call):
+        fn, args, kwargs = call
+        state["last"] = time.monotonic()
+        self.counters["delivered"] += 1
+        fn(*args, **kwargs)
+
+    def flush(self):
+        """Delivers all pending calls now"""
+        for state in list(self.states.values()):
+            if state["timer"]:
+                state["timer"].stop()
+            self._fire(state)
+
+    def cancel(self):
+        """Drops all pending calls"""
+        for state in self.states.values():
+            if state["timer"]:
+                state["timer"].stop()
+            if state["pending"]:
+                state["pending"] = None
+                self.counters["suppressed"] += 1
+
+
+_throttled = [] # All functions decorated with throttle
+
+def _call_owner(owner, fn, *args, **kwargs):
+    """Calls the method fn of the weakly referenced owner unless it was collected"""
+    obj = owner()
+    if obj is not None:
+        fn(obj, *args, **kwargs)
+
+def throttle(ms, leading=True, trailing=True, key=None):
+    """Decorates a method to run at most once per ms for each instance.
+
+    key(*args, **kwargs) may split the calls of one instance into independent streams, for example per command.
+    With the default modes the first call runs immediately and the last call of a burst is delivered later.
+    Instances are only referenced weakly, a pending call is dropped if its instance is collected first.
+    """
 
     def decorator(fn):
-        def wrapper(*args, **kwargs):
-            def call():
-                nonlocal time_of_last_call 
-                time_of_last_call = time.time()
-                fn(*args, **kwargs)
-            
-            now = time.time()
-            time_since_last_call = now - time_of_last_call
-
-            # Call immediately if last call is older than timeout
-            if time_since_last_call > ms/1000:
-                if timer.isActive():
-                    timer.stop()
-                return call()
-
-            else: # delay execution
-                if timer.isActive():
-                    timer.stop()
-
-                # Disconnect previous call
-                try: timer.timeout.disconnect()
-                except Exception: pass
-
-                # Connect timer
-                timer.timeout.connect(call)
-                timer.setInterval(ms)
-                timer.start()     
+        limiters = weakref.WeakKeyDictionary()
+
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            limiter = limiters.get(self)
+            if limiter is None:
+                limiter = RateLimiter(ms, leading, trailing, self if isinstance(self, QObject) else None)
+                limiters[self] = limiter
+            limiter(key(*args, **kwargs) if key else None, _call_owner, weakref.ref(self), fn, *args, **kwargs)
+
+        wrapper.limiters = limiters
+        _throttled.append(wrapper)
         return wrapper
     return decorator
 
+def throttle_counters():
+    """Sums the call counters of every throttled method"""
+    counters = {}
+    for wrapper in _throttled:
+        total = {"calls":0,"delivered":0,"suppressed":0}
+        for limiter in list(wrapper.limiters.values()):
+            for name,value in limiter.counters.items():
+                total[name] += value
+        counters[wrapper.__qualname__] = total
+    return counters
+
 # Splits a reply in the format "name:value,name2:value2"... into a dict
 def map_infostring(repl,type=float):
     return{key:type(value) for (key,value) in [entry.split(":") for entry in repl.split(",")]}
\ No newline at end of file
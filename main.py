@@ -14,8 +14,10 @@ version = "1.8.7"
 """
 import sys
 import functools
+import importlib
 import logging
 import logging.config
+from collections import namedtuple
 from typing import List
 
 import PyQt6.QtWidgets
@@ -23,32 +25,17 @@ import PyQt6.QtCore
 import PyQt6.QtGui
 import PyQt6.QtSerialPort
 import PyQt6
-from PyQt6.QtCore import QEventLoop
 import config
 import helper
 
-# UIs
+# UIs. Tabs, dialogs and the updater are imported on first use
 import base_ui
 import serial_ui
-import dfu_ui
-import dark_palette
 import profile_ui
-import ffb_ui
-import axis_ui
-import tmc4671_ui
-import pwmdriver_ui
 import serial_comms
-import midi_ui
 import errors
 import activelist
-import tmcdebug_ui
-import odrive_ui
-import rmd_ui
-import vesc_ui
-import effects_monitor
-import effects_graph_ui
-import updater
-import simplemotion_ui
+import commstats
 
 # This GUIs version
 VERSION = "1.13.0"
@@ -57,17 +44,116 @@ VERSION = "1.13.0"
 # Major version of firmware must match firmware. Minor versions must be higher or equal
 MIN_FW = "1.13.0"
 
+class TabFactory(namedtuple("TabFactory",["module","cls","unique","axis_name","profile","main_class"])):
+    """UI of a board class. unique is passed to the UI, axis_name appends the axis to the tab name,
+    profile enables saving profiles and main_class marks the FFB main class."""
+
+    def load(self):
+        """Imports the UI module on first use and returns the UI class"""
+        return getattr(importlib.import_module(self.module),self.cls)
+
+    def create(self, main, unique):
+        """Builds the UI of the class instance unique"""
+        ui_class = self.load()
+        if self.unique:
+            return ui_class(main=main, unique=unique)
+        return ui_class(main=main)
+
+_FFB_TAB = TabFactory("ffb_ui","FfbUI",False,False,True,True)
+_AXIS_TAB = TabFactory("axis_ui","AxisUI",True,True,True,False)
+_TMC_TAB = TabFactory("tmc4671_ui","TMC4671Ui",True,True,True,False)
+_ODRIVE_TAB = TabFactory("odrive_ui","OdriveUI",True,False,True,False)
+_VESC_TAB = TabFactory("vesc_ui","VescUI",True,False,True,False)
+_SIMPLEMOTION_TAB = TabFactory("simplemotion_ui","SimplemotionUI",True,False,True,False)
+_RMD_TAB = TabFactory("rmd_ui","RmdUI",True,False,True,False)
+
+# Class id reported by sys.lsactive : tab factory
+# The modules are imported by name. List new ones in build/OpenFFBoard.spec and build/build_nuitka.bat too
+TAB_FACTORIES = {
+    0x1: _FFB_TAB,
+    0x2: _FFB_TAB,
+    0x3: _FFB_TAB,
+    0xA01: _AXIS_TAB,
+    0x81: _TMC_TAB,
+    0x82: _TMC_TAB,
+    0x83: _TMC_TAB,
+    0x84: TabFactory("pwmdriver_ui","PwmDriverUI",False,False,True,False),
+    0x85: _ODRIVE_TAB,
+    0x86: _ODRIVE_TAB,
+    0x87: _VESC_TAB,
+    0x88: _VESC_TAB,
+    0x89: _SIMPLEMOTION_TAB,
+    0x8A: _SIMPLEMOTION_TAB,
+    0x8B: _RMD_TAB,
+    0x8C: _RMD_TAB,
+    0xD: TabFactory("midi_ui","MidiUI",False,False,False,False),
+    0xB: TabFactory("tmcdebug_ui","TMCDebugUI",False,False,False,False),
+}
+
+class LazyTab(PyQt6.QtWidgets.QWidget):
+    """Placeholder of a tab. The real UI is built on the first showEvent or when prefetched."""
+
+    def __init__(self, create, parent=None):
+        PyQt6.QtWidgets.QWidget.__init__(self, parent)
+        self.create = create
+        self.widget = None
+        layout = PyQt6.QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def build(self):
+        """Build the UI if it does not exist yet and return it."""
+        if self.widget is None:
+            self.widget = self.create()
+            self.layout().addWidget(self.widget)
+            if self.isVisible():
+                self.widget.show()
+        return self.widget
+
+    def showEvent(self, a0):  # pylint: disable=invalid-name
+        """Build the UI when the tab is selected for the first time."""
+        self.build()
+        return super().showEvent(a0)
+
+class BoardSession:
+    """Identity of the board the tabs were built for.
+
+    The tabs are kept while the board reboots. If the board that answers afterwards has the same
+    firmware, hardware, main class and active classes the tabs are reused.
+    """
+
+    def __init__(self):
+        self.identity = None # (board identity, active class lines) of the tabs
+        self.suspended = False # Tabs wait for the board to reconnect
+
+    def suspend(self):
+        """Keep the tabs until the board reconnects. Returns true if there are tabs to keep."""
+        self.suspended = self.identity is not None
+        return self.suspended
+
+    def resume(self, board, active):
+        """Store the identity of the connected board. Returns true if the kept tabs belong to it."""
+        identity = (board, frozenset(l for l in active.split("\n") if l))
+        resumed = self.suspended and board is not None and identity == self.identity
+        self.identity = identity if board is not None else None
+        self.suspended = False
+        return resumed
+
+    def clear(self):
+        self.identity = None
+        self.suspended = False
+
 class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.CommunicationHandler):
     """Display and manage the main UI."""
     tabsinitialized = PyQt6.QtCore.pyqtSignal(bool)
+    PREFETCH_INTERVAL = 50 # ms between checks for an idle link to build a hidden tab
+    SUSPEND_TIMEOUT = 10000 # ms to wait for the board to reconnect before the kept tabs are removed
     def __init__(self):
         """Init the mainUI : init the UI, all the dlg element, and the main timer."""
         PyQt6.QtWidgets.QMainWindow.__init__(self)
         base_ui.CommunicationHandler.__init__(self)
         base_ui.WidgetUI.__init__(self, None, "MainWindow.ui")
 
-        self.serial = PyQt6.QtSerialPort.QSerialPort()
-        base_ui.CommunicationHandler.comms = serial_comms.SerialComms(self, self.serial)
+        base_ui.CommunicationHandler.comms = serial_comms.SerialComms(self)
         self.main_class_ui = None
         self.timeouting = False
         self.connected = False
@@ -80,22 +166,28 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
 
         self.timer = PyQt6.QtCore.QTimer(self)
         self.timer.timeout.connect(self.update_timer) # pylint: disable=no-value-for-parameter
+        # Builds hidden tabs one by one while the link is idle
+        self.prefetch_timer = PyQt6.QtCore.QTimer(self)
+        self.prefetch_timer.timeout.connect(self.prefetch_tab)
+        # Drops the kept tabs if the board does not come back
+        self.suspend_timer = PyQt6.QtCore.QTimer(self)
+        self.suspend_timer.setSingleShot(True)
+        self.suspend_timer.timeout.connect(self.suspend_expired)
         self.tabWidget_main.currentChanged.connect(self.tab_changed)
         self.errors_dlg = errors.ErrorsDialog(self)
-        self.effects_monitor_dlg = effects_monitor.EffectsMonitorDialog(self)
-        self.effects_graph_dlg = effects_graph_ui.EffectsGraphDialog(self)
+        self.effects_monitor_dlg = None # Created on first use
+        self.effects_graph_dlg = None
         self.active_class_dlg = activelist.ActiveClassDialog(self)
+        self.comms_stats_dlg = commstats.CommsStatsDialog(self)
         self.active_classes = {}
+        self.session = BoardSession()
         self.fw_version_str = None
 
         self.setup()
 
-        self.process_events_timer = PyQt6.QtCore.QTimer()
-        self.process_events_timer.timeout.connect(process_events) # Kick eventloop when timeouting
-
     def setup(self):
         """Init the systray, the serial, the toolbar, the status bar and the connection status."""
-        self.serialchooser = serial_ui.SerialChooser(serial=self.serial, main_ui=self)
+        self.serialchooser = serial_ui.SerialChooser(main_ui=self)
         self.tabWidget_main.addTab(self.serialchooser, "Serial")
 
         # Error dialog clear TODO possibly call after the tab has changed so that it does not appear in the serial log
@@ -110,25 +202,23 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         # Status Bar
         self.wrapper_status_bar = WrapperStatusBar(self.statusBar())
         self.serialchooser.connected.connect(self.wrapper_status_bar.serial_connected)
+        self.comms.poller.ratesChanged.connect(self.wrapper_status_bar.update_poll_rates)
+        self.comms.replyProgress.connect(
+            lambda key,size: self.statusBar().showMessage(f"Receiving {key}: {size} bytes",2000)
+        )
 
-        # self.serial.readyRead.connect(self.serialReceive)
         self.actionAbout.triggered.connect(self.open_about)
         self.serialchooser.connected.connect(self.serial_connected)
 
         self.actionUpdates.triggered.connect(self.open_updater)
 
         self.actionDebug_mode.triggered.connect(self.toggle_debug)
+        self.actionRecord_traffic.triggered.connect(self.toggle_recording)
 
         self.timer.start(5000)
         self.profile_ui = profile_ui.ProfileUI(main=self)
         self.serialchooser.connected.connect(self.profile_ui.setEnabled)
 
-        self.serialchooser.connected.connect(self.effects_monitor_dlg.setEnabled)
-        self.effects_monitor_dlg.setEnabled(False)
-
-        self.serialchooser.connected.connect(self.effects_graph_dlg.setEnabled)
-        self.effects_graph_dlg.setEnabled(False)
-
         # Toolbar menu items
         self.actionDFU_Uploader.triggered.connect(self.open_dfu_dialog)
 
@@ -138,6 +228,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
             self.active_class_dlg.show
         )  # Open active classes list
         self.serialchooser.connected.connect(self.actionActive_features.setEnabled)
+        self.actionComms_statistics.triggered.connect(self.comms_stats_dlg.show)
         self.serialchooser.connected.connect(self.actionDebug_mode.setEnabled)
 
         self.actionRestore_chip_config.triggered.connect(self.load_flashdump_from_file)
@@ -152,10 +243,10 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         self.actionReset_Factory_Config.triggered.connect(self.reset_factory_btn)
         self.serialchooser.connected.connect(self.actionReset_Factory_Config.setEnabled)
 
-        self.actionEffectsMonitor.triggered.connect(self.effects_monitor_dlg.display)
+        self.actionEffectsMonitor.triggered.connect(self.open_effects_monitor)
         self.serialchooser.connected.connect(self.actionEffectsMonitor.setEnabled)
 
-        self.actionEffects_forces.triggered.connect(self.effects_graph_dlg.display)
+        self.actionEffects_forces.triggered.connect(self.open_effects_graph)
         self.serialchooser.connected.connect(self.actionEffects_forces.setEnabled)
 
         # Main Panel
@@ -170,7 +261,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
 
     def reboot(self):
         """Send the reboot message to the board."""
-        self.send_command("sys", "reboot")
+        self.send_command("sys", "reboot", priority=serial_comms.PRIORITY_CRITICAL)
         self.reconnect()
 
     def check_configurator_update(self):
@@ -179,6 +270,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         if donotnotify:
             return
 
+        import updater # pylint: disable=import-outside-toplevel
         release = updater.GithubRelease.get_latest_release(updater.GUIREPO)
         if not release:
             return
@@ -191,6 +283,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
 
     def open_dfu_dialog(self):
         """Open the dfu dialog and start managing."""
+        import dfu_ui # pylint: disable=import-outside-toplevel
         msg = PyQt6.QtWidgets.QDialog()
         msg.setWindowTitle("Firmware")
         dfu = dfu_ui.DFUModeUI(parentWidget=msg, mainUI=self)
@@ -207,7 +300,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         diff = event.pos() - event.oldPos()
 
         list_dialog:List[PyQt6.QtWidgets.QDialog] = [self.errors_dlg, self.effects_monitor_dlg,
-            self.effects_graph_dlg, self.active_class_dlg]
+            self.effects_graph_dlg, self.active_class_dlg, self.comms_stats_dlg]
         for dialog in list_dialog:
             if dialog and dialog.isVisible():
                 dialog.move(dialog.pos() + diff)
@@ -227,12 +320,29 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
             self.errors_dlg.resize(width,height)
 
 
+    def open_effects_monitor(self):
+        """Display the effects statistics. The dialog is created on first use."""
+        if self.effects_monitor_dlg is None:
+            import effects_monitor # pylint: disable=import-outside-toplevel
+            self.effects_monitor_dlg = effects_monitor.EffectsMonitorDialog(self)
+            self.serialchooser.connected.connect(self.effects_monitor_dlg.setEnabled)
+        self.effects_monitor_dlg.display()
+
+    def open_effects_graph(self):
+        """Display the effects forces graph. The dialog is created on first use."""
+        if self.effects_graph_dlg is None:
+            import effects_graph_ui # pylint: disable=import-outside-toplevel
+            self.effects_graph_dlg = effects_graph_ui.EffectsGraphDialog(self)
+            self.serialchooser.connected.connect(self.effects_graph_dlg.setEnabled)
+        self.effects_graph_dlg.display()
+
     def open_about(self):
         """Open the about dialog box."""
         AboutDialog(self).exec()
 
     def open_updater(self):
         """Opens updater window"""
+        import updater # pylint: disable=import-outside-toplevel
         updater.UpdateBrowser(self,self.profile_ui).exec()
 
     def toggle_debug(self,enabled):
@@ -241,6 +351,20 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         self.serialchooser.get_main_classes() # TODO better move somewhere else
 
 
+    def toggle_recording(self,enabled):
+        """Record the raw serial traffic to a file for analysing communication problems."""
+        if not enabled:
+            self.comms.stopRecording()
+            self.log("Stopped recording serial traffic")
+            return
+        fname,_ = PyQt6.QtWidgets.QFileDialog.getSaveFileName(
+            self, "Record serial traffic", "traffic.ffbtrace", "Traffic recordings (*.ffbtrace)"
+        )
+        if fname and self.comms.startRecording(fname):
+            self.log("Recording serial traffic to " + fname)
+        else:
+            self.actionRecord_traffic.setChecked(False)
+
     def save_flashdump_to_file(self):
         """Send a async message to get the flashdump from board."""
         self.get_value_async("sys", "flashdump", config.saveDump)
@@ -253,7 +377,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
 
         if self.connected:
             for sector in dump["flash"]:
-                self.send_value("sys", "flashraw", sector["val"], sector["addr"], 0)
+                self.send_value("sys", "flashraw", sector["val"], sector["addr"], 0, priority=serial_comms.PRIORITY_BACKGROUND)
             # Message
             msg = PyQt6.QtWidgets.QMessageBox(
                 PyQt6.QtWidgets.QMessageBox.Icon.Information,
@@ -273,7 +397,6 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
 
     def timeout_check_cb(self, port_checked):
         """Close the serial connection if the port is not open after a timeout."""
-        self.process_events_timer.stop()
         if port_checked != self.serialchooser.main_id:
             self.reset_port()
             self.log("Communication error. Please reconnect")
@@ -282,7 +405,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
 
     def update_timer(self):
         """Check on timer if the port is always opened."""
-        if self.serial.isOpen():
+        if self.comms.isOpen():
             if self.timeouting:
                 self.timeouting = False
                 self.reset_port()
@@ -290,7 +413,6 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
                 return
             else:
                 self.timeouting = True
-                self.process_events_timer.start(100)
                 self.get_value_async("main", "id", self.timeout_check_cb, conversion=int)
                 self.get_value_async(
                     "sys", "heapfree", self.wrapper_status_bar.update_ram_used
@@ -306,7 +428,11 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
     def del_tab(self, widget : PyQt6.QtWidgets.QWidget):
         """Remove a tab in the widget and unregister the serial callback."""
         self.tabWidget_main.removeTab(self.tabWidget_main.indexOf(widget))
-        base_ui.CommunicationHandler.remove_callbacks(widget)
+        if isinstance(widget, LazyTab):
+            if widget.widget is not None:
+                base_ui.CommunicationHandler.remove_callbacks(widget.widget)
+        else:
+            base_ui.CommunicationHandler.remove_callbacks(widget)
         widget.deleteLater()
         del widget
 
@@ -321,18 +447,61 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         ]
         return name in names
 
-    def reset_tabs(self):
-        """Remove all the tab and unregister the callBack."""
+    def prefetch_tab(self):
+        """Build the next tab that was not shown yet if no command is pending."""
+        pending = [tab for tab in self.active_classes.values() if isinstance(tab, LazyTab) and tab.widget is None]
+        if not pending:
+            self.prefetch_timer.stop()
+        elif self.comms.isIdle():
+            pending[0].build()
+
+    def remove_tabs(self):
+        """Remove all the tabs and their signals."""
+        self.prefetch_timer.stop()
         self.active_classes = {}
         self.profile_ui.set_save_btn(False)
         for i in range(self.tabWidget_main.count() - 1, 0, -1):
             self.del_tab(self.tabWidget_main.widget(i))
-        self.remove_callbacks()
-        self.tabsinitialized.emit(False)
 
         # Delete signals
         for connection in self.tab_connections:
             PyQt6.QtCore.QObject.disconnect(connection)
+        self.tab_connections = []
+
+    def reset_tabs(self):
+        """Remove all the tab and unregister the callBack."""
+        self.suspend_timer.stop()
+        self.session.clear()
+        self.remove_tabs()
+        self.remove_callbacks()
+        self.tabsinitialized.emit(False)
+
+    def suspend_tabs(self):
+        """Keep the tabs disabled while the board reconnects. Returns false if there are none."""
+        if not self.session.suspend():
+            return False
+        self.prefetch_timer.stop()
+        for tab in self.active_classes.values():
+            tab.setEnabled(False)
+        self.tabsinitialized.emit(False)
+        self.suspend_timer.start(self.SUSPEND_TIMEOUT)
+        return True
+
+    def suspend_expired(self):
+        """The board did not reconnect in time: drop the kept tabs."""
+        if self.session.suspended:
+            self.log("Board did not reconnect")
+            self.reset_tabs()
+
+    def resume_tabs(self):
+        """Reuse the tabs of the reconnected board. The main class and the shown tab read their values again,
+        the other tabs read them in their showEvent."""
+        for tab in self.active_classes.values():
+            tab.setEnabled(True)
+            if not isinstance(tab, LazyTab):
+                tab.init_ui()
+            elif tab.widget is not None and tab.isVisible():
+                tab.widget.init_ui()
 
     def update_tabs(self):
         """Get the active classes from the board, and add tab when not exist."""
@@ -352,6 +521,13 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
                 }
                 for i in lines
             }
+            kept = self.session.suspended
+            self.suspend_timer.stop()
+            if self.session.resume(self.comms.boardIdentity(), active):
+                self.resume_tabs()
+            elif kept:
+                # Another board or configuration answered
+                self.remove_tabs()
             delete_classes = [
                 (classe, name)
                 for name, classe in self.active_classes.items()
@@ -365,11 +541,14 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
             for name, classe_active in new_active_classes.items():
                 if name in self.active_classes:
                     continue
+                factory = TAB_FACTORIES.get(classe_active["id"])
+                if factory is None:
+                    continue
                 classname = classe_active["name"]
-                if classe_active["id"] == 1 or classe_active["id"] == 2 or classe_active["id"] == 3:
-                    self.main_class_ui = ffb_ui.FfbUI(main=self, title=classname)
+                if factory.main_class:
+                    # Adds and selects its own tab
+                    self.main_class_ui = factory.load()(main=self, title=classname)
                     self.active_classes[name] = self.main_class_ui
-                    self.profile_ui.set_save_btn(True)
                     self.tab_connections.append(self.main_class_ui.ffb_rate_event.connect(self.wrapper_status_bar.update_ffb_rate))
                     # Start ffb timer
                     
@@ -378,93 +557,42 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
                     self.tab_connections.append(self.serialchooser.shown.connect(lambda : self.wrapper_status_bar.update_ffb_block_display(False)))
                     self.tab_connections.append(self.serialchooser.hidden.connect(lambda : self.wrapper_status_bar.update_ffb_block_display(True)))
                     self.wrapper_status_bar.update_ffb_block_display(True)
-                    
-                elif classe_active["id"] == 0xA01:
-                    classe = axis_ui.AxisUI(main=self, unique=classe_active["unique"])
-                    name_axis = classe_active["name"] + ":" + chr(classe.axis + ord("0"))
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, name_axis)
-                    self.profile_ui.set_save_btn(True)
-                elif classe_active["id"] == 0x81 or classe_active["id"] == 0x82 or \
-                    classe_active["id"] == 0x83:
-                    classe = tmc4671_ui.TMC4671Ui(main=self, unique=classe_active["unique"])
-                    name_axis = classe_active["name"] + ":" + chr(classe.axis + ord("0"))
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, name_axis)
-                    self.profile_ui.set_save_btn(True)
-                elif classe_active["id"] == 0x84:
-                    classe = pwmdriver_ui.PwmDriverUI(main=self)
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, classe_active["name"])
-                    self.profile_ui.set_save_btn(True)
-                elif classe_active["id"] == 0xD:
-                    classe = midi_ui.MidiUI(main=self)
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, classe_active["name"])
-                elif classe_active["id"] == 0xB:
-                    classe = tmcdebug_ui.TMCDebugUI(main=self)
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, classe_active["name"])
-                elif classe_active["id"] == 0x85 or classe_active["id"] == 0x86:
-                    classe = odrive_ui.OdriveUI(main=self, unique=classe_active["unique"])
-                    name_axis = classe_active["name"]
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, name_axis)
-                    self.profile_ui.set_save_btn(True)
-                elif classe_active["id"] == 0x87 or classe_active["id"] == 0x88:
-                    classe = vesc_ui.VescUI(main=self, unique=classe_active["unique"])
-                    name_axis = classe_active["name"]
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, name_axis)
-                    self.profile_ui.set_save_btn(True)
-                elif classe_active["id"] == 0x89 or classe_active["id"] == 0x8A:
-                    classe = simplemotion_ui.SimplemotionUI(main=self, unique=classe_active["unique"])
-                    name_axis = classe_active["name"]
-                    self.active_classes[name] = classe
-                    self.add_tab(classe, name_axis)
-                    self.profile_ui.set_save_btn(True)
-                elif classe_active["id"] == 0x8B or classe_active["id"] == 0x8C:
-                    classe = rmd_ui.RmdUI(main=self, unique=classe_active["unique"])
-                    name_axis = classe_active["name"]
+                else:
+                    # Built when first shown or when the link is idle
+                    classe = LazyTab(functools.partial(factory.create, self, classe_active["unique"]))
+                    name_axis = classname
+                    if factory.axis_name:
+                        name_axis += ":" + chr(classe_active["unique"] + ord("0"))
                     self.active_classes[name] = classe
                     self.add_tab(classe, name_axis)
+                if factory.profile:
                     self.profile_ui.set_save_btn(True)
-
+            self.prefetch_timer.start(self.PREFETCH_INTERVAL)
 
             self.tabsinitialized.emit(True)
 
-        self.get_value_async("sys", "lsactive", update_tabs_cb, delete=True)
+        self.get_value_async("sys", "lsactive", update_tabs_cb, delete=True, cached=True)
         self.get_value_async(
             "sys", "heapfree", self.wrapper_status_bar.update_ram_used, delete=True
         )
 
     def reconnect(self):
-        """Reconnect the board : re-open the serial link, and check it."""
-        self.reset_port()
+        """Reconnect the board : re-open the serial link, and check it. The tabs are kept for the same board."""
+        self.reset_port(keep_tabs=True)
         PyQt6.QtCore.QTimer.singleShot(1500, self.serialchooser.serial_connect_button)
 
-    def reset_port(self):
-        """Close serial port and remove tabs."""
+    def reset_port(self, keep_tabs=False):
+        """Close serial port and remove tabs. If keep_tabs they wait for the board to reconnect."""
         self.log("Reset port")
         self.profile_ui.setEnabled(False)
-        #self.serial.waitForBytesWritten(250) # Broken on pyqt6.3
-
-        # Workaround until waitForBytesWritten works again or a better solution has been found
-        def close():
-            self.serial.close()
-            self.comms_reset()
-            self.timeouting = False
-            self.serialchooser.update()
+        keep = keep_tabs and self.suspend_tabs()
+        self.comms.close() # Writes the queued commands before closing
+        self.comms_reset()
+        self.timeouting = False
+        self.serialchooser.update()
+        if not keep:
             self.reset_tabs()
 
-        if self.serial.bytesToWrite() > 0:
-            # Not everything has been sent
-            self.serial.flush() # Immediately send
-            PyQt6.QtCore.QTimer.singleShot(250, close) # Close port after 250ms because no signal is currently working. Should ensure data has been sent.
-
-        else:
-            close() # Close port
-        
     def version_check(self, ver):
         """Check if the UI is compatible with this board firmware."""
         self.fw_version_str = ver.replace("\n", "")
@@ -510,6 +638,7 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
             )
             msg.exec()
         # Check github
+        import updater # pylint: disable=import-outside-toplevel
         mainreporelease = updater.GithubRelease.get_latest_release(updater.MAINREPO)
         releaseversion,_ = updater.GithubRelease.get_version(mainreporelease)
         if updater.UpdateChecker.compare_versions(self.fw_version_str,releaseversion):
@@ -547,14 +676,15 @@ class MainUi(PyQt6.QtWidgets.QMainWindow, base_ui.WidgetUI, base_ui.Communicatio
         else:
             self.connected = False
             self.log("Disconnected")
-            self.reset_tabs()
+            if not self.session.suspended:
+                self.reset_tabs()
 
     def reset_factory(self, btn):
         """Send a async message to reset factory settings."""
         cmd = btn.text()
         if cmd == "OK":
-            self.send_value("sys", "format", 1)
-            self.send_command("sys", "reboot")
+            self.send_value("sys", "format", 1, priority=serial_comms.PRIORITY_CRITICAL)
+            self.send_command("sys", "reboot", priority=serial_comms.PRIORITY_CRITICAL)
             self.reset_port()
 
     def reset_factory_btn(self):
@@ -681,6 +811,7 @@ class WrapperStatusBar(base_ui.WidgetUI):
         self.label_ffbcnx.setPixmap(self.icon_ko)
         self.label_ffbfreq.setText("")
         self.update_ffb_block_display(False)
+        self.update_poll_rates({})
 
         self.serial_connected(False)
 
@@ -731,6 +862,19 @@ class WrapperStatusBar(base_ui.WidgetUI):
             self.label_ffbfreq.setText(F"{rate} hz")
         
 
+    def update_poll_rates(self, rates : dict):
+        """Display the total rate of polled commands. The tooltip lists each command."""
+        if not rates:
+            self.line_poll.hide()
+            self.label_poll.hide()
+            return
+        total = sum(1000 / period for period in rates.values())
+        self.label_poll.setText(F"Poll {round(total)} hz")
+        lines = [F"{cmd}: {round(1000 / period, 1)} hz" for cmd, period in sorted(rates.items())]
+        self.label_poll.setToolTip("Periodic requests, slowed down when the board answers late\n" + "\n".join(lines))
+        self.line_poll.show()
+        self.label_poll.show()
+
     def update_status(self, msg):
         """Change the status message in the bottom right."""
         self.label_status.setText(msg)
@@ -755,7 +899,7 @@ class AboutDialog(PyQt6.QtWidgets.QDialog):
     def __init__(self, parent : MainUi = None ):
         """Display the about box with the release number updated."""
         PyQt6.QtWidgets.QDialog.__init__(self, parent)
-        PyQt6.uic.loadUi(helper.res_path("about.ui"), self)
+        base_ui.load_ui("about.ui", self)
         verstr = "Version: " + VERSION
         if parent.fw_version_str:
             verstr += " / Firmware: " + parent.fw_version_str
@@ -785,11 +929,6 @@ def windows_theme_is_light():
     return subkey
 
 
-def process_events():
-    """Function to force processing background events. Do NOT call from any slots in the main thread without blocking as that may lead to recursion"""
-    app.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents,50)
-
-
 if __name__ == "__main__":
     logging.config.fileConfig('res/logger.conf')
 
@@ -806,6 +945,7 @@ if __name__ == "__main__":
         )
 
         if windows_theme_is_light() == 0:
+            import dark_palette
             app.setStyle("Fusion")
             app.setPalette(dark_palette.PALETTE_DARK)
             window.menubar.setStyleSheet("QMenu::item {color: white; }") # Menu item text ignores palette setting and stays black. Force to white.
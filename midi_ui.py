@@ -10,15 +10,15 @@ class MidiUI(WidgetUI,CommunicationHandler):
         WidgetUI.__init__(self, main,'midi.ui')
         CommunicationHandler.__init__(self)
         
-        self.init_ui()
-        self.horizontalSlider_power.valueChanged.connect(lambda val : self.send_value("main","power",val))
-        self.horizontalSlider_amp.valueChanged.connect(lambda val : self.send_value("main","range",val))
+        self.register_callback("main","power",self.horizontalSlider_power.setValue,0,int)
+        self.register_callback("main","range",self.horizontalSlider_amp.setValue,0,int)
+        self.horizontalSlider_power.valueChanged.connect(lambda val : self.send_value_throttled("main","power",val))
+        self.horizontalSlider_amp.valueChanged.connect(lambda val : self.send_value_throttled("main","range",val))
 
 
     def init_ui(self):
-        self.register_callback("main","power",self.horizontalSlider_power.setValue,0,int)
-        self.register_callback("main","range",self.horizontalSlider_amp.setValue,0,int)
+        self.send_commands("main",["power","range"],cached=True)
     
     def showEvent(self, a0) -> None:
-        self.send_commands("main",["power","range"])
+        self.init_ui()
         return super().showEvent(a0)
\ No newline at end of file
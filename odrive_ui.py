@@ -22,12 +22,10 @@ class OdriveUI(WidgetUI,CommunicationHandler):
         CommunicationHandler.__init__(self)
         self.main = main #type: main.MainUi
 
-        self.timer = QTimer(self)
         self.canOptions = portconf_ui.CanOptionsDialog(0,"CAN",main)
         self.pushButton_apply.clicked.connect(self.apply)
         self.pushButton_cansettings.clicked.connect(self.canOptions.exec)
         #self.pushButton_anticogging.clicked.connect(self.antigoggingBtn) #TODO test first
-        self.timer.timeout.connect(self.updateTimer)
         self.prefix = unique
         self.connected = False
 
@@ -39,16 +37,14 @@ class OdriveUI(WidgetUI,CommunicationHandler):
         self.register_callback("odrv","errors",lambda v : self.showErrors(v),self.prefix,int)
         self.register_callback("odrv","state",lambda v : self.stateCb(v),self.prefix,int)
 
+        self.poll_commands("odrv",["connected","vbus","errors","state"],500,self.prefix)
+        #self.serial_get_async(["odriveVbus?","odriveErrors?","odriveState?"],self.statusUpdateCb,int,self.prefix)
+
         self.init_ui()
         
     # Tab is currently shown
     def showEvent(self,event):
         self.init_ui()
-        self.timer.start(500)
-
-    # Tab is hidden
-    def hideEvent(self,event):
-        self.timer.stop()
 
     def init_ui(self):
         commands = ["canid","canspd","maxtorque"]
@@ -97,11 +93,6 @@ class OdriveUI(WidgetUI,CommunicationHandler):
             self.label_state.setText(str(dat))
 
 
-    def updateTimer(self):
-        self.send_commands("odrv",["connected","vbus","errors","state"],self.prefix)
-        #self.serial_get_async(["odriveVbus?","odriveErrors?","odriveState?"],self.statusUpdateCb,int,self.prefix)
-
-        
     def apply(self):
         #spdPreset = str(self.comboBox_baud.currentIndex()+3) # 3 is lowest preset!
         canId = str(self.spinBox_id.value())
@@ -3,14 +3,17 @@ from PyQt6.QtWidgets import QDialog
 from PyQt6.QtWidgets import QWidget,QGroupBox
 from PyQt6.QtWidgets import QMessageBox,QVBoxLayout,QCheckBox,QButtonGroup,QPushButton,QLabel,QSpinBox,QComboBox
 from PyQt6 import uic
+from collections import OrderedDict
 import main
 from helper import res_path,classlistToIds
+from base_ui import CommunicationHandler
 
 
 class OptionsDialog(QDialog):
     
-    def __init__(self,dialog, parent):
-        QDialog.__init__(self, parent)
+    def __init__(self,dialog, parent, owner = None):
+        # A sub dialog is a child of the owning widget so it is found and deleted with it
+        QDialog.__init__(self, parent if owner is None else owner)
         self.initialized = False
         self.main = parent #type: main.MainUi
         self.layout = QVBoxLayout()
@@ -71,6 +74,47 @@ class OptionsDialog(QDialog):
     def setDialog(self,dialog):
         self.conf_ui = dialog
 
+class OptionsDialogPool:
+    """Keeps the most recently opened option dialogs.
+
+    Dialogs are created by get() when they are first needed. When more than size dialogs exist
+    the least recently used one releases the callbacks and polls of its UI, the UI children and sub dialogs and is deleted.
+    """
+    SIZE = 4
+
+    def __init__(self, size = SIZE):
+        self.size = size
+        self.dialogs = OrderedDict()
+
+    def __len__(self):
+        return len(self.dialogs)
+
+    def get(self, key, create):
+        """Returns the dialog stored for key or creates it by calling create."""
+        dialog = self.dialogs.pop(key,None)
+        if dialog is None:
+            dialog = create()
+        self.dialogs[key] = dialog
+        while len(self.dialogs) > self.size:
+            _,old = self.dialogs.popitem(last=False)
+            self.release(old)
+        return dialog
+
+    def release(self, dialog : OptionsDialog):
+        """Removes the callbacks of the dialog UI and everything it owns and deletes the dialog with its children."""
+        widgets = [dialog.conf_ui] + dialog.conf_ui.findChildren(QWidget)
+        # The UI of a sub dialog is only its child after the sub dialog was opened
+        widgets += [sub.conf_ui for sub in dialog.conf_ui.findChildren(OptionsDialog)]
+        for handler in dict.fromkeys(widgets):
+            if isinstance(handler,CommunicationHandler):
+                handler.remove_callbacks()
+        dialog.deleteLater()
+
+    def clear(self):
+        while self.dialogs:
+            _,dialog = self.dialogs.popitem()
+            self.release(dialog)
+
 class OptionsDialogGroupBox(QGroupBox):
     name = "Options"
     def __init__(self,name,main):
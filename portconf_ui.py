@@ -39,10 +39,10 @@ class CanOptionsDialog(OptionsDialog):
     def getSpeedName(self):
         return self.conf_ui.speedBox.currentText()
 
-    def __init__(self,instance,name, main):
+    def __init__(self,instance,name, main, owner = None):
         self.main = main
         self.name = name
-        OptionsDialog.__init__(self,self.CanOptionsDialogBox(name,main,instance),main)
+        OptionsDialog.__init__(self,self.CanOptionsDialogBox(name,main,instance),main,owner)
 
 
 class I2COptionsDialog(OptionsDialog):
@@ -73,7 +73,7 @@ class I2COptionsDialog(OptionsDialog):
         def onclose(self):
             self.remove_callbacks()
 
-    def __init__(self,instance,name, main):
+    def __init__(self,instance,name, main, owner = None):
         self.main = main
         self.name = name
-        OptionsDialog.__init__(self,self.I2COptionsDialogBox(name,main,instance),main)
\ No newline at end of file
+        OptionsDialog.__init__(self,self.I2COptionsDialogBox(name,main,instance),main,owner)
\ No newline at end of file
@@ -14,12 +14,67 @@ import PyQt6.QtCore
 import PyQt6.QtWidgets
 import PyQt6.QtGui
 import base_ui
+import serial_comms
+
+PROFILES_RELEASE = 2 # Format version of profiles.json
+
+
+def running_classes(buffer: str, profile_setup: dict):
+    """Parse a sys.lsactive reply into the running {classname, fullname, instance} the profile setup saves."""
+    splitted_running_class = [x.split(":") for x in buffer.split("\n") if x]
+    running = [
+        {"classname": tab[1], "fullname": tab[0], "instance": int(tab[2])}
+        for tab in splitted_running_class
+    ]
+    # For each class to saved declared in the cfg file,
+    # we filter the running instance to keep only those
+    map_class_running = []
+    for call_order in profile_setup["callOrder"]:
+        map_class_running.extend(
+            x for x in running
+            if x["classname"] == call_order["classname"]
+            and x["fullname"] == call_order["fullname"]
+        )
+    return map_class_running
+
+
+def profile_requests(profile_setup: dict, map_class_running: list):
+    """List the {fullname, cls, instance, cmd} to read for a profile, in call order."""
+    requested = []
+    for call_order in profile_setup["callOrder"]:
+        for running in map_class_running:
+            if (running["classname"] != call_order["classname"]
+                    or running["fullname"] != call_order["fullname"]):
+                continue
+            requested.extend(
+                {
+                    "fullname": call_order["fullname"],
+                    "cls": call_order["classname"],
+                    "instance": running["instance"],
+                    "cmd": cmd,
+                }
+                for cmd in call_order["key"]
+            )
+    return requested
+
+
+def running_parameters(profile_data: list, map_class_running: list):
+    """Filter the parameters of a profile down to the running classes."""
+    parameters_running = []
+    for running_class in map_class_running:
+        parameters_running.extend(
+            x for x in profile_data
+            if x["fullname"] == running_class["fullname"]
+            and x["cls"] == running_class["classname"]
+            and x["instance"] == running_class["instance"]
+        )
+    return parameters_running
 
 
 class ProfileUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
     """Manage the Profile selector and the board communication about them."""
 
-    __RELEASE = 2
+    __RELEASE = PROFILES_RELEASE
     __PROFILES_FILENAME = "profiles.json"
     __PROFILESSETUP_FILENAME = "res/profile.cfg"
     __PROFILES_TEMPLATE = {
@@ -65,9 +120,6 @@ class ProfileUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
         self.profile_setup = {}
         self.profiles = {}
 
-        self._current_class = -1
-        self._current_command = -1
-        self._current_instance = -1
         self._map_class_running = []
         self._running_profile = []
         self._profilename_tosave: str = None
@@ -257,124 +309,15 @@ class ProfileUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
     def _read_running_class_and_go_cb(self, call_back):
         """Get the running class from board, and process the call_back when board respond."""
         # refresh the global var when starting to read value from board
-        self._current_class = -1
-        self._current_command = -1
-        self._current_instance = -1
         self._map_class_running = []
         self._running_profile = []
         # get the list active class from board, after that the the callBack call recursively
-        self.get_value_async("sys", "lsactive", call_back)
+        self.get_value_async("sys", "lsactive", call_back, cached=True)
 
     ###############  method helper to construct and go through struct definition ###############
 
     def _build_running_map(self, buffer: str):
-        self._map_class_running = []
-        # Split the string buffer into array
-        splitted_running_class = [x.split(":") for x in buffer.split("\n")]
-        # Format the arrray in array of object {classname, fullname, instance}
-        formated_iterator = list(
-            map(
-                lambda tab: {
-                    "classname": tab[1],
-                    "fullname": tab[0],
-                    "instance": int(tab[2]),
-                },
-                splitted_running_class,
-            )
-        )
-        # For each class to saved declared in the cfg file,
-        # we filter the running instance to keep only those
-        for call_order in self.profile_setup["callOrder"]:
-            filtered_iterator = filter(
-                lambda x, call=call_order: x["classname"] == call["classname"]
-                and x["fullname"] == call["fullname"],
-                formated_iterator,
-            )
-            self._map_class_running.extend(list(filtered_iterator))
-
-    def _get_instance_running(self, indexclass: int, indexinstance: int):
-        if indexclass > len(self.profile_setup["callOrder"]):
-            return None
-
-        classname = self.profile_setup["callOrder"][indexclass]["classname"]
-        fullname = self.profile_setup["callOrder"][indexclass]["fullname"]
-        classes_running = list(
-            filter(
-                lambda x: x["classname"] == classname and x["fullname"] == fullname,
-                self._map_class_running,
-            )
-        )
-
-        # To test
-        # the request instance is not on a running classes
-        if len(classes_running) == 0 or indexinstance >= len(classes_running):
-            return None
-        else:  # else return the instance number
-            return int(classes_running[indexinstance]["instance"])
-
-    def _get_next_element_to_request(self):
-        is_another_element = False
-
-        # if it's the start
-        if (
-            self._current_class == -1
-            and self._current_command == -1
-            and self._current_instance == -1
-        ):
-            self._current_class = 0
-            self._current_command = 0
-            self._current_instance = 0
-            is_another_element = True
-        # if there is another command for this class, go to next command
-        elif (self._current_command + 1) < len(
-            self.profile_setup["callOrder"][self._current_class]["key"]
-        ):
-            self._current_command += 1
-            is_another_element = True
-        else:
-            # if there is not next command,
-            # we check if there is another instance of this class to request
-            next_instance = self._get_instance_running(
-                self._current_class, self._current_instance + 1
-            )
-            if (
-                next_instance is not None
-            ):  # a next instance exist, we move index to this and restart on 1st dmd
-                self._current_instance += 1
-                self._current_command = 0
-                is_another_element = True
-            elif (self._current_class + 1) < len(
-                self.profile_setup["callOrder"]
-            ):  # there isn't next instance, we move too next class if exist
-                self._current_class += 1
-                self._current_command = 0
-                self._current_instance = 0
-                is_another_element = True
-            else:
-                is_another_element = False
-
-        # if the next computed class/instance is not running, we go to the next
-        if (
-            is_another_element
-            and self._get_instance_running(self._current_class, self._current_instance)
-            is None
-        ):
-            return self._get_next_element_to_request()
-
-        return is_another_element
-
-    def _read_value(self, indexclass: int, indexcmd: int, indexinstance: int):
-        if indexclass < len(self.profile_setup["callOrder"]) and indexcmd < len(
-            self.profile_setup["callOrder"][indexclass]["key"]
-        ):
-            classname = self.profile_setup["callOrder"][self._current_class][
-                "classname"
-            ]
-            cmd = self.profile_setup["callOrder"][self._current_class]["key"][
-                self._current_command
-            ]
-            instance = self._get_instance_running(indexclass, indexinstance)
-            self.get_value_async(classname, cmd, self._read_profile_cb, instance)
+        self._map_class_running = running_classes(buffer, self.profile_setup)
 
     def _save_profile_in_file(self, profile_data: str, profilename: str):
         # search the profile in the json profiles and replace is content
@@ -412,53 +355,38 @@ class ProfileUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
     ####################### Call Back for Async Serial Communication #######################
 
     def _read_profile_cb(self, buffer: str):
-        # process the incoming buffer
-        if self._current_class == -1:
-            # first call is sys.lsactive to get all active class
-            # that running and we extract a map of class/instances
-            self._build_running_map(buffer)
-        else:
-            # each time we received a value, we store the value
-            # and awe asked the next one in the config file,
-            # for each instance read in the firt call
-            fullname = self.profile_setup["callOrder"][self._current_class]["fullname"]
-            classname = self.profile_setup["callOrder"][self._current_class][
-                "classname"
-            ]
-            cmd = self.profile_setup["callOrder"][self._current_class]["key"][
-                self._current_command
-            ]
-            instance = self._get_instance_running(
-                self._current_class, self._current_instance
-            )
-            self._running_profile.append(
-                {
-                    "fullname": fullname,
-                    "cls": classname,
-                    "instance": instance,
-                    "cmd": cmd,
-                    "value": buffer,
-                }
-            )
+        # first call is sys.lsactive to get all active class
+        # that running and we extract a map of class/instances
+        self._build_running_map(buffer)
+
+        # request every value of the config file for each running instance at once
+        requested = profile_requests(self.profile_setup, self._map_class_running)
+        futures = [
+            self.request_value(entry["cls"], entry["cmd"], entry["instance"], priority=serial_comms.PRIORITY_BACKGROUND)
+            for entry in requested
+        ]
+
+        def read_done_cb(futures):
+            # store the values in call order, skipping the ones the board did not answer
+            for entry, future in zip(requested, futures):
+                if future.cancelled():
+                    return
+                if future.exception() is not None:
+                    self.log(F"Profile: can't read {entry['cls']}.{entry['cmd']}: {future.exception()}")
+                    continue
+                self._running_profile.append(dict(entry, value=future.result()))
+
+            if self._profilename_tosave is not False:
+                self._save_profile_in_file(self._running_profile, self._profilename_tosave)
+            else:
+                self.log("Profiles: profile read from board")
 
-        # if there is another command for this class, go to next command
-        if self._get_next_element_to_request():
-            self._read_value(
-                self._current_class, self._current_command, self._current_instance
-            )
-        elif self._profilename_tosave is not False:
-            self._save_profile_in_file(self._running_profile, self._profilename_tosave)
-        else:
-            self.log("Profiles: profile read from board")
+        serial_comms.when_all(futures, read_done_cb)
 
     def _write_profile_cb(self, buffer: str):
-        # process the incoming buffer
-        if self._current_class == -1:
-            # first call is sys.lsactive to get all active class
-            # that running and we extract a map of class/instances
-            self._build_running_map(buffer)
-        else:
-            return
+        # first call is sys.lsactive to get all active class
+        # that running and we extract a map of class/instances
+        self._build_running_map(buffer)
 
         # read the selected profile name
         profilename = str(self.comboBox_profiles.currentText())
@@ -466,22 +394,10 @@ class ProfileUI(base_ui.WidgetUI, base_ui.CommunicationHandler):
             return
 
         # From the profile, filter parameters that are running
-        parameters_running = []
         profile_json_entry = next(
             filter(lambda x: x["name"] == profilename, self.profiles["profiles"]), None
         )
-        for running_class in self._map_class_running:
-            parameters_running.extend(
-                list(
-                    filter(
-                        lambda x, running=running_class: x["fullname"]
-                        == running["fullname"]
-                        and x["cls"] == running["classname"]
-                        and x["instance"] == running["instance"],
-                        profile_json_entry["data"],
-                    )
-                )
-            )
+        parameters_running = running_parameters(profile_json_entry["data"], self._map_class_running)
 
         # sent the filter running parameter to the board
         # and after, read a new time values to refresh UI
@@ -24,7 +24,9 @@ class PwmDriverUI(WidgetUI,CommunicationHandler):
         self.register_callback("pwmdrv","mode",self.pwmmode_cb,0,str,typechar='!')
         self.register_callback("pwmdrv","mode",self.comboBox_mode.setCurrentIndex,0,int,typechar='?')
 
+    def showEvent(self,event):
         self.init_ui()
+        return super().showEvent(event)
 
     def init_ui(self):
         # Fill menus
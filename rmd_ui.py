@@ -12,6 +12,7 @@ import struct, math, time
 from base_ui import WidgetUI
 from base_ui import CommunicationHandler
 import portconf_ui
+import serial_comms
 
 
 class RmdUI(WidgetUI, CommunicationHandler):
@@ -28,7 +29,6 @@ class RmdUI(WidgetUI, CommunicationHandler):
         self.stopMotorTimer = QTimer(self, singleShot=True)
         self.stopMotorTimer.timeout.connect(self.stopMotor)
 
-        self.timer = QTimer(self)
         self.canOptions = portconf_ui.CanOptionsDialog(0, "CAN", main)
         self.canSettings_apply.clicked.connect(self.applyCanSettings)
         self.maxTorque_apply.clicked.connect(self.applyMaxTorque)
@@ -42,7 +42,6 @@ class RmdUI(WidgetUI, CommunicationHandler):
         self.setRmdBaudrateButton.clicked.connect(self.setRmdBaudrate)
         self.resetMultiturnButton.clicked.connect(self.resetMultiturnValue)
         self.stopButton.clicked.connect(self.toggleRunning)
-        self.timer.timeout.connect(self.updateTimer)
         self.prefix = unique
         self.connected = False
 
@@ -104,16 +103,14 @@ class RmdUI(WidgetUI, CommunicationHandler):
         self.register_callback("rmd", "pid", self.pidCb, self.prefix, int)
         self.register_callback("rmd", "motion", self.motionCb, self.prefix, int)
 
+        self.poll_commands("rmd", ["connected", "voltage", "error", "state", "pos_turns", "pos_turns_offset", "torque", "spd",
+                           "multi_pos_raw", "multi_offset", "single_pos", "single_offset", "multi_ang"], 25, self.prefix)
+
         self.init_ui()
 
     # Tab is currently shown
     def showEvent(self, event):
         self.init_ui()
-        self.timer.start(25)
-
-    # Tab is hidden
-    def hideEvent(self, event):
-        self.timer.stop()
 
     def init_ui(self):
         self.angPosSlider.setRange(-3000, 3000)
@@ -137,10 +134,10 @@ class RmdUI(WidgetUI, CommunicationHandler):
             self.send_value("rmd", "start", 0, instance=self.prefix)
         else:
             self.stopButton.setText("RUN")
-            self.send_value("rmd", "stop", 0, instance=self.prefix)
+            self.send_value("rmd", "stop", 0, instance=self.prefix, priority=serial_comms.PRIORITY_CRITICAL)
 
     def stopMotor(self):
-        self.send_value("rmd", "stop", 0, instance=self.prefix)
+        self.send_value("rmd", "stop", 0, instance=self.prefix, priority=serial_comms.PRIORITY_CRITICAL)
         self.submitPid(0, ip=self.ip, ii=self.ii, vp=self.vp, vi=self.vi, kp=self.kp, ki=self.ki )
         self.isRunning = False
         self.stopButton.setText("RUN")
@@ -231,11 +228,6 @@ class RmdUI(WidgetUI, CommunicationHandler):
         else:
             self.label_state.setText(str(dat))
 
-    def updateTimer(self):
-        pass
-        self.send_commands("rmd", ["connected", "voltage", "error", "state", "pos_turns", "pos_turns_offset", "torque", "spd",
-                           "multi_pos_raw", "multi_offset", "single_pos", "single_offset", "multi_ang"], self.prefix)
-
     def readPlanAccel(self):
         self.send_command("rmd", "plan_accel", self.prefix)
 
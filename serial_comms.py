@@ -1,11 +1,19 @@
-import queue,time, traceback, sys
+import queue,time, traceback, sys, threading
+import json
+import heapq
+import math
+import hashlib
+import codecs
+import os
+import struct
+import concurrent.futures
 from PyQt6.QtCore import QObject
 from PyQt6.QtWidgets import QApplication
-from collections import deque
+from collections import deque, namedtuple
 import re
 import PyQt6.QtSerialPort
-from PyQt6.QtCore import pyqtSignal
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import pyqtSignal, pyqtSlot
+from PyQt6.QtCore import QTimer, QThread, QIODevice, Qt
 import logging
 
 from helper import throttle
@@ -19,84 +27,1839 @@ GRP_CMDVAL1     = 4
 GRP_CMDVAL2     = 5
 GRP_REPLY       = 6
 
+class CommandError(Exception):
+    """The board answered a request with an error"""
+
+class CommandNotFoundError(CommandError):
+    """The board does not know the requested command"""
+
+class CommandTimeoutError(CommandError, TimeoutError):
+    """No reply arrived in time"""
+
+# Parsed reply. adr is the address of a "?" request, val the first numeric argument
+ReplyRecord = namedtuple("ReplyRecord",["cls","instance","cmd","typechar","val","adr","reply"])
+
+def parse_reply(match):
+    """Converts a cmdRegex match into a ReplyRecord"""
+    groups = match.groups()
+    cls = groups[GRP_CLS]
+    instance = int(groups[GRP_INSTANCE]) if groups[GRP_INSTANCE] else 0
+    reply = str(groups[GRP_REPLY])
+    typechar = groups[GRP_TYPE] if groups[GRP_TYPE] else ''
+    cmd = groups[GRP_CMD]
+    adr = int(groups[GRP_CMDVAL2]) if groups[GRP_CMDVAL2] != None else int(groups[GRP_CMDVAL1]) if groups[GRP_CMDVAL1] != None and typechar == '?' else None
+    val = int(groups[GRP_CMDVAL1]) if groups[GRP_CMDVAL1] != None  else None
+    return ReplyRecord(cls,instance,cmd,typechar,val,adr,reply)
+
+
+def frame_record(match):
+    """Converts a match of the bytes version of cmdRegex into a ReplyRecord, decoding only the groups"""
+    cls,instance,cmd,typechar,val,adr,reply = match.groups()
+    typechar = typechar.decode()
+    val = int(val) if val is not None else None
+    adr = int(adr) if adr is not None else val if typechar == '?' else None
+    # tuple.__new__ skips the argument handling of the namedtuple constructor, a third of the cost of a frame
+    return tuple.__new__(ReplyRecord,(cls.decode(),int(instance) if instance else 0,cmd.decode(),typechar,val,adr,reply.decode("utf-8","replace")))
+
+
+def when_all(futures,callback):
+    """Calls callback with the list of futures once all of them are done"""
+    futures = list(futures)
+    remaining = len(futures)
+    lock = threading.Lock()
+    if not futures:
+        callback(futures)
+        return
+
+    def done(_):
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            finished = remaining == 0
+        if finished:
+            callback(futures)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+class ReplyFramer:
+    """Incremental splitter for the "[...]" reply stream.
+
+    Received bytes are appended to a bytearray and scanned from a cursor so each byte is only
+    searched once, no matter how many chunks a reply is split into. Frames are matched in place with
+    a bytes pattern and decoded one at a time which keeps utf-8 sequences split across chunks intact.
+    Runs of well-formed frames take a single match each, anything else the general path.
+    Consumed bytes are dropped in bulk once they make up most of the buffer.
+
+    The buffer is bounded. A frame still open after MAX_FRAME bytes is only kept if it starts with a
+    valid command header. It is then streamed: received chunks are decoded, moved out of the buffer
+    and joined once the end marker arrives, up to MAX_STREAM bytes. on_chunk is called with the
+    "cls.cmd" key and the size so far for every chunk.
+    Anything else is discarded up to the next "[". A "[" followed by a valid header inside an open
+    frame starts a new frame and drops the broken one in front of it.
+    Thrown away bytes are counted in discarded, line breaks between frames excluded.
+    resyncs counts the runs of broken data between two frames, however often the framer skips ahead in one.
+    """
+
+    COMPACT_SIZE = 4096
+    MAX_FRAME = 4096
+    MAX_STREAM = 1024 * 1024
+    MAX_HEADER = 64 # Longest "[cls.instance.cmd?val?adr|" waited for while streaming
+    HEADER_REGEX = re.compile(rb"\[(\w+)\.(?:\d+\.)?(\w+)[?!=]?\d*(?:\?\d+)?\|")
+    # A complete frame without brackets in the reply at the cursor and the line breaks around it.
+    # Groups as in cmdRegex. Everything else takes the general path
+    FRAME_REGEX = re.compile(rb"\n?\[(\w+)\.(?:(\d+)\.)?(\w+)([?!=]?)(?:(\d+))?(?:\?(\d+))?\|([^\[\]]+)\]\n?")
+
+    def __init__(self,regex,on_chunk=None):
+        self.regex = regex # Parses streamed replies, joined as text
+        # Complete frames are matched in the buffer, only their groups are decoded
+        self.frame_regex = re.compile(regex.pattern.encode(),regex.flags & ~re.UNICODE) if isinstance(regex.pattern,str) else regex
+        self.on_chunk = on_chunk
+        self.buffer = bytearray()
+        self.pos = 0 # Start of unconsumed data
+        self.scan = 0 # Resume position for the end marker search
+        self.discarded = 0
+        self.resyncs = 0
+        self.synced = True # No data was skipped since the last frame
+        self.streamed = 0
+        self.stream = None # [key, decoded chunks, size in bytes, decoder] of the reply being streamed
+
+    def __len__(self):
+        return len(self.buffer) - self.pos
+
+    def clear(self):
+        self.buffer.clear()
+        self.pos = 0
+        self.scan = 0
+        self.stream = None
+        self.synced = True
+
+    def _discard(self,start,end):
+        buf = self.buffer
+        if end > start:
+            self.discarded += end - start - buf.count(b"\n",start,end) - buf.count(b"\r",start,end)
+
+    def _next_header(self,start,end):
+        """Position of the first "[" in buf[start:end] followed by a valid header or -1"""
+        buf = self.buffer
+        nested = buf.find(b"[",start,end)
+        while nested >= 0:
+            if self.HEADER_REGEX.match(buf,nested):
+                return nested
+            nested = buf.find(b"[",nested + 1,end)
+        return -1
+
+    def feed(self,data):
+        """Appends received bytes and returns a list of (ReplyRecord or None, frame text) for all complete frames"""
+        buf = self.buffer
+        buf += data
+        frames = []
+        append = frames.append
+        new = tuple.__new__
+        fast_match = self.FRAME_REGEX.match
+        complete = buf.rfind(b"]") + 1 # No frame can be matched beyond the last end marker
+        while True:
+            if self.stream is not None:
+                if not self._continue_stream(frames):
+                    break
+                continue
+            pos = self.pos
+            if pos >= complete:
+                if len(buf) - pos <= self.MAX_FRAME:
+                    # No end marker yet. Text outside of a frame is discarded once one arrives
+                    self.scan = len(buf)
+                    break
+            else:
+                match = fast_match(buf,pos,complete)
+                while match is not None:
+                    pos = match.end()
+                    # frame_record inlined, calls cost a tenth of the time of a small frame
+                    cls,instance,cmd,typechar,val,adr,reply = match.groups()
+                    typechar = typechar.decode()
+                    val = int(val) if val is not None else None
+                    adr = int(adr) if adr is not None else val if typechar == '?' else None
+                    text = buf[match.start(GRP_CLS + 1):match.end(GRP_REPLY + 1)].decode("utf-8","replace")
+                    append((new(ReplyRecord,(cls.decode(),int(instance) if instance else 0,cmd.decode(),typechar,val,adr,reply.decode("utf-8","replace"))),text))
+                    match = fast_match(buf,pos,complete) if pos < complete else None
+                if pos != self.pos:
+                    self.pos = self.scan = pos
+                    self.synced = True
+                    continue
+            start = buf.find(b"[",self.pos)
+            if start < 0:
+                # Nothing but text outside of a frame. Discard it
+                self._discard(self.pos,len(buf))
+                self.pos = len(buf)
+                self.scan = self.pos
+                break
+            if start > self.pos:
+                if start - self.pos > 1 or buf[self.pos] != 10: # Not just the line break after a frame
+                    self._discard(self.pos,start)
+                self.pos = start
+            end = buf.find(b"]",max(start+1,self.scan))
+            if end < 0:
+                # Incomplete frame. Resume searching after the received data next time
+                self.scan = len(buf)
+                if len(buf) - start > self.MAX_FRAME:
+                    self._overflow(start)
+                    continue
+                break
+            nested = buf.find(b"[",start + 1,end)
+            if nested >= 0:
+                nested = self._next_header(nested,end)
+            if nested >= 0:
+                # The frame lost its end marker. Continue with the one starting inside of it
+                self._skip(start,nested)
+                continue
+            text = buf[start+1:end].decode("utf-8",errors="replace")
+            self.pos = self.scan = end + 1
+            self.synced = True
+            match = self.frame_regex.match(buf,start,end + 1)
+            frames.append((frame_record(match) if match else None,text))
+
+        if self.pos >= self.COMPACT_SIZE and self.pos * 2 >= len(buf):
+            del buf[:self.pos]
+            self.scan -= self.pos
+            self.pos = 0
+        return frames
+
+    def _resync(self):
+        """Counts a run of broken data once, at its first skip"""
+        if self.synced:
+            self.synced = False
+            self.resyncs += 1
+
+    def _skip(self,start,end):
+        """Drops a broken frame and resumes at end"""
+        self._resync()
+        self._discard(start,end)
+        self.pos = end
+        self.scan = max(self.scan,end) # There is no end marker before the scan position
+
+    def _overflow(self,start):
+        """Starts streaming the oversized frame at start or resynchronises if it is not a reply"""
+        buf = self.buffer
+        header = self.HEADER_REGEX.match(buf,start)
+        nested = self._next_header(start + 1,len(buf)) if header else buf.find(b"[",start + 1)
+        if header is None or nested >= 0:
+            self._skip(start,nested if nested >= 0 else len(buf))
+            return
+        key = (header.group(1) + b"." + header.group(2)).decode()
+        self.synced = True
+        self.stream = [key,[],0,codecs.getincrementaldecoder("utf-8")(errors="replace")]
+        self._append_stream(start,len(buf))
+
+    def _append_stream(self,start,end,final=False):
+        stream = self.stream
+        stream[1].append(stream[3].decode(self.buffer[start:end],final))
+        stream[2] += end - start
+        self.pos = end
+        self.scan = end
+        if self.on_chunk:
+            self.on_chunk(stream[0],stream[2])
+
+    def _continue_stream(self,frames):
+        """Consumes received data of a streamed reply. Returns True if the stream ended"""
+        buf = self.buffer
+        end = buf.find(b"]",self.pos)
+        limit = len(buf) if end < 0 else end
+        nested = self._next_header(self.pos,limit)
+        if nested >= 0:
+            # A new reply started before the end marker. The streamed one is incomplete
+            self.discarded += self.stream[2]
+            self.stream = None
+            self._skip(self.pos,nested)
+            return True
+        if end < 0:
+            # Keep a trailing "[" that may still become a header
+            hold = buf.rfind(b"[",max(self.pos,len(buf) - self.MAX_HEADER))
+            if hold < 0:
+                hold = len(buf)
+            if hold > self.pos:
+                self._append_stream(self.pos,hold)
+            if self.stream[2] > self.MAX_STREAM:
+                self.discarded += self.stream[2]
+                self.stream = None
+                self._resync()
+                return True
+            return False
+        self._append_stream(self.pos,end + 1,final=True)
+        text = "".join(self.stream[1])
+        self.stream = None
+        self.streamed += 1
+        match = self.regex.search(text)
+        frames.append((parse_reply(match) if match else None,text[1:-1]))
+        return True
+
+class CallbackRegistry:
+    """Dispatch index for reply callbacks.
+
+    Entries are bucketed by (cls, cmd) -> (instance, typechar) -> address so a reply only
+    visits the callbacks that can match it. Wildcard instance (0xff) and typechar None buckets
+    are probed next to the exact ones and replies without an address visit every address bucket.
+
+    Replies are matched and converted in the comms thread by dispatch() and the resulting values
+    are handed to deliver() in the GUI thread. One-shot entries leave the index as soon as they are
+    dispatched but stay owned by their handler until delivered, so removing a handler in between
+    still cancels the pending call.
+
+    One-shot entries carry a deadline. expire() drops the ones that were never answered so lost
+    replies do not grow the registry. Entries without a deadline only expire with expire(math.inf).
+    """
+
+    WILDCARD_INSTANCE = 0xff
+    ONESHOT_TIMEOUT = 10000 # Default ms until an unanswered one-shot entry expires
+
+    def __init__(self):
+        self._index = {}
+        self._handlers = {}
+        self._seq = 0
+        self._lock = threading.RLock()
+        self.freed = 0 # One-shot callbacks dropped because their command does not exist
+        self.expired = 0 # One-shot callbacks dropped after their deadline
+        self._deadlines = [] # Heap of (deadline, seq, entry) of one-shot entries
+        self._untimed = {} # seq -> one-shot entry without a deadline, kept out of the heap as they are never popped
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._handlers.values())
+
+    def add(self,handler,cls,cmd,callback,instance=0,conversion=None,adr=None,delete=False,typechar='?',error=None,silent=False,timeout=None,on_timeout=None):
+        """Adds a callback unless an identical one is already registered. Returns the entry
+
+        error is called with a CommandNotFoundError if the board does not know the command.
+        Without it NOT_FOUND replies are ignored and one-shot callbacks are dropped.
+        Replies handled by one-shot or silent callbacks are not forwarded to the raw reply log.
+        One-shot entries expire after timeout ms (ONESHOT_TIMEOUT by default, never if math.inf)
+        and on_timeout is called with a CommandTimeoutError.
+        """
+        key = (handler,callback,conversion,instance,cls,cmd,adr,delete,typechar,error,silent)
+        with self._lock:
+            bucket = self._index.setdefault((cls,cmd),{}).setdefault((instance,typechar),{}).setdefault(adr,{})
+            if key in bucket:
+                return bucket[key]
+            self._seq += 1
+            callbackObj = {"handler":handler,"callback":callback,"convert":conversion,"instance":instance,"class":cls,"cmd":cmd,"address":adr,"delete":delete,"typechar":typechar,"error":error,"silent":silent,
+                           "key":key,"seq":self._seq,"indexed":True,"active":True,"on_timeout":on_timeout}
+            bucket[key] = callbackObj
+            self._handlers.setdefault(handler,{})[self._seq] = callbackObj
+            if delete:
+                if timeout is None:
+                    timeout = self.ONESHOT_TIMEOUT
+                if timeout == math.inf:
+                    self._untimed[self._seq] = callbackObj
+                else:
+                    heapq.heappush(self._deadlines,(time.monotonic() + timeout / 1000,self._seq,callbackObj))
+            return callbackObj
+
+    def remove(self,callbackObj):
+        """Removes a single entry in constant time"""
+        with self._lock:
+            callbackObj["active"] = False
+            self._release(callbackObj)
+            self._unindex(callbackObj)
+
+    def _release(self,callbackObj):
+        self._untimed.pop(callbackObj["seq"],None)
+        handler_entries = self._handlers.get(callbackObj["handler"])
+        if handler_entries is not None and handler_entries.pop(callbackObj["seq"],None) is not None:
+            if not handler_entries:
+                del self._handlers[callbackObj["handler"]]
+
+    def _unindex(self,callbackObj):
+        if not callbackObj["indexed"]:
+            return
+        callbackObj["indexed"] = False
+        key = callbackObj["key"]
+        cmd_key = (callbackObj["class"],callbackObj["cmd"])
+        sel_key = (callbackObj["instance"],callbackObj["typechar"])
+        selectors = self._index[cmd_key]
+        addresses = selectors[sel_key]
+        bucket = addresses[callbackObj["address"]]
+        del bucket[key]
+        # Prune empty buckets so lookups stay flat
+        if not bucket:
+            del addresses[callbackObj["address"]]
+            if not addresses:
+                del selectors[sel_key]
+                if not selectors:
+                    del self._index[cmd_key]
+
+    def expire(self,now=None):
+        """Removes one-shot entries past their deadline, all of them if now is math.inf. Returns the removed entries"""
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                callbackObj = heapq.heappop(self._deadlines)[2]
+                if callbackObj["active"]: # Entries answered or removed meanwhile are skipped
+                    self.remove(callbackObj)
+                    expired.append(callbackObj)
+            if now == math.inf:
+                for callbackObj in list(self._untimed.values()):
+                    self.remove(callbackObj)
+                    expired.append(callbackObj)
+            self.expired += len(expired)
+        return expired
+
+    def stats(self):
+        """Live entry counts in total, of one-shot entries, per handler type and per class"""
+        with self._lock:
+            entries = [callbackObj for handler_entries in self._handlers.values() for callbackObj in handler_entries.values()]
+        by_handler = {}
+        by_class = {}
+        for callbackObj in entries:
+            name = type(callbackObj["handler"]).__name__
+            by_handler[name] = by_handler.get(name,0) + 1
+            by_class[callbackObj["class"]] = by_class.get(callbackObj["class"],0) + 1
+        return {"entries":len(entries),"one_shot":sum(1 for e in entries if e["delete"]),"deadlines":len(self._deadlines) + len(self._untimed),
+                "expired":self.expired,"freed":self.freed,"by_handler":by_handler,"by_class":by_class}
+
+    def remove_handler(self,handler):
+        """Removes all entries registered by handler, including dispatched but undelivered ones.
+        The futures of its pending requests are cancelled."""
+        with self._lock:
+            removed = list(self._handlers.get(handler,{}).values())
+            for callbackObj in removed:
+                self.remove(callbackObj)
+        self._cancel(removed)
+
+    def clear(self):
+        with self._lock:
+            removed = []
+            for handler_entries in self._handlers.values():
+                for callbackObj in handler_entries.values():
+                    callbackObj["active"] = False
+                    callbackObj["indexed"] = False
+                    removed.append(callbackObj)
+            self._index.clear()
+            self._handlers.clear()
+            self._deadlines.clear()
+            self._untimed.clear()
+        self._cancel(removed)
+
+    @staticmethod
+    def _cancel(removed):
+        for callbackObj in removed:
+            future = callbackObj.get("future")
+            if future is not None:
+                future.cancel()
+
+    def dispatch(self,record):
+        """Matches a reply and converts its value for every callback.
+
+        Returns a list of (entry, value) for deliver() and true if a one-shot or silent callback consumed the reply.
+        """
+        deliveries = []
+        consumed = False
+        not_found = record.reply == "NOT_FOUND"
+        with self._lock:
+            for callbackObj in self.match(record.cls,record.cmd,record.instance,record.typechar,record.adr):
+                if not_found and not callbackObj["error"]:
+                    if callbackObj["delete"]: # Would never be answered
+                        self.remove(callbackObj)
+                        self.freed += 1
+                    continue
+                if callbackObj["delete"]: # Leaves the index now but is released on delivery
+                    self._unindex(callbackObj)
+                    consumed = True
+                elif callbackObj["silent"]:
+                    consumed = True
+                if not_found:
+                    deliveries.append((callbackObj,CommandNotFoundError(f"{record.cls}.{record.instance}.{record.cmd}{record.typechar}")))
+                    continue
+                value = record.reply
+                if callbackObj["convert"]:
+                    try:
+                        value = callbackObj["convert"](value)
+                    except Exception as e:
+                        print(f"Can not convert reply {record}: {e}")
+                        continue
+                deliveries.append((callbackObj,value))
+        return deliveries,consumed
+
+    def deliver(self,deliveries):
+        """Calls the callbacks of dispatched replies unless their handler was removed meanwhile"""
+        for callbackObj,value in deliveries:
+            if not callbackObj["active"]:
+                continue
+            if callbackObj["delete"]:
+                with self._lock:
+                    callbackObj["active"] = False
+                    self._release(callbackObj)
+            if isinstance(value,CommandError):
+                callbackObj["error"](value)
+            else:
+                callbackObj["callback"](value)
+
+    def match(self,cls,cmd,instance,typechar,adr):
+        """Returns all indexed entries matching a reply in registration order"""
+        selectors = self._index.get((cls,cmd))
+        if not selectors:
+            return []
+        matches = []
+        buckets = 0
+        for inst in ((instance,) if instance == self.WILDCARD_INSTANCE else (instance,self.WILDCARD_INSTANCE)):
+            for tc in ((typechar,None) if typechar is not None else (None,)):
+                addresses = selectors.get((inst,tc))
+                if not addresses:
+                    continue
+                if adr is None:
+                    for bucket in addresses.values():
+                        matches.extend(bucket.values())
+                        buckets += 1
+                elif adr in addresses:
+                    matches.extend(addresses[adr].values())
+                    buckets += 1
+        if buckets > 1:
+            matches.sort(key=lambda callbackObj: callbackObj["seq"])
+        return matches
+
+
+class LinkStats:
+    """Round trip time and outstanding request depth per command class.
+
+    Times are measured up to the delivery in the GUI thread so a congested UI counts as load too.
+    """
+
+    ALPHA = 0.2 # Weight of a new RTT sample in the moving average
+
+    def __init__(self):
+        self.classes = {}
+
+    def get(self,cls):
+        stats = self.classes.get(cls)
+        if stats is None:
+            stats = {"rtt":None,"outstanding":0,"replies":0,"lost":0}
+            self.classes[cls] = stats
+        return stats
+
+    def sent(self,cls):
+        self.get(cls)["outstanding"] += 1
+
+    def replied(self,cls,rtt):
+        stats = self.get(cls)
+        stats["outstanding"] = max(0,stats["outstanding"] - 1)
+        stats["replies"] += 1
+        stats["rtt"] = rtt if stats["rtt"] is None else stats["rtt"] + self.ALPHA * (rtt - stats["rtt"])
+
+    def lost(self,cls):
+        stats = self.get(cls)
+        stats["outstanding"] = max(0,stats["outstanding"] - 1)
+        stats["lost"] += 1
+
+    def clear(self):
+        self.classes.clear()
+
+
+class BoardStateCache:
+    """Last known value of every (cls, instance, cmd, adr) read from or written to the board.
+
+    Read replies are stored by the comms thread. Writes invalidate their parameter until the board
+    acknowledges them, then the written value is stored. Reads with a max_age are served from here
+    when the stored value is young enough.
+    """
+
+    MAX_AGE = 1000 # ms. Default freshness for cached reads
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {} # key : (ReplyRecord, monotonic time)
+        self.counters = {"hits":0,"misses":0}
+
+    def store(self,record : ReplyRecord):
+        if record.typechar == '?':
+            if record.reply == "NOT_FOUND" or record.reply.startswith("Err"):
+                return
+            with self._lock:
+                self.values[(record.cls,record.instance,record.cmd,record.adr)] = (record,time.monotonic())
+        elif record.typechar == '=': # Written meanwhile. The acknowledgement stores the value
+            self.invalidate((record.cls,record.instance,record.cmd,record.adr))
+
+    def update(self,key,value):
+        cls,instance,cmd,adr = key
+        record = ReplyRecord(cls,instance,cmd,'?',adr,adr,str(value))
+        with self._lock:
+            self.values[key] = (record,time.monotonic())
+
+    def invalidate(self,key):
+        with self._lock:
+            self.values.pop(key,None)
+
+    def lookup(self,key,max_age):
+        """Returns the stored ReplyRecord if it is younger than max_age ms and counts a hit or miss"""
+        with self._lock:
+            cached = self.values.get(key)
+        if cached and (time.monotonic() - cached[1]) * 1000 <= max_age:
+            self.counters["hits"] += 1
+            return cached[0]
+        self.counters["misses"] += 1
+        return None
+
+    def clear(self):
+        with self._lock:
+            self.values.clear()
+
+    def stats(self):
+        return {**self.counters,"entries":len(self.values)}
+
+
+class MetadataCache:
+    """Static replies of a board kept in a file across sessions.
+
+    Info queries (typechar !) and class lists do not change while firmware, hardware and main class
+    stay the same. Replies are stored per board identity built from sys.swver, sys.hwtype and main.id.
+    Once these replies identified a known board its stored replies answer static queries locally.
+    Entries of older firmware versions of the same hardware are dropped.
+    """
+
+    FILENAME = "metadata_cache.json"
+    STATIC_READS = {("sys","lsmain"),("main","lsbtn"),("main","lsain")}
+    IDENTITY = {("sys","swver"):"swver",("sys","hwtype"):"hwtype",("main","id"):"main"}
+
+    def __init__(self,filename=FILENAME):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.boards = {} # identity key : {"swver","hwtype","main","replies":{command:reply}}
+        self.identity = {}
+        self.replies = None # Stored replies of the connected board once identified
+        self.pending = {} # Static replies received before the board was identified
+        self.dirty = False
+        self.removed = set() # Outdated boards to drop from the file
+        self.counters = {"hits":0,"misses":0}
+        self.load()
+
+    @classmethod
+    def isStatic(cls,clsname,cmd,typechar):
+        return typechar == '!' or (typechar == '?' and (clsname,cmd) in cls.STATIC_READS)
+
+    @staticmethod
+    def commandKey(cls,instance,cmd,typechar,adr):
+        return f"{cls}.{instance}.{cmd}{typechar}{'' if adr is None else adr}"
+
+    def load(self):
+        try:
+            with open(self.filename,"r",encoding="utf_8") as file:
+                self.boards = json.load(file)
+        except (OSError,ValueError):
+            self.boards = {}
+
+    def save(self):
+        """Writes the boards to the file, keeping boards other connections added meanwhile"""
+        if not self.dirty:
+            return
+        boards = self.boards
+        self.load()
+        with self._lock:
+            for key in self.removed:
+                self.boards.pop(key,None)
+            self.boards.update(boards)
+            data = json.dumps(self.boards)
+            self.dirty = False
+            self.removed = set()
+        try:
+            with open(self.filename,"w",encoding="utf_8") as file:
+                file.write(data)
+        except OSError:
+            pass
+
+    def store(self,record : ReplyRecord):
+        """Records identity and static replies. Called by the comms thread for every reply"""
+        if record.reply == "NOT_FOUND" or record.reply.startswith("Err"):
+            return
+        field = self.IDENTITY.get((record.cls,record.cmd))
+        with self._lock:
+            if field and record.typechar == '?' and field not in self.identity:
+                self.identity[field] = record.reply.strip()
+                if len(self.identity) == len(self.IDENTITY):
+                    self._activate()
+            elif self.isStatic(record.cls,record.cmd,record.typechar):
+                replies = self.pending if self.replies is None else self.replies
+                key = self.commandKey(record.cls,record.instance,record.cmd,record.typechar,record.adr)
+                if replies.get(key) != record.reply:
+                    replies[key] = record.reply
+                    self.dirty = self.replies is not None
+
+    def _activate(self):
+        swver,hwtype,main = self.identity["swver"],self.identity["hwtype"],self.identity["main"]
+        for key,board in list(self.boards.items()):
+            if board["hwtype"] == hwtype and board["swver"] != swver: # Firmware changed
+                del self.boards[key]
+                self.removed.add(key)
+                self.dirty = True
+        key = f"{swver}|{hwtype}|{main}"
+        board = self.boards.get(key)
+        if board is None:
+            board = {"swver":swver,"hwtype":hwtype,"main":main,"replies":{}}
+            self.boards[key] = board
+        board["replies"].update(self.pending)
+        self.dirty = self.dirty or bool(self.pending)
+        self.pending = {}
+        self.replies = board["replies"]
+
+    def lookup(self,cls,instance,cmd,typechar,adr):
+        """Returns the stored reply of a static query of the identified board or None"""
+        if not self.isStatic(cls,cmd,typechar):
+            return None
+        with self._lock:
+            reply = self.replies.get(self.commandKey(cls,instance,cmd,typechar,adr)) if self.replies is not None else None
+        self.counters["hits" if reply is not None else "misses"] += 1
+        return reply
+
+    def boardIdentity(self):
+        """Returns the identity fields of the connected board or None until all were received"""
+        with self._lock:
+            return dict(self.identity) if len(self.identity) == len(self.IDENTITY) else None
+
+    def disconnect(self):
+        """Saves new replies and forgets the board identity"""
+        self.save()
+        with self._lock:
+            self.identity = {}
+            self.replies = None
+            self.pending = {}
+
+    def stats(self):
+        return {**self.counters,"boards":len(self.boards)}
+
+
+class Capabilities:
+    """Commands the connected firmware supports, learned from its replies.
+
+    NOT_FOUND replies mark a (cls, cmd, typechar) as unsupported until the port is closed.
+    Any other reply marks it as supported.
+    """
+
+    def __init__(self):
+        self.known = {} # (cls, cmd, typechar) : supported
+        self.counters = {"rejected":0} # Requests answered locally as unsupported
+
+    def store(self,record : ReplyRecord):
+        self.known[(record.cls,record.cmd,record.typechar)] = record.reply != "NOT_FOUND"
+
+    def isSupported(self,cls,cmd,typechar='?'):
+        """True or False once the board replied to the command, None if unknown"""
+        return self.known.get((cls,cmd,typechar))
+
+    def unsupported(self):
+        return [key for key,supported in list(self.known.items()) if not supported]
+
+    def capabilityMap(self):
+        """Maps class names to {(cmd, typechar) : supported} for every command seen this session"""
+        capabilities = {}
+        for (cls,cmd,typechar),supported in list(self.known.items()):
+            capabilities.setdefault(cls,{})[(cmd,typechar)] = supported
+        return capabilities
+
+    def clear(self):
+        self.known.clear()
+
+
+class PollSubscription:
+    """A widget's interest in a periodically polled command.
+
+    Subscriptions bound to a widget only poll while it is visible and enabled.
+    The scheduler may stretch the period up to max_period when the link is busy.
+    """
+
+    def __init__(self,scheduler,stream,handler,period,widget=None,entry=None,max_period=None):
+        self.scheduler = scheduler
+        self.stream = stream
+        self.handler = handler
+        self.period = period
+        self.max_period = max(period,max_period if max_period is not None else period * scheduler.MAX_SLOWDOWN)
+        self.widget = widget
+        self.entry = entry # Reply callback owned by this subscription
+        self.paused = False
+
+    def isActive(self):
+        if self.paused:
+            return False
+        if self.widget is None:
+            return True
+        try:
+            return self.widget.isVisible() and self.widget.isEnabled()
+        except RuntimeError: # Widget was deleted without unsubscribing
+            self.cancel()
+            return False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def cancel(self):
+        self.scheduler.unsubscribe(self)
+
+
+class PollScheduler(QObject):
+    """Merges the periodic requests of all widgets into one packed write per tick.
+
+    Identical commands polled by several widgets are sent once at the fastest active period.
+    Due times are aligned to multiples of the period so streams with related periods share ticks.
+    A stream is not requested again while its last request is unanswered. Periods of a command class
+    grow when its round trip time or outstanding depth rises and shrink back once the link is idle.
+    """
+
+    TICK = 25 # ms. Finest polling period
+    ADAPT_INTERVAL = 500 # ms between rate adjustments
+    MAX_SLOWDOWN = 8 # Default max_period as multiple of the requested period
+    RTT_HIGH = 50 # ms. Slow down above this round trip time
+    RTT_LOW = 20 # ms. Speed up again below
+    OUTSTANDING_HIGH = 8 # Slow down if more requests of a class are unanswered
+    LOST_TIMEOUT = 1000 # ms. Minimum time until an unanswered poll counts as lost
+
+    ratesChanged = pyqtSignal(dict) # cmdstring : effective period in ms of every active stream
+
+    def __init__(self,comms):
+        QObject.__init__(self,comms)
+        self.comms = comms
+        self.stats : LinkStats = comms.link_stats
+        self.streams = {}
+        self.slowdown = {} # cls : factor applied to the requested periods
+        self.last_adapt = 0
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+    def subscribe(self,handler,cls,cmd,period,instance=0,callback=None,conversion=None,typechar='?',adr=None,widget=None,silent=False,max_period=None):
+        """Polls cls.instance.cmd every period ms. Replies go to callback if set and to all other matching callbacks.
+
+        Under load the period may be stretched up to max_period, by default MAX_SLOWDOWN times the period.
+        """
+        if typechar == None:
+            typechar = ''
+        key = (cls,instance,cmd,typechar,adr)
+        stream = self.streams.get(key)
+        if stream is None:
+            cmdstring = f"{cls}.{instance}.{cmd}{typechar};" if adr == None else f"{cls}.{instance}.{cmd}{typechar}{adr};"
+            stream = {"key":key,"cls":cls,"cmdstring":cmdstring,"subscriptions":[],"due":0,"sent":None,"period":None}
+            stream["entry"] = self.comms.callbackDict.add(self,cls,cmd,lambda _ : self.replied(stream),instance=instance,adr=adr,typechar=typechar,error=lambda _ : self.replied(stream))
+            self.streams[key] = stream
+        entry = None
+        if callback:
+            entry = self.comms.callbackDict.add(handler,cls,cmd,callback,instance=instance,conversion=conversion,adr=adr,typechar=typechar,silent=silent)
+        subscription = PollSubscription(self,stream,handler,period,widget,entry,max_period)
+        stream["subscriptions"].append(subscription)
+        if not self.timer.isActive():
+            self.timer.start(self.TICK)
+        return subscription
+
+    def unsubscribe(self,subscription : PollSubscription):
+        stream = subscription.stream
+        if subscription in stream["subscriptions"]:
+            stream["subscriptions"].remove(subscription)
+        if subscription.entry:
+            self.comms.callbackDict.remove(subscription.entry)
+        if not stream["subscriptions"] and self.streams.get(stream["key"]) is stream:
+            del self.streams[stream["key"]]
+            self.comms.callbackDict.remove(stream["entry"])
+            if stream["sent"] is not None:
+                self.stats.lost(stream["cls"])
+        if not self.streams:
+            self.timer.stop()
+            self.ratesChanged.emit({})
+
+    def remove_handler(self,handler):
+        for stream in list(self.streams.values()):
+            for subscription in [s for s in stream["subscriptions"] if s.handler is handler]:
+                self.unsubscribe(subscription)
+
+    def clear(self):
+        for stream in list(self.streams.values()):
+            for subscription in list(stream["subscriptions"]):
+                self.unsubscribe(subscription)
+
+    def replied(self,stream):
+        if stream["sent"] is None:
+            return
+        self.stats.replied(stream["cls"],time.monotonic() * 1000 - stream["sent"])
+        stream["sent"] = None
+
+    def adapt(self):
+        """Adjusts the slowdown of every command class from its link statistics"""
+        for cls,stats in self.stats.classes.items():
+            factor = self.slowdown.get(cls,1.0)
+            rtt = stats["rtt"] or 0
+            if rtt > self.RTT_HIGH or stats["outstanding"] > self.OUTSTANDING_HIGH:
+                factor = min(factor * 1.5,self.MAX_SLOWDOWN)
+            elif rtt < self.RTT_LOW and stats["outstanding"] <= 1:
+                factor = max(factor / 1.25,1.0)
+            self.slowdown[cls] = factor
+
+    def rates(self):
+        """Effective period of every active stream"""
+        return {s["cmdstring"].rstrip(";"):s["period"] for s in self.streams.values() if s["period"]}
+
+    def tick(self):
+        if not self.comms.isOpen():
+            return
+        now = time.monotonic() * 1000
+        adapting = now - self.last_adapt >= self.ADAPT_INTERVAL
+        if adapting:
+            self.last_adapt = now
+            self.adapt()
+        due = []
+        for stream in list(self.streams.values()):
+            active = [s for s in list(stream["subscriptions"]) if s.isActive()]
+            cls,_,cmd,typechar,_ = stream["key"]
+            if not active or self.comms.capabilities.isSupported(cls,cmd,typechar) is False:
+                stream["due"] = 0 # Poll immediately once resumed
+                stream["period"] = None
+                continue
+            period = min(s.period for s in active)
+            max_period = max(period,min(s.max_period for s in active))
+            period = int(min(period * self.slowdown.get(stream["cls"],1.0),max_period))
+            stream["period"] = period
+            if stream["sent"] is not None: # Do not pile up requests the board has not answered yet
+                if now - stream["sent"] < max(self.LOST_TIMEOUT,2 * period):
+                    continue
+                self.stats.lost(stream["cls"])
+                stream["sent"] = None
+            if now >= stream["due"]:
+                due.append(stream["cmdstring"])
+                stream["due"] = (now // period + 1) * period
+                stream["sent"] = now
+                self.stats.sent(stream["cls"])
+        if due:
+            self.comms.serialWriteRaw("".join(due),PRIORITY_BACKGROUND)
+        if adapting:
+            self.ratesChanged.emit(self.rates())
+
+
+# Send priorities. Higher lanes are written first when a line is packed
+PRIORITY_CRITICAL = 0 # Stop, reboot and other safety commands. Sent immediately regardless of credits
+PRIORITY_INTERACTIVE = 1 # User edits and reads for the UI
+PRIORITY_BACKGROUND = 2 # Telemetry polls and bulk reads
+PRIORITIES = (PRIORITY_CRITICAL,PRIORITY_INTERACTIVE,PRIORITY_BACKGROUND)
+
+
+class SendWindow:
+    """Credit based flow control for commands sent to the board.
+
+    At most max_in_flight commands are unanswered at a time. Further commands stay queued until a
+    reply arrives or an in-flight command times out. Replies are matched by their echoed command,
+    otherwise they release the oldest command as the firmware answers in order.
+    Each priority has its own queue. Critical commands do not wait for credits but do not overtake
+    queued writes or queued commands of their own class instance.
+    """
+
+    def __init__(self,max_in_flight=16,timeout=1000):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout # ms until an unanswered command releases its credit
+        self.lanes = {priority:deque() for priority in PRIORITIES} # Commands waiting for a credit
+        self.in_flight = deque() # [command key, send time in ms]
+        self.counters = {"queued":0,"in_flight":0,"sent":0,"replied":0,"timed_out":0,"retried":0}
+
+    def queued(self):
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def put(self,data : bytes,priority=PRIORITY_INTERACTIVE):
+        lane = self.lanes[priority]
+        for cmd in re.split(rb"[;\n]",data):
+            cmd = cmd.strip()
+            if cmd:
+                if priority == PRIORITY_CRITICAL:
+                    self.promote(cmd)
+                lane.append(cmd)
+        self.counters["queued"] = self.queued()
+
+    @staticmethod
+    def target(cmd : bytes):
+        """Returns the class and instance a command is sent to"""
+        parts = cmd.split(b".",2)
+        if len(parts) == 3 and parts[1].isdigit():
+            return parts[0],int(parts[1])
+        return parts[0],0
+
+    @staticmethod
+    def isWrite(cmd : bytes):
+        return b"=" in cmd or not (b"?" in cmd or b"!" in cmd)
+
+    def promote(self,cmd : bytes):
+        """Moves the queued writes and commands of the class instance of cmd to the critical lane in the
+        order they would be sent, so the critical command cmd does not overtake them"""
+        target = self.target(cmd)
+        critical = self.lanes[PRIORITY_CRITICAL]
+        for priority in PRIORITIES:
+            lane = self.lanes[priority]
+            if priority == PRIORITY_CRITICAL or not lane:
+                continue
+            keep = deque()
+            for queued in lane:
+                if self.isWrite(queued) or self.target(queued) == target:
+                    critical.append(queued)
+                else:
+                    keep.append(queued)
+            self.lanes[priority] = keep
+
+    def credits(self):
+        return max(0,self.max_in_flight - len(self.in_flight))
+
+    def take(self,max_bytes):
+        """Removes the commands that may be sent now from the queues, highest priority first.
+
+        Returns (priority, command) pairs. Critical commands are always taken.
+        """
+        cmds = []
+        size = 0
+        credits = self.credits()
+        for priority in PRIORITIES:
+            lane = self.lanes[priority]
+            while lane:
+                if priority != PRIORITY_CRITICAL and (credits <= 0 or (cmds and size + len(lane[0]) + 1 > max_bytes)):
+                    break
+                cmd = lane.popleft()
+                size += len(cmd) + 1
+                credits -= 1
+                cmds.append((priority,cmd))
+        self.counters["queued"] = self.queued()
+        return cmds
+
+    def sent(self,cmds):
+        now = time.monotonic() * 1000
+        for _,cmd in cmds:
+            self.in_flight.append([cmd,now])
+        self.counters["sent"] += len(cmds)
+        self.counters["in_flight"] = len(self.in_flight)
+
+    def retry(self,cmds):
+        """Puts back commands the port did not accept"""
+        for priority,cmd in reversed(cmds):
+            self.lanes[priority].appendleft(cmd)
+        self.counters["retried"] += len(cmds)
+        self.counters["queued"] = self.queued()
+
+    def acknowledge(self,key : bytes):
+        """Releases the credit of the command a reply belongs to.
+
+        Returns the send time in ms of the command if the reply matched it by its echoed command.
+        """
+        if not self.in_flight:
+            return None
+        sent = None
+        for item in self.in_flight:
+            if item[0] == key:
+                self.in_flight.remove(item)
+                sent = item[1]
+                break
+        else:
+            self.in_flight.popleft()
+        self.counters["replied"] += 1
+        self.counters["in_flight"] = len(self.in_flight)
+        return sent
+
+    def expire(self):
+        """Releases the credits of commands unanswered for longer than timeout. Returns the count"""
+        deadline = time.monotonic() * 1000 - self.timeout
+        expired = 0
+        while self.in_flight and self.in_flight[0][1] < deadline:
+            self.in_flight.popleft()
+            expired += 1
+        if expired:
+            self.counters["timed_out"] += expired
+            self.counters["in_flight"] = len(self.in_flight)
+        return expired
+
+    def drain(self):
+        """Removes all queued commands regardless of credits, highest priority first"""
+        cmds = [(priority,cmd) for priority in PRIORITIES for cmd in self.lanes[priority]]
+        for lane in self.lanes.values():
+            lane.clear()
+        self.counters["queued"] = 0
+        return cmds
+
+    def clear(self):
+        for lane in self.lanes.values():
+            lane.clear()
+        self.in_flight.clear()
+        self.counters["queued"] = 0
+        self.counters["in_flight"] = 0
+
+
+class LatencyHistogram:
+    """Log-linear histogram of latencies in µs in the style of an HDR histogram.
+
+    Each power of two is split into 2**SUB_BITS buckets, so a value is kept with a relative error
+    below 1/2**SUB_BITS at any magnitude while the memory stays a few dozen buckets.
+    """
+
+    SUB_BITS = 4
+
+    def __init__(self):
+        self.buckets = {} # Bucket index : count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def index(cls,value):
+        shift = max(0,value.bit_length() - cls.SUB_BITS - 1)
+        return (shift << cls.SUB_BITS) + (value >> shift)
+
+    @classmethod
+    def lowest(cls,index):
+        """Smallest value counted in a bucket"""
+        shift = max(0,(index >> cls.SUB_BITS) - 1)
+        return (index - (shift << cls.SUB_BITS)) << shift
+
+    def record(self,value):
+        value = max(0,int(value))
+        index = self.index(value)
+        self.buckets[index] = self.buckets.get(index,0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max,value)
+        self.min = value if self.min is None else min(self.min,value)
+
+    def percentile(self,percent):
+        """Highest value of the bucket containing the given percentile"""
+        if not self.count:
+            return None
+        threshold = self.count * percent / 100
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= threshold:
+                return min(self.max,self.lowest(index + 1) - 1)
+        return self.max
+
+    def summary(self):
+        """Count, mean and percentiles in ms"""
+        def ms(value):
+            return None if value is None else round(value / 1000,3)
+        return {
+            "count":self.count,
+            "min":ms(self.min),
+            "mean":ms(self.total / self.count if self.count else None),
+            "p50":ms(self.percentile(50)),
+            "p90":ms(self.percentile(90)),
+            "p99":ms(self.percentile(99)),
+            "max":ms(self.max if self.count else None),
+        }
+
+    def to_dict(self):
+        return dict(self.summary(),buckets_us={self.lowest(index):count for index,count in sorted(self.buckets.items())})
+
+
+class CommsStats:
+    """Traffic counters and round trip histograms of the worker.
+
+    Byte and frame counters are always kept. Histograms are only filled while enabled because
+    parsing the echoed command of every reply is not free.
+    """
+
+    COMMAND_REGEX = re.compile(rb"(\w+)\.(?:\d+\.)?(\w+)")
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self.counters = {"bytes_in":0,"bytes_out":0,"chunks_in":0,"writes":0,"frames":0,"unmatched":0,"unparsed":0,"discarded":0,"resyncs":0,"streamed":0}
+            self.histograms = {} # "cls.cmd" : LatencyHistogram
+
+    def replied(self,key : bytes,sent):
+        """Records the round trip of a reply to a command sent at sent ms"""
+        match = self.COMMAND_REGEX.match(key)
+        if match is None:
+            return
+        name = (match.group(1) + b"." + match.group(2)).decode()
+        rtt = (time.monotonic() * 1000 - sent) * 1000
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(rtt)
+
+    def snapshot(self,buckets=False):
+        """Copy of the counters and the histogram summaries. Set buckets to include the bucket counts"""
+        with self._lock:
+            return {
+                "uptime":time.monotonic() - self.started,
+                "counters":dict(self.counters),
+                "latency":{name:histogram.to_dict() if buckets else histogram.summary() for name,histogram in sorted(self.histograms.items())},
+            }
+
+
+# Raw serial traffic recording
+TrafficRecord = namedtuple("TrafficRecord",["direction","time_ns","data"])
+TRAFFIC_MAGIC = b"FFBTRACE"
+TRAFFIC_VERSION = 1
+TRAFFIC_HEADER = struct.Struct("<8sBQQ") # Magic, version, wall clock ns and monotonic ns at the start
+TRAFFIC_RECORD = struct.Struct("<BQI") # Direction, ns since the start and length of the data that follows
+
+class TrafficRecorder:
+    """Appends every sent and received chunk with a monotonic ns timestamp to a binary file.
+
+    Writes are buffered and only appended. The file is rotated like a RotatingFileHandler once it
+    exceeds max_bytes, each file starts with its own header. An existing file is rotated on start.
+    """
+
+    SENT = 0
+    RECEIVED = 1
+    MAX_BYTES = 16 * 1024 * 1024
+    BACKUPS = 3
+    BUFFER_SIZE = 64 * 1024
+    FLUSH_INTERVAL = 1_000_000_000 # ns between flushes while data is recorded
+
+    def __init__(self,path,max_bytes=MAX_BYTES,backups=BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.counters = {"records":0,"bytes":0,"files":0}
+        self.file = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.rotate()
+        else:
+            self.start()
+
+    def start(self):
+        self.file = open(self.path,"ab",buffering=self.BUFFER_SIZE)
+        self.base = time.monotonic_ns()
+        self.flushed = self.base
+        self.file.write(TRAFFIC_HEADER.pack(TRAFFIC_MAGIC,TRAFFIC_VERSION,time.time_ns(),self.base))
+        self.counters["files"] += 1
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+        for i in range(self.backups - 1,0,-1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}",f"{self.path}.{i+1}")
+        if self.backups > 0:
+            os.replace(self.path,f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.start()
+
+    def record(self,direction,data):
+        now = time.monotonic_ns()
+        self.file.write(TRAFFIC_RECORD.pack(direction,now - self.base,len(data)))
+        self.file.write(data)
+        self.counters["records"] += 1
+        self.counters["bytes"] += len(data)
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+        elif now - self.flushed >= self.FLUSH_INTERVAL:
+            self.file.flush()
+            self.flushed = now
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def read_traffic(path):
+    """Yields the TrafficRecords of a recording. A record cut off at the end of the file is skipped"""
+    with open(path,"rb") as file:
+        header = file.read(TRAFFIC_HEADER.size)
+        if len(header) < TRAFFIC_HEADER.size or TRAFFIC_HEADER.unpack(header)[0] != TRAFFIC_MAGIC:
+            raise ValueError(f"{path} is not a traffic recording")
+        while True:
+            head = file.read(TRAFFIC_RECORD.size)
+            if len(head) < TRAFFIC_RECORD.size:
+                return
+            direction,time_ns,length = TRAFFIC_RECORD.unpack(head)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            yield TrafficRecord(direction,time_ns,data)
+
+def replay_traffic(path,worker,speed=0):
+    """Feeds the received chunks of a recording through worker.process in recorded order and delivers the replies.
+
+    speed 1 keeps the recorded timing, 2 is twice as fast and 0 as fast as possible.
+    Returns counters and a digest of the unconsumed frames and delivered values. With the same callbacks
+    registered it is the same for every replay unless framing, parsing or dispatch changed.
+    """
+    digest = hashlib.sha1()
+    counters = {"chunks":0,"bytes":0,"sent":0,"frames":0,"delivered":0}
+    start = time.perf_counter()
+    first = None
+    for direction,time_ns,data in read_traffic(path):
+        if direction == TrafficRecorder.SENT:
+            counters["sent"] += len(data)
+            continue
+        if first is None:
+            first = time_ns
+        if speed:
+            delay = (time_ns - first) / 1e9 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        counters["chunks"] += 1
+        counters["bytes"] += len(data)
+        for deliveries,text in worker.process(data):
+            counters["frames"] += 1
+            counters["delivered"] += len(deliveries)
+            digest.update(repr(([value for _,value in deliveries],text)).encode())
+            worker.registry.deliver(deliveries)
+    counters["seconds"] = time.perf_counter() - start
+    counters["digest"] = digest.hexdigest()
+    return counters
+
+
+class SerialWorker(QObject):
+    """Owns the serial port inside the comms thread.
+
+    Reads and frames the incoming stream, parses replies and resolves them against the callback
+    registry. The GUI thread only receives one batch of converted values per received chunk.
+    """
+
+    replies = pyqtSignal(list)
+    streaming = pyqtSignal(str,int)
+    CLOSE_TIMEOUT = 250 # ms to wait for queued commands to be written before the port closes
+
+    def __init__(self,registry : CallbackRegistry,regex,cache : BoardStateCache,metadata : MetadataCache,capabilities : Capabilities):
+        QObject.__init__(self)
+        self.registry = registry
+        self.cache = cache
+        self.metadata = metadata
+        self.capabilities = capabilities
+        self.framer = ReplyFramer(regex,self.streaming.emit)
+        self.window = SendWindow()
+        self.serial = PyQt6.QtSerialPort.QSerialPort(self)
+        self.serial.readyRead.connect(self.receive)
+        self.serial.bytesWritten.connect(self.written)
+        self.serial.aboutToClose.connect(self.reset)
+        # Releases credits of commands that never get a reply
+        self.expiry = QTimer(self)
+        self.expiry.timeout.connect(self.pump)
+        # Mirrors of the port state readable from the GUI thread
+        self.is_open = False
+        self.bytes_to_write = 0
+        self.recorder = None
+        self.stats = CommsStats()
+
+    @pyqtSlot(object,int)
+    def open(self,port,baudrate):
+        if isinstance(port,str):
+            self.serial.setPortName(port)
+        else:
+            self.serial.setPort(port)
+        self.serial.setBaudRate(baudrate)
+        self.serial.open(QIODevice.OpenModeFlag.ReadWrite)
+        if self.serial.isOpen():
+            self.serial.setDataTerminalReady(True)
+        self.is_open = self.serial.isOpen()
+
+    @pyqtSlot()
+    def close(self):
+        """Writes all queued commands and waits up to CLOSE_TIMEOUT ms until the port sent them, then closes it"""
+        if self.serial.isOpen():
+            cmds = self.window.drain()
+            if cmds:
+                self.send(cmds)
+            deadline = time.monotonic() + self.CLOSE_TIMEOUT / 1000
+            while self.serial.bytesToWrite() > 0:
+                remaining = int((deadline - time.monotonic()) * 1000)
+                if remaining <= 0 or not self.serial.waitForBytesWritten(remaining):
+                    break
+        self.serial.close()
+        self.window.clear()
+        self.expiry.stop()
+        self.is_open = False
+        self.bytes_to_write = 0
+
+    @pyqtSlot()
+    def flush(self):
+        self.serial.flush()
+
+    @pyqtSlot()
+    def reset(self):
+        self.framer.clear()
+
+    @pyqtSlot(str,int,int)
+    def record(self,path,max_bytes,backups):
+        """Starts recording the traffic to path or stops if path is empty"""
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if path:
+            try:
+                self.recorder = TrafficRecorder(path,max_bytes,backups)
+            except OSError as e:
+                logging.getLogger("serial_comms").warning("Can not record to %s: %s",path,e)
+
+    @pyqtSlot(int,int)
+    def configure(self,max_in_flight,timeout):
+        if max_in_flight > 0:
+            self.window.max_in_flight = max_in_flight
+        if timeout > 0:
+            self.window.timeout = timeout
+        self.pump()
+
+    @pyqtSlot(bytes,int)
+    def write(self,data,priority):
+        self.window.put(data,priority)
+        self.pump()
+
+    @pyqtSlot()
+    def pump(self):
+        """Writes queued commands while credits are left and the port buffer is not full"""
+        self.window.expire()
+        while self.serial.isOpen():
+            room = SerialComms.MAX_REQUEST_SIZE - self.serial.bytesToWrite()
+            if room <= 0 and not self.window.lanes[PRIORITY_CRITICAL]:
+                break
+            cmds = self.window.take(room)
+            if not cmds:
+                break
+            # if commands can't be send, we keep them for a retry when the port has written some data
+            if not self.send(cmds):
+                self.window.retry(cmds)
+                break
+        self.bytes_to_write = self.serial.bytesToWrite()
+        if self.window.in_flight and not self.expiry.isActive():
+            self.expiry.start(100)
+        elif not self.window.in_flight:
+            self.expiry.stop()
+
+    def send(self,cmds):
+        """Writes (priority, command) pairs taken from the send window. Returns false if the port refused them"""
+        data = b"".join(cmd + b";" for _,cmd in cmds)
+        if self.serial.write(data) == -1:
+            return False
+        if self.recorder is not None:
+            self.recorder.record(TrafficRecorder.SENT,data)
+        self.stats.counters["bytes_out"] += len(data)
+        self.stats.counters["writes"] += 1
+        self.window.sent(cmds)
+        return True
+
+    @pyqtSlot('qint64')
+    def written(self,count):
+        self.pump()
+
+    @pyqtSlot()
+    def receive(self):
+        data = self.serial.readAll().data()
+        if self.recorder is not None:
+            self.recorder.record(TrafficRecorder.RECEIVED,data)
+        batch = self.process(data)
+        self.pump()
+        if batch:
+            self.replies.emit(batch)
+
+    def process(self,data):
+        """Frames and dispatches received bytes. Returns the batch of deliveries for the GUI thread"""
+        batch = []
+        counters = self.stats.counters
+        counters["bytes_in"] += len(data)
+        counters["chunks_in"] += 1
+        try:
+            for record,text in self.framer.feed(data):
+                counters["frames"] += 1
+                if "|" in text:
+                    key = text.split("|",1)[0].encode()
+                    sent = self.window.acknowledge(key)
+                    if sent is not None and self.stats.enabled:
+                        self.stats.replied(key,sent)
+                if record is None:
+                    counters["unparsed"] += 1
+                    counters["unmatched"] += 1
+                    batch.append(([],text))
+                    continue
+                self.cache.store(record)
+                self.metadata.store(record)
+                self.capabilities.store(record)
+                deliveries,consumed = self.registry.dispatch(record)
+                if not deliveries:
+                    counters["unmatched"] += 1
+                batch.append((deliveries,None if consumed else text))
+        except Exception as e:
+            print("Can not process:",e)
+            traceback.print_exception(*sys.exc_info())
+        framer = self.framer
+        for name in ("discarded","resyncs","streamed"):
+            counters[name] += getattr(framer,name)
+            setattr(framer,name,0)
+        return batch
+
+
 class SerialComms(QObject):
     MAX_REQUEST_SIZE = 1024
     MAX_DELAY_SEND_CMD = 30
+    REQUEST_TIMEOUT = 3000 # Default ms until a request() fails
+    SWEEP_INTERVAL = 100 # ms between expiries of unanswered one-shot callbacks. Request timeouts fire this late at most
 
     cmdRegex = re.compile(r"\[(\w+)\.(?:(\d+)\.)?(\w+)([?!=]?)(?:(\d+))?(?:\?(\d+))?\|(.+)\]",re.DOTALL)
-    callbackDict = {}
     rawReply = pyqtSignal(str)
-    send_buffer = []
+    replyProgress = pyqtSignal(str,int) # "cls.cmd" and bytes received so far of a long streamed reply
+
+    # Requests to the worker. Opening and closing block until the worker is done
+    _openPort = pyqtSignal(object,int)
+    _closePort = pyqtSignal()
+    _flushPort = pyqtSignal()
+    _resetPort = pyqtSignal()
+    _writePort = pyqtSignal(bytes,int)
+    _configureWindow = pyqtSignal(int,int)
+    _recordTraffic = pyqtSignal(str,int,int)
 
-    def __init__(self,main,serialport : PyQt6.QtSerialPort.QSerialPort):
+    def __init__(self,main=None):
+        """Each instance drives one board with its own thread, send queues, callbacks and statistics"""
         QObject.__init__(self)
-        self.serial : PyQt6.QtSerialPort.QSerialPort = serialport 
         self.main=main
-        self.serial.readyRead.connect(self.serialReceive)
-        self.serial.aboutToClose.connect(self.reset)
-        self.replytext = ""
         self.logger = logging.getLogger("serial_comms")
+        self.callbackDict = CallbackRegistry()
+        self.send_buffer = {priority:[] for priority in PRIORITIES} # Raw commands and pending writes per priority
+        self.pending_writes = {} # (cls,instance,cmd,adr) : unsent write in send_buffer
+        self.write_counters = {"writes":0,"coalesced":0}
 
-    @staticmethod
-    def registerCallback(handler,cls,cmd,callback,instance=0,conversion=None,adr=None,delete=False,typechar='?'):
-        if cls not in SerialComms.callbackDict:
-            SerialComms.callbackDict[cls] = []
+        self.thread = QThread()
+        self.thread.setObjectName("serial_comms")
+        self.state_cache = BoardStateCache()
+        self.cached_replies = [] # Cache hits replayed like board replies on the next event loop pass
+        self.metadata = MetadataCache()
+        self.capabilities = Capabilities()
+        self.worker = SerialWorker(self.callbackDict,self.cmdRegex,self.state_cache,self.metadata,self.capabilities)
+        self.worker.moveToThread(self.thread)
+        self.worker.replies.connect(self.deliverReplies)
+        self.worker.streaming.connect(self.replyProgress)
+        self._openPort.connect(self.worker.open,Qt.ConnectionType.BlockingQueuedConnection)
+        self._closePort.connect(self.worker.close,Qt.ConnectionType.BlockingQueuedConnection)
+        self._flushPort.connect(self.worker.flush)
+        self._resetPort.connect(self.worker.reset)
+        self._writePort.connect(self.worker.write)
+        self._configureWindow.connect(self.worker.configure)
+        self._recordTraffic.connect(self.worker.record,Qt.ConnectionType.BlockingQueuedConnection)
+        self.thread.start()
+        self.link_stats = LinkStats()
+        self.poller = PollScheduler(self)
+        # Drops one-shot callbacks whose reply never came
+        self.sweeper = QTimer(self)
+        self.sweeper.timeout.connect(self.expireCallbacks)
+        self.sweeper.start(self.SWEEP_INTERVAL)
+        if QApplication.instance():
+            QApplication.instance().aboutToQuit.connect(self.shutdown)
 
-        callbackObj = {"handler":handler,"callback":callback,"convert":conversion,"instance":instance,"class":cls,"cmd":cmd,"address":adr,"delete":delete,"typechar":typechar}
-        if callbackObj not in SerialComms.callbackDict[cls]:
-            SerialComms.callbackDict[cls].append(callbackObj)
-    @staticmethod
-    def removeCallbacks(handler):
-        for cls,item in (SerialComms.callbackDict.items()):
-            SerialComms.callbackDict[cls] = [ entry for entry in item if entry["handler"] != handler]
+    def shutdown(self):
+        """Closes the port and stops the comms thread"""
+        if self.thread.isRunning():
+            self._closePort.emit()
+            self.stopRecording()
+            self.thread.quit()
+            self.thread.wait()
+        self.metadata.save()
+
+    def open(self,port,baudrate=115200):
+        """Opens a port given as QSerialPortInfo or port name. Returns true if successful"""
+        self._openPort.emit(port,baudrate)
+        return self.isOpen()
+
+    def close(self):
+        """Sends the commands not written yet and closes the port"""
+        if self.thread.isRunning(): # Blocking call would never return after shutdown
+            self.sendBuffered()
+            self._closePort.emit()
+        self.link_stats.clear()
+        self.state_cache.clear()
+        self.metadata.disconnect()
+        self.capabilities.clear()
+        self.expireCallbacks(math.inf) # Pending replies are lost with the port, their requests fail
+
+    def isOpen(self):
+        return self.worker.is_open
+
+    def boardIdentity(self):
+        """Firmware version, hardware type and main class id of the connected board or None if not read yet"""
+        return self.metadata.boardIdentity()
+
+    def bytesToWrite(self):
+        return self.worker.bytes_to_write
+
+    def flush(self):
+        self._flushPort.emit()
+
+    def setSendWindow(self,max_in_flight=0,timeout=0):
+        """Sets the maximum of unanswered commands and the ms until one times out. 0 keeps the current value"""
+        self._configureWindow.emit(max_in_flight,timeout)
+
+    def sendCounters(self):
+        """Queued, in-flight, sent, replied, timed out and retried command counts of the send window
+        and the number of value writes and of writes replaced by a newer value before sending"""
+        return {**self.worker.window.counters,**self.write_counters}
+
+    def isIdle(self):
+        """True if no command waits to be sent or for its reply"""
+        counters = self.worker.window.counters
+        return counters["queued"] == 0 and counters["in_flight"] == 0 and not any(self.send_buffer.values())
+
+    def startRecording(self,path,max_bytes=TrafficRecorder.MAX_BYTES,backups=TrafficRecorder.BACKUPS):
+        """Records all sent and received bytes to path until stopRecording. Returns true if the file could be opened"""
+        self._recordTraffic.emit(path,max_bytes,backups)
+        return self.worker.recorder is not None
+
+    def stopRecording(self):
+        if self.thread.isRunning():
+            self._recordTraffic.emit("",0,0)
+
+    def setStatsEnabled(self,enabled):
+        """Turns the round trip histograms on or off. Counters are always kept"""
+        self.worker.stats.enabled = enabled
+
+    def statistics(self,buckets=False):
+        """Traffic counters, round trip histograms per cls.cmd in ms and queue depths"""
+        stats = self.worker.stats.snapshot(buckets)
+        stats["queues"] = {
+            "unsent":sum(len(entries) for entries in self.send_buffer.values()), # Waiting for the send throttle
+            "pending_writes":len(self.pending_writes),
+            "callbacks":len(self.callbackDict),
+            **{name:self.worker.window.counters[name] for name in ("queued","in_flight")},
+        }
+        stats["send"] = self.sendCounters()
+        return stats
+
+    def resetStatistics(self):
+        self.worker.stats.clear()
+
+    def registerCallback(self,handler,cls,cmd,callback,instance=0,conversion=None,adr=None,delete=False,typechar='?',error=None):
+        self.callbackDict.add(handler,cls,cmd,callback,instance=instance,conversion=conversion,adr=adr,delete=delete,typechar=typechar,error=error)
+
+    def removeCallbacks(self,handler):
+        self.callbackDict.remove_handler(handler)
 
     def removeAllCallbacks(self):
-        SerialComms.callbackDict.clear()
+        self.callbackDict.clear()
 
-    def getValueAsync(self,handler,cls,cmd,callback,instance=0,conversion=None,adr=None,typechar='?',delete=True):
+    def getValueAsync(self,handler,cls,cmd,callback,instance=0,conversion=None,adr=None,typechar='?',delete=True,priority=PRIORITY_INTERACTIVE,max_age=None,timeout=None,on_timeout=None):
         if typechar == None:
             typechar = ''
-        SerialComms.registerCallback(handler=handler,cls=cls,cmd=cmd,callback=callback,instance=instance,conversion=conversion,adr=adr,delete=delete,typechar=typechar)
+        self.callbackDict.add(handler,cls,cmd,callback,instance=instance,conversion=conversion,adr=adr,delete=delete,typechar=typechar,timeout=timeout,on_timeout=on_timeout)
+        if self.readCached(cls,cmd,instance,typechar,adr,max_age):
+            return
         if adr == None:
-            self.serialWriteRaw(f"{cls}.{instance}.{cmd}{typechar};")
+            self.serialWriteRaw(f"{cls}.{instance}.{cmd}{typechar};",priority)
+        else:
+            self.serialWriteRaw(f"{cls}.{instance}.{cmd}{typechar}{adr};",priority)
+
+    def request(self,cls,cmd,instance=0,typechar='?',adr=None,conversion=None,timeout=None,handler=None,priority=PRIORITY_INTERACTIVE,max_age=None,val=None):
+        """Requests a value and returns a concurrent.futures.Future for the reply.
+
+        If val is given the value is written instead and the future resolves with the acknowledgement.
+        The future fails with CommandNotFoundError, CommandError for "Err" replies or
+        CommandTimeoutError after timeout ms, never with a timeout of 0, and when the port is closed.
+        Cancelling it drops the pending callback, removing the callbacks of handler cancels it.
+        """
+        if val is not None:
+            typechar = '='
+        if typechar == None:
+            typechar = ''
+        if timeout is None:
+            timeout = self.REQUEST_TIMEOUT
+        future = concurrent.futures.Future()
+        sent = None # Send time unless served from the state cache
+
+        def replied():
+            if sent is not None:
+                self.link_stats.replied(cls,(time.monotonic() - sent) * 1000)
+
+        def reply_cb(reply):
+            if future.done():
+                return
+            replied()
+            if reply.startswith("Err"):
+                future.set_exception(CommandError(f"{cls}.{instance}.{cmd}{typechar}: {reply}"))
+                return
+            if val is not None:
+                self.state_cache.update((cls,instance,cmd,adr),val)
+            try:
+                future.set_result(conversion(reply) if conversion else reply)
+            except Exception as e:
+                future.set_exception(e)
+
+        def error_cb(error):
+            if not future.done():
+                replied()
+                future.set_exception(error)
+
+        def timeout_cb(error):
+            if not future.done():
+                if sent is not None:
+                    self.link_stats.lost(cls)
+                future.set_exception(error)
+
+        # The registry expires the entry after timeout and on close and fails the future
+        entry = self.callbackDict.add(handler if handler is not None else self,cls,cmd,reply_cb,instance=instance,adr=adr,delete=True,typechar=typechar,error=error_cb,
+                                      timeout=timeout or math.inf,on_timeout=timeout_cb)
+        entry["future"] = future # Cancelled when the handler's callbacks are removed
+        def done_cb(future):
+            self.callbackDict.remove(entry)
+            if future.cancelled() and sent is not None:
+                self.link_stats.lost(cls)
+
+        future.add_done_callback(done_cb)
+        if self.readCached(cls,cmd,instance,typechar,adr,max_age):
+            return future
+        sent = time.monotonic()
+        self.link_stats.sent(cls)
+        if val is not None:
+            self.state_cache.invalidate((cls,instance,cmd,adr))
+            self.serialWriteRaw(self.valueCmdString(cls,cmd,val,adr,instance),priority)
+        elif adr == None:
+            self.serialWriteRaw(f"{cls}.{instance}.{cmd}{typechar};",priority)
+        else:
+            self.serialWriteRaw(f"{cls}.{instance}.{cmd}{typechar}{adr};",priority)
+        return future
+
+    async def query(self,cls,cmd,instance=0,typechar='?',adr=None,conversion=None,timeout=None):
+        """Awaitable version of request() for use on an asyncio loop running in the GUI thread"""
+        import asyncio # Only needed by callers already running a loop. Keeps it out of the startup
+        future = self.request(cls,cmd,instance=instance,typechar=typechar,adr=adr,conversion=conversion,timeout=timeout)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            future.cancel()
+
+    async def query_many(self,requests,return_exceptions=False):
+        """Pipelines several queries and awaits them all.
+
+        Each request is a tuple of query() arguments or a dict of its keyword arguments.
+        """
+        import asyncio
+        return await asyncio.gather(*[self.query(**r) if isinstance(r,dict) else self.query(*r) for r in requests],return_exceptions=return_exceptions)
+
+    def readCached(self,cls,cmd,instance=0,typechar='?',adr=None,max_age=None):
+        """Serves static queries from the metadata cache and reads from the state cache if max_age
+        is set and the value is fresh enough.
+
+        Commands the board reported as unsupported are answered with NOT_FOUND.
+        The cached reply is delivered to the callbacks like a board reply. Returns true on a hit.
+        """
+        reply = None
+        if self.capabilities.isSupported(cls,cmd,typechar) is False:
+            self.capabilities.counters["rejected"] += 1
+            reply = "NOT_FOUND"
         else:
-            self.serialWriteRaw(f"{cls}.{instance}.{cmd}{typechar}{adr};")
+            reply = self.metadata.lookup(cls,instance,cmd,typechar,adr)
+        if reply is not None:
+            record = ReplyRecord(cls,instance,cmd,typechar,None,adr,reply)
+        elif max_age is None or typechar != '?':
+            return False
+        else:
+            record = self.state_cache.lookup((cls,instance,cmd,adr),max_age)
+        if record is None:
+            return False
+        if not self.cached_replies:
+            QTimer.singleShot(0,self.replayCached)
+        self.cached_replies.append(record)
+        return True
+
+    def replayCached(self):
+        records = self.cached_replies
+        self.cached_replies = []
+        for record in records:
+            self.processReply(record)
 
-    def sendCommand(self,cls,cmd,instance=0,typechar='?',adr=None):
+    def sendCommands(self,cls,cmds,instance=0,typechar='?',adr=None,priority=PRIORITY_INTERACTIVE,max_age=None):
+        """Sends several commands of one class in one line. Fresh cached reads are not sent"""
+        cmdstring = ""
+        for cmd in cmds:
+            if self.readCached(cls,cmd,instance,typechar,adr,max_age):
+                continue
+            if adr != None:
+                cmdstring += f"{cls}.{instance}.{cmd}{typechar}{adr};"
+            else:
+                cmdstring += f"{cls}.{instance}.{cmd}{typechar};"
+        if cmdstring:
+            self.serialWriteRaw(cmdstring,priority)
+
+    def sendCommand(self,cls,cmd,instance=0,typechar='?',adr=None,priority=PRIORITY_INTERACTIVE):
+        if self.readCached(cls,cmd,instance,typechar,adr):
+            return
         if(adr):
             cmdstring = f"{cls}.{instance}.{cmd}{typechar}{adr};"
         else:
             cmdstring = f"{cls}.{instance}.{cmd}{typechar};"
-        self.serialWriteRaw(cmdstring)
+        self.serialWriteRaw(cmdstring,priority)
 
-    def sendValue(self,handler,cls,cmd,val,adr=None,instance=0):
+    def sendValue(self,handler,cls,cmd,val,adr=None,instance=0,priority=PRIORITY_INTERACTIVE):
+        """Writes a value. A write to the same parameter that was not sent yet is replaced by the newer value"""
+        self.write_counters["writes"] += 1
+        if self.readCached(cls,cmd,instance,'=',adr): # Not supported by the board
+            return
+        key = (cls,instance,cmd,adr)
+        self.state_cache.invalidate(key)
+        if priority == PRIORITY_CRITICAL:
+            replaced = self.pending_writes.pop(key,None) # Not sent yet and outdated by this value
+            if replaced is not None:
+                self.send_buffer[replaced["priority"]].remove(replaced)
+            self.registerCallback(handler=handler,cls=cls,cmd=cmd,callback=self.checkOk,instance=instance,adr=adr,delete=True,typechar='=')
+            self.serialWriteRaw(self.valueCmdString(cls,cmd,val,adr,instance),priority)
+            return
+        write = self.pending_writes.get(key)
+        if write is not None and write["priority"] == priority:
+            write["val"] = val
+            write["handler"] = handler
+            self.write_counters["coalesced"] += 1
+        else:
+            write = {"key":key,"handler":handler,"val":val,"priority":priority}
+            self.pending_writes[key] = write
+            self.send_buffer[priority].append(write)
+        self._send_over_uart()
+
+    @staticmethod
+    def valueCmdString(cls,cmd,val,adr=None,instance=0):
         cmdstring  = f"{cls}.{instance}.{cmd}={val}"
         if adr != None:
             cmdstring+="?"+str(adr)
-        cmdstring += ";"
-        SerialComms.registerCallback(handler=handler,cls=cls,cmd=cmd,callback=self.checkOk,instance=instance,adr=adr,delete=True,typechar='=')
-        self.serialWriteRaw(cmdstring)
+        return cmdstring + ";"
+
+    def takeWrite(self,write):
+        """Returns the command of a pending write and registers its acknowledgement callback"""
+        cls,instance,cmd,adr = write["key"]
+        if self.pending_writes.get(write["key"]) is write:
+            del self.pending_writes[write["key"]]
+        self.registerCallback(handler=write["handler"],cls=cls,cmd=cmd,callback=lambda reply : self.writeAcknowledged(write,reply),instance=instance,adr=adr,delete=True,typechar='=')
+        return self.valueCmdString(cls,cmd,write["val"],adr,instance)
+
+    def writeAcknowledged(self,write,reply):
+        if write["key"] not in self.pending_writes: # A newer value is not sent yet
+            if reply.find("Err") == -1:
+                self.state_cache.update(write["key"],write["val"])
+            else:
+                self.state_cache.invalidate(write["key"])
+        self.checkOk(reply)
 
     def reset(self):
-        self.replytext = ""
+        self._resetPort.emit()
+
+    def expireCallbacks(self,now=None):
+        """Removes one-shot callbacks past their deadline, all if now is math.inf, and calls their timeout handlers"""
+        reason = "port closed" if now == math.inf else "no reply"
+        for callbackObj in self.callbackDict.expire(now):
+            if callbackObj["on_timeout"]:
+                try:
+                    callbackObj["on_timeout"](CommandTimeoutError(f"{callbackObj['class']}.{callbackObj['instance']}.{callbackObj['cmd']}{callbackObj['typechar']}: {reason}"))
+                except Exception as e:
+                    print("Timeout handler failed:",e)
 
     def checkOk(self,reply):
         if(reply == "OK" or reply.find("Err") == -1):
             return
-        else:
+        elif self.main:
             self.main.log(reply)
+        else:
+            self.logger.warning(reply)
 
-    def pack_cmd(self,cmd):
+    def pack_cmd(self,send_buffer,cmd):
         # if buffer is empty, add the line
-        if len(self.send_buffer) == 0 :
-            self.send_buffer.append(cmd)
+        if len(send_buffer) == 0 :
+            send_buffer.append(cmd)
             self.logger.debug("First command added")
         else :
         # if buffer is not empty, take the last line, append the new line
-            last_line = self.send_buffer.pop()
+            last_line = send_buffer.pop()
             last_line += cmd
             if len(last_line) < SerialComms.MAX_REQUEST_SIZE :
-                self.send_buffer.append(last_line)
+                send_buffer.append(last_line)
                 self.logger.debug("New command packed (size %d)", len(last_line))
             else:
                 # if the last buffer + cmd is over 1024, we split all the commands and make 1024 max size new_line
@@ -106,102 +1869,55 @@ class SerialComms(QObject):
                     if (len(new_line) + len(line) +1) < SerialComms.MAX_REQUEST_SIZE :
                         new_line += line + ";"
                     else:
-                        self.send_buffer.append(new_line)
+                        send_buffer.append(new_line)
                         new_line = line
-                self.send_buffer.append(new_line)
-                self.logger.debug("New command packed with new line (size %d/line %d)", len(self.send_buffer) ,len(new_line))
+                send_buffer.append(new_line)
+                self.logger.debug("New command packed with new line (size %d/line %d)", len(send_buffer) ,len(new_line))
 
-    def serialWriteRaw(self,cmdraw):
-        self.pack_cmd(cmdraw)
+    def serialWriteRaw(self,cmdraw,priority=PRIORITY_INTERACTIVE):
+        if priority == PRIORITY_CRITICAL and self.isOpen():
+            # critical commands skip the throttle. Commands buffered before are handed over first to keep their order
+            self.sendBuffered()
+            self._writePort.emit(bytes(cmdraw,"utf-8"),priority)
+            return
+        self.send_buffer[priority].append(cmdraw)
         self._send_over_uart()
     
     @throttle(MAX_DELAY_SEND_CMD)
     def _send_over_uart(self):
-        # exit if serial is not opened
-        if not self.serial.isOpen() : return
-
-        ## send buffer commands to the board if the port is opened
-        cmd_not_sent = []
-        self.logger.debug(F"Send %d lines to uart, commm is %d", len(self.send_buffer), self.serial.isOpen())
-        for cmdraw in self.send_buffer:
-            if self.serial.isOpen():
-                # if command can't be send, we reput them in the buffer for a retry
-                if self.serial.write(bytes(cmdraw,"utf-8")) == -1:
-                    cmd_not_sent.append(cmdraw)
-            else:
-                cmd_not_sent.append(cmdraw)
-        self.send_buffer = cmd_not_sent
+        self.sendBuffered()
 
+    def sendBuffered(self):
+        # exit if serial is not opened. Commands stay buffered until it is
+        if not self.isOpen() : return
 
-    def serialReceive(self):
-        data = self.serial.readAll()
-        try:
-            newReply = data.data().decode("utf-8")
-            self.replytext += newReply # Buffer replies until newline found at end of buffer
-        except Exception as e:
-            print(f"Can not decode:\n{data}. Exception: {e}")
-        try:
-        
-            while self.replytext:
-                firstEndmarker = self.replytext.find("]")
-                firstStartmarker = self.replytext.find("[")
-                if(firstStartmarker >= 0 and firstEndmarker > 1 and firstStartmarker < firstEndmarker):
-                    match = self.cmdRegex.search(self.replytext,firstStartmarker,firstEndmarker+1)
-                    if (match):
-                        curRepl = self.replytext[firstStartmarker+1:firstEndmarker]
-                        self.replytext = self.replytext[match.end()::] # cut out everything before the end of the match
-                        if self.processMatchedReply(match):
-                            pass
-                        else:
-                            self.rawReply.emit(curRepl)
-                        
-                    else:
-                        self.rawReply.emit(self.replytext[firstStartmarker+1:firstEndmarker])
-                        self.replytext = self.replytext[firstEndmarker+1::]
-                else:
-                    break
-        except Exception as e:
-            print("Can not process:",e)
-            traceback.print_exception(*sys.exc_info())
-        
+        ## hand buffered commands to the worker which writes them to the board, highest priority first
+        for priority in PRIORITIES:
+            lines = []
+            for entry in self.send_buffer[priority]:
+                self.pack_cmd(lines,entry if isinstance(entry,str) else self.takeWrite(entry))
+            self.send_buffer[priority].clear()
+            if lines:
+                self.logger.debug(F"Send %d lines of priority %d to uart", len(lines), priority)
+            for cmdraw in lines:
+                self._writePort.emit(bytes(cmdraw,"utf-8"),priority)
 
+    def deliverReplies(self,batch):
+        """Calls the callbacks for a batch of replies dispatched by the worker"""
+        for deliveries,text in batch:
+            try:
+                self.callbackDict.deliver(deliveries)
+            except Exception as e:
+                print("Can not process:",e)
+                traceback.print_exception(*sys.exc_info())
+            if text is not None:
+                self.rawReply.emit(text)
 
     def processMatchedReply(self,match):
-        groups = match.groups()
-        #print(groups)
-        cls = groups[GRP_CLS]
-        instance = int(groups[GRP_INSTANCE]) if groups[GRP_INSTANCE] else 0
-        reply = str(groups[GRP_REPLY])
-        typechar = groups[GRP_TYPE] if groups[GRP_TYPE] else ''
-        cmd = groups[GRP_CMD]
-        deleted = False
-        adr = int(groups[GRP_CMDVAL2]) if groups[GRP_CMDVAL2] != None else int(groups[GRP_CMDVAL1]) if groups[GRP_CMDVAL1] != None and typechar == '?' else None  
-        val = int(groups[GRP_CMDVAL1]) if groups[GRP_CMDVAL1] != None  else None
-    
-        if cls in SerialComms.callbackDict:
-            for callbackObject in SerialComms.callbackDict[cls]:
-                if callbackObject["cmd"] != cmd:
-                    continue
-                if (instance != callbackObject["instance"]) and (callbackObject["instance"] != 0xff):
-                    #print("ignoring",callbackObject,instance)
-                    continue
-                if typechar != callbackObject["typechar"] and callbackObject["typechar"] != None:
-                    #print("Ignoring",typechar,callbackObject["typechar"])
-                    continue
-
-                if adr != None and adr != callbackObject["address"]:
-                    #print("Ignoring address",callbackObject,adr)
-                    continue
+        return self.processReply(parse_reply(match))
 
-                if reply == "NOT_FOUND":
-                    #print(f"Cmd {cmd} not found. check syntax")
-                    continue
-                if(callbackObject["convert"]):
-                    reply = callbackObject["convert"](reply)
-                callbackObject["callback"](reply) 
-                if callbackObject["delete"]: # delete if flag is set
-                    #print("Deleting",callbackObject)
-                    SerialComms.callbackDict[cls].remove(callbackObject)
-                    deleted = True
-          
-        return deleted
+    def processReply(self,record : ReplyRecord):
+        """Calls all callbacks matching a parsed reply immediately. Returns true if a one-shot callback was consumed"""
+        deliveries,consumed = self.callbackDict.dispatch(record)
+        self.callbackDict.deliver(deliveries)
+        return consumed
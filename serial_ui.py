@@ -24,17 +24,16 @@ class SerialChooser(base_ui.WidgetUI, base_ui.CommunicationHandler):
     *) Manage the serial port status
     """
 
-    OFFICIAL_VID_PID = [(0x1209, 0xFFB0)]  # Highlighted in serial selector
+    OFFICIAL_VID_PID = helper.OFFICIAL_VID_PID  # Highlighted in serial selector
     connected = PyQt6.QtCore.pyqtSignal(bool)
     shown = PyQt6.QtCore.pyqtSignal()
     hidden = PyQt6.QtCore.pyqtSignal()
     visible = PyQt6.QtCore.pyqtSignal(bool)
 
-    def __init__(self, serial: PyQt6.QtSerialPort.QSerialPort, main_ui: main.MainUi):
-        """Initialize the manager with the QSerialPort for serial commmunication and the mainUi."""
+    def __init__(self, main_ui: main.MainUi):
+        """Initialize the manager with the mainUi. The port itself is owned by the comms thread."""
         base_ui.WidgetUI.__init__(self, main_ui, "serialchooser.ui")
         base_ui.CommunicationHandler.__init__(self)
-        self._serial = serial
         self.main = main_ui
         self.main_id = None
         self._classes = []
@@ -82,17 +81,13 @@ class SerialChooser(base_ui.WidgetUI, base_ui.CommunicationHandler):
         self.serial_log(">" + cmd)
         self.serial_write_raw(cmd)
 
-    def write(self, data):
-        """Write data to the serial port."""
-        self._serial.write(data)
-
     def update(self):
         """Update the UI when a connection is successfull.
 
         Disable connection button, dropbox, etc.
         Emit for all the UI the [connected] event.
         """
-        if self._serial.isOpen():
+        if self.comms.isOpen():
             self.pushButton_connect.setText("Disconnect")
             self.comboBox_port.setEnabled(False)
             self.pushButton_refresh.setEnabled(False)
@@ -111,10 +106,10 @@ class SerialChooser(base_ui.WidgetUI, base_ui.CommunicationHandler):
 
     def serial_connect_button(self):
         """Check if it's not connected, and call start the serial connection."""
-        if not self._serial.isOpen() and self._port is not None:
+        if not self.comms.isOpen() and self._port is not None:
             self.serial_connect()
         else:
-            self._serial.close()
+            self.comms.close()
 
         self.update()
 
@@ -122,15 +117,10 @@ class SerialChooser(base_ui.WidgetUI, base_ui.CommunicationHandler):
         """Check if port is not open and open it with right settings."""
         self.select_port(self.comboBox_port.currentIndex())
 
-        if not self._serial.isOpen() and self._port is not None:
+        if not self.comms.isOpen() and self._port is not None:
             self.main.log("Connecting...")
-            self._serial.setPort(self._port)
-            self._serial.setBaudRate(115200)
-            self._serial.open(PyQt6.QtCore.QIODevice.OpenModeFlag.ReadWrite)
-            if not self._serial.isOpen():
+            if not self.comms.open(self._port, 115200):
                 self.main.log("Can not open port")
-            else:
-                self._serial.setDataTerminalReady(True)
 
     def select_port(self, port_id):
         """Change the selected port."""
@@ -20,18 +20,12 @@ class SimplemotionUI(WidgetUI,CommunicationHandler):
         self.register_callback("sm2","uarterr",self.uartErrCb,self.prefix,int)
         self.pushButton_restart.clicked.connect(self.restart)
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.updateTimer)
+        self.poll_commands("sm2",["state","crcerr","voltage","uarterr","torque"],1000,self.prefix)
         self.init_ui()
         
     # Tab is currently shown
     def showEvent(self,event):
         self.init_ui()
-        self.timer.start(1000)
-
-    # Tab is hidden
-    def hideEvent(self,event):
-        self.timer.stop()
 
     def init_ui(self):
         commands = ["state","voltage","torque"]
@@ -73,8 +67,3 @@ class SimplemotionUI(WidgetUI,CommunicationHandler):
         if self.uarterr:
             text+=f"UART: {self.uarterr} "
         self.label_comm_errors.setText(text)
-
-
-    def updateTimer(self):
-        commands = ["state","crcerr","voltage","uarterr","torque"]
-        self.send_commands("sm2",commands,self.prefix)
\ No newline at end of file
@@ -43,15 +43,9 @@ class TMC4671Ui(WidgetUI,CommunicationHandler):
         self.vext = 0
         self.vint = 0
 
-        self.timer = QTimer(self)
-        self.timer_status = QTimer(self)
-    
         self.pushButton_align.clicked.connect(self.alignEnc)
         self.pushButton_autotunepid.clicked.connect(self.autotunePid)
         #self.initUi()
-        
-        self.timer.timeout.connect(self.updateTimer)
-        self.timer_status.timeout.connect(self.updateStatus)
 
    
         # Chart setup
@@ -167,6 +161,11 @@ class TMC4671Ui(WidgetUI,CommunicationHandler):
         self.register_callback("tmc","trqbq_f",self.spinBox_torqueFilterFreq.setValue,self.axis,int)
     
         self.register_callback("tmc","calibrated",self.calibrated,instance=self.axis,conversion=int)
+
+        # Polling pauses while the tab is hidden or disabled because no TMC was found
+        self.poll_commands("tmc",["acttrq"],50,self.axis)
+        self.poll_commands("tmc",["temp","state"],250,self.axis)
+        self.poll_commands("sys",["vint","vext"],250)
         
         self.checkBox_combineEncoders.stateChanged.connect(self.extEncoderChanged)
 
@@ -178,17 +177,9 @@ class TMC4671Ui(WidgetUI,CommunicationHandler):
 
 
 
-    # TODO do not send updates when window is moved. Blocks serial port receive on windows
+    # Tab is currently shown
     def showEvent(self,event):
         self.init_ui()
-        if self.isEnabled():
-            self.timer.start(50)
-            self.timer_status.start(250)
-
-    # Tab is hidden
-    def hideEvent(self,event):
-        self.timer.stop()
-        self.timer_status.stop()
         
     def motorselChanged(self,val):
         data = self.comboBox_mtype.currentData()
@@ -312,15 +303,6 @@ class TMC4671Ui(WidgetUI,CommunicationHandler):
         else:
             self.label_state.setText(state)
 
-    def updateTimer(self):
-        self.send_command("tmc","acttrq",self.axis)
-        
-        
-    def updateStatus(self):
-        self.send_command("tmc","temp",self.axis)
-        self.send_command("tmc","state",self.axis)
-        self.send_commands("sys",["vint","vext"])
-
     def submitMotor(self):
         mtype = self.comboBox_mtype.currentIndex()
         self.send_value("tmc","mtype",val=mtype,instance=self.axis)
@@ -444,8 +426,6 @@ class TMC4671Ui(WidgetUI,CommunicationHandler):
             self.main.log("Can not find TMC")
             self.groupBox_tmc.setTitle("Driver (not connected)")
             self.setEnabled(False)
-            self.timer.stop()
-            self.timer_status.stop()
         else:
             self.groupBox_tmc.setTitle(type)
             self.setEnabled(True)
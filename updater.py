@@ -12,6 +12,7 @@ import requests
 import json
 import re
 import helper
+import base_ui
 from PyQt6.QtGui import QPalette, QColor
 from PyQt6.QtCore import Qt
 from datetime import datetime
@@ -115,7 +116,7 @@ class UpdateBrowser(PyQt6.QtWidgets.QDialog):
     """Gets updates and displays them in a list"""
     def __init__(self,parentWidget,settingsmanager : ProfileUI = None):
         PyQt6.QtWidgets.QDialog.__init__(self, parentWidget)
-        PyQt6.uic.loadUi(helper.res_path("updatebrowser.ui"), self)
+        base_ui.load_ui("updatebrowser.ui", self)
 
         self.listWidget_release.currentItemChanged.connect(self.release_changed)
         self.listWidget_files.currentItemChanged.connect(self.file_changed)
@@ -17,13 +17,11 @@ class VescUI(WidgetUI,CommunicationHandler):
         WidgetUI.__init__(self, main,'vesc.ui')
         CommunicationHandler.__init__(self)
         self.main = main #type: main.MainUi
-        self.timer = QTimer(self)
         
         self.pushButton_apply.clicked.connect(self.apply)
         self.pushButton_manualRead.clicked.connect(self.manualEncPosRead)
         self.pushButton_eraseOffset.clicked.connect(self.eraseOffset)
         self.pushButton_refresh.clicked.connect(self.init_ui)
-        self.timer.timeout.connect(self.updateTimer)
         self.prefix = unique
         self.canOptions = portconf_ui.CanOptionsDialog(0,"CAN",main)
         self.pushButton_cansettings.clicked.connect(self.canOptions.exec)
@@ -40,6 +38,8 @@ class VescUI(WidgetUI,CommunicationHandler):
         self.register_callback("vesc","pos",self.posCb,self.prefix,int)
         self.register_callback("vesc","vescstate",self.stateCb,self.prefix,int)
         self.register_callback("vesc","torque",self.torqueCb,self.prefix,int)
+
+        self.poll_commands("vesc",["vescstate","errorflags","voltage","pos","encrate","torque"],500,self.prefix)
         
         self.init_ui()
 
@@ -63,11 +63,6 @@ class VescUI(WidgetUI,CommunicationHandler):
     # Tab is currently shown
     def showEvent(self,event):
         self.init_ui()
-        self.timer.start(500)
-
-    # Tab is hidden
-    def hideEvent(self,event):
-        self.timer.stop()
 
     def updateEncoderUI(self, dat):
         self.checkBox_useEncoder.setChecked(dat)
@@ -125,9 +120,6 @@ class VescUI(WidgetUI,CommunicationHandler):
         self.label_errors.setText(txt)
 
 
-    def updateTimer(self):
-        self.send_commands("vesc",["vescstate","errorflags","voltage","pos","encrate","torque"],self.prefix)
- 
     def apply(self):
         OpenFFBoardCANId = str(self.spinBox_OFFB_can_id.value())
         VESCCANId = str(self.spinBox_VESC_can_Id.value())